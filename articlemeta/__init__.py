@@ -3,7 +3,8 @@ import os
 from pyramid.renderers import JSONP
 from pyramid.config import Configurator
 
-from articlemeta import controller
+from articlemeta import controller, connection
+from articlemeta.cache import RenderedExportCache
 
 
 def main(global_config, **settings):
@@ -18,11 +19,19 @@ def main(global_config, **settings):
     config.add_renderer('jsonp', JSONP(param_name='callback', indent=4))
 
     db_dsn = os.environ.get('MONGODB_HOST', settings.get('mongo_uri', '127.0.0.1:27017'))
-    db_client = controller.get_dbconn(db_dsn)
+    connection.read_settings(settings)  # fails early on invalid settings
+    render_cache = RenderedExportCache.from_settings(settings)
 
     def add_databroker(request):
-        """Add a databroker to all incoming request"""
-        return controller.DataBroker(db_client)
+        """Add a databroker to all incoming request
+
+        The client is shared by the requests of the worker, and created by
+        the worker itself when the application is preloaded before the fork.
+        """
+        db_client = controller.get_dbconn(db_dsn, settings)
+        read_db = controller.get_read_dbconn(db_dsn, settings)
+        return controller.DataBroker(db_client, render_cache=render_cache,
+                                     read_db=read_db)
 
     config.add_route('index', '/')
     # collections - GET method:
@@ -32,17 +41,21 @@ def main(global_config, **settings):
     config.add_route('journal', '/api/v1/journal/')
     config.add_route('identifiers_journal', '/api/v1/journal/identifiers/')
     config.add_route('exists_journal', '/api/v1/journal/exists/')
+    config.add_route('stream_journals', '/api/v1/journals/stream/')
     # issues - GET method:
     config.add_route('get_issue', '/api/v1/issue/')
     config.add_route('get_issues', '/api/v1/issues/')
     config.add_route('identifiers_issue', '/api/v1/issue/identifiers/')
     config.add_route('exists_issue', '/api/v1/issue/exists/')
-    # articles - GET method:
+    config.add_route('stream_issues', '/api/v1/issues/stream/')
+    # articles - GET method (and POST for get_articles_by_codes):
     config.add_route('get_article', '/api/v1/article/')
     config.add_route('get_articles', '/api/v1/articles/')
+    config.add_route('get_articles_by_codes', '/api/v1/articles/codes/')
     config.add_route('identifiers_article', '/api/v1/article/identifiers/')
     config.add_route('counter_dict', '/api/v1/article/counter_dict/')
     config.add_route('exists_article', '/api/v1/article/exists/')
+    config.add_route('stream_articles', '/api/v1/articles/stream/')
     # press releases - GET method:
     config.add_route('identifiers_press_release', '/api/v1/press_release/identifiers/')
     # logs historychanges - GET method:
@@ -1,5 +1,6 @@
 # conding: utf-8
 import json
+import itertools
 from datetime import datetime
 
 import pyramid.httpexceptions as exc
@@ -8,8 +9,11 @@ from pyramid.response import Response
 from pyramid.settings import asbool
 
 from articlemeta.export import Export, JournalExport
+from articlemeta.controller import decode_resume_token, COUNT_MODES
 
 DEFAULT_FROM_DATE = '1900-01-01'
+NDJSON_CHUNK_SIZE = 64 * 1024
+MAX_CODES_PER_REQUEST = 1000
 
 
 def _get_request_limit_param(request, default_limit=1000,
@@ -37,6 +41,112 @@ def _get_request_limit_param(request, default_limit=1000,
     return limit
 
 
+def _get_request_resume_token_param(request):
+    """
+    Extract from request's querystring, the resume_token param, used to
+    continue a listing right after the last record of the previous page.
+
+    @param request: the request object!
+    """
+
+    resume_token = request.GET.get('resume_token', None)
+
+    if not resume_token:
+        return None
+
+    try:
+        decode_resume_token(resume_token)
+    except ValueError:
+        raise exc.HTTPBadRequest('invalid resume_token')
+
+    return resume_token
+
+
+def _get_request_count_param(request, default_count='exact'):
+    """
+    Extract from request's querystring, the count param, that defines how the
+    ``meta.total`` of a listing is computed: 'exact', 'estimated' or 'false'
+    (the total is not computed at all).
+
+    @param request: the request object!
+    @param default_count: if not count was found in querystring
+    """
+
+    count = request.GET.get('count', default_count)
+
+    if count not in COUNT_MODES:
+        raise exc.HTTPBadRequest(
+            "parameter 'count' must be one of: %s" % ', '.join(COUNT_MODES))
+
+    return count
+
+
+def _get_request_date_param(request, name, default):
+    """
+    Extract from request's querystring a date param in the format
+    YYYY-MM-DD.
+
+    @param request: the request object!
+    @param name: name of the param, ex: 'from'
+    @param default: if the param was not found in querystring
+    """
+
+    value = request.GET.get(name, default)
+
+    try:
+        datetime.strptime(value, '%Y-%m-%d')
+    except ValueError:
+        raise exc.HTTPBadRequest(
+            "parameter '%s' must be a date in the format YYYY-MM-DD" % name)
+
+    return value
+
+
+def _ndjson_app_iter(objects, chunk_size=NDJSON_CHUNK_SIZE):
+    """
+    Serialize each item of ``objects`` as one line of JSON (NDJSON), lazily,
+    grouping the lines in chunks of about ``chunk_size`` bytes to be handed
+    to the WSGI server.
+
+    @param objects: iterable of JSON serializable objects
+    @param chunk_size: approximated size, in bytes, of each chunk
+    """
+
+    buff = []
+    size = 0
+    for obj in objects:
+        line = (json.dumps(obj) + '\n').encode('utf-8')
+        buff.append(line)
+        size += len(line)
+
+        if size >= chunk_size:
+            yield b''.join(buff)
+            buff = []
+            size = 0
+
+    if buff:
+        yield b''.join(buff)
+
+
+def _ndjson_response(objects):
+    """
+    The NDJSON response of ``objects``. The first object is obtained before
+    the response is built, so the errors of the query are raised by the view
+    and not after the status and headers were sent.
+    """
+    objects = iter(objects)
+    try:
+        first = [next(objects)]
+    except StopIteration:
+        first = []
+
+    return Response(
+        app_iter=_ndjson_app_iter(itertools.chain(first, objects)),
+        content_type='application/x-ndjson',
+        charset='utf-8'
+    )
+
+
 @notfound_view_config(append_slash=True)
 def notfound(request):
     # http://docs.pylonsproject.org/projects/pyramid/en/latest/narr/urldispatch.html#redirecting-to-slash-appended-routes
@@ -87,13 +197,28 @@ def get_journal(request):
     return journal
 
 
+@view_config(route_name='stream_journals',
+             request_method='GET')
+def stream_journals(request):
+
+    collection = request.GET.get('collection', None)
+    issn = request.GET.get('issn', None)
+
+    journals = request.databroker.iter_journals(
+        collection=collection, issn=issn)
+
+    return _ndjson_response(journals)
+
+
 @view_config(route_name='identifiers_journal',
              request_method='GET', renderer='jsonp')
 def identifiers_journal(request):
 
     collection = request.GET.get('collection', None)
     limit = _get_request_limit_param(request)
+    count = _get_request_count_param(request)
     offset = request.GET.get('offset', 0)
+    resume_token = _get_request_resume_token_param(request)
 
     try:
         offset = int(offset)
@@ -105,7 +230,9 @@ def identifiers_journal(request):
 
     ids = request.databroker.identifiers_journal(collection=collection,
                                                  limit=limit,
-                                                 offset=offset)
+                                                 offset=offset,
+                                                 resume_token=resume_token,
+                                                 count=count)
 
     return ids
 
@@ -119,7 +246,9 @@ def identifiers_issue(request):
     from_date = request.GET.get('from', DEFAULT_FROM_DATE)
     until_date = request.GET.get('until', datetime.now().date().isoformat())
     limit = _get_request_limit_param(request)
+    count = _get_request_count_param(request)
     offset = request.GET.get('offset', 0)
+    resume_token = _get_request_resume_token_param(request)
 
     try:
         offset = int(offset)
@@ -135,7 +264,9 @@ def identifiers_issue(request):
         limit=limit,
         offset=offset,
         from_date=from_date,
-        until_date=until_date
+        until_date=until_date,
+        resume_token=resume_token,
+        count=count
     )
 
     return ids
@@ -191,6 +322,7 @@ def get_issues(request):
     from_date = request.GET.get('from', DEFAULT_FROM_DATE)
     until_date = request.GET.get('until', datetime.now().date().isoformat())
     limit = _get_request_limit_param(request, default_limit=100)
+    count = _get_request_count_param(request)
     offset = request.GET.get('offset', 0)
 
     try:
@@ -207,11 +339,32 @@ def get_issues(request):
         limit=limit,
         offset=offset,
         from_date=from_date,
-        until_date=until_date
+        until_date=until_date,
+        count=count
     )
 
     return issue
 
+@view_config(route_name='stream_issues',
+             request_method='GET')
+def stream_issues(request):
+
+    collection = request.GET.get('collection', None)
+    issn = request.GET.get('issn', None)
+    from_date = _get_request_date_param(request, 'from', DEFAULT_FROM_DATE)
+    until_date = _get_request_date_param(
+        request, 'until', datetime.now().date().isoformat())
+
+    issues = request.databroker.iter_issues_full(
+        collection=collection,
+        issn=issn,
+        from_date=from_date,
+        until_date=until_date
+    )
+
+    return _ndjson_response(issues)
+
+
 @view_config(route_name='identifiers_article',
              request_method='GET', renderer='jsonp')
 def identifiers_article(request):
@@ -221,7 +374,9 @@ def identifiers_article(request):
     from_date = request.GET.get('from', DEFAULT_FROM_DATE)
     until_date = request.GET.get('until', datetime.now().date().isoformat())
     limit = _get_request_limit_param(request)
+    count = _get_request_count_param(request)
     offset = request.GET.get('offset', 0)
+    resume_token = _get_request_resume_token_param(request)
 
     try:
         offset = int(offset)
@@ -236,7 +391,9 @@ def identifiers_article(request):
                                                  limit=limit,
                                                  offset=offset,
                                                  from_date=from_date,
-                                                 until_date=until_date)
+                                                 until_date=until_date,
+                                                 resume_token=resume_token,
+                                                 count=count)
 
     return ids
 
@@ -250,6 +407,7 @@ def identifiers_press_release(request):
     from_date = request.GET.get('from', DEFAULT_FROM_DATE)
     until_date = request.GET.get('until', datetime.now().date().isoformat())
     limit = _get_request_limit_param(request)
+    count = _get_request_count_param(request)
     offset = request.GET.get('offset', 0)
 
     try:
@@ -262,7 +420,8 @@ def identifiers_press_release(request):
                                                        limit=limit,
                                                        offset=offset,
                                                        from_date=from_date,
-                                                       until_date=until_date)
+                                                       until_date=until_date,
+                                                       count=count)
 
     return ids
 
@@ -299,30 +458,60 @@ def get_article(request):
     )
 
     if article:
-        if fmt == 'xmlwos':
+        if fmt in Export.XML_FORMATS:
             return Response(
-                Export(article).pipeline_sci(), content_type="application/xml")
+                request.databroker.render_article(article, fmt),
+                content_type="application/xml")
 
-        if fmt == 'xmldoaj':
-            return Response(
-                Export(article).pipeline_doaj(), content_type="application/xml")
+        if fmt == 'opac':
+            return Export(article).pipeline_opac()
 
-        if fmt == 'xmlrsps':
-            return Response(
-                Export(article).pipeline_rsps(), content_type="application/xml")
+    return article
 
-        if fmt == 'xmlpubmed':
-            return Response(
-                Export(article).pipeline_pubmed(), content_type="application/xml")
+@view_config(route_name='get_articles_by_codes',
+             request_method=('GET', 'POST'),
+             renderer='jsonp')
+def get_articles_by_codes(request):
+    """
+    Codes are taken from the repeated ``code`` querystring param, or, in POST
+    requests, from the ``codes`` list of the JSON body.
+    """
 
-        if fmt == 'xmlcrossref':
-            return Response(
-                Export(article).pipeline_crossref(), content_type="application/xml")
+    collection = request.GET.get('collection', None)
+    body = request.GET.get('body', 'false')
 
-        if fmt == 'opac':
-            return Export(article).pipeline_opac()
+    if request.method == 'POST':
+        try:
+            codes = request.json_body['codes']
+        except (ValueError, KeyError, TypeError):
+            raise exc.HTTPBadRequest(
+                "request body must be a JSON object with a 'codes' list")
+    else:
+        codes = request.GET.getall('code')
+
+    if not isinstance(codes, list) or not all(
+            isinstance(code, str) for code in codes):
+        raise exc.HTTPBadRequest("parameter 'codes' must be a list of strings")
+
+    if not codes:
+        raise exc.HTTPBadRequest('at least one code must be given')
+
+    if len(codes) > MAX_CODES_PER_REQUEST:
+        raise exc.HTTPBadRequest(
+            'at most %d codes are allowed per request' % MAX_CODES_PER_REQUEST)
+
+    if body not in ['true', 'false']:
+        raise exc.HTTPBadRequest("parameter 'body' must be 'true' or 'false', default is 'false'")
+
+    articles = request.databroker.get_articles_by_codes(
+        codes,
+        collection=collection,
+        replace_journal_metadata=True,
+        body=asbool(body)
+    )
+
+    return articles
 
-    return article
 
 @view_config(route_name='get_articles',
              request_method='GET',
@@ -334,6 +523,7 @@ def get_articles(request):
     from_date = request.GET.get('from', DEFAULT_FROM_DATE)
     until_date = request.GET.get('until', datetime.now().date().isoformat())
     limit = _get_request_limit_param(request, default_limit=100)
+    count = _get_request_count_param(request)
     offset = request.GET.get('offset', 0)
     body = request.GET.get('body', 'false')
 
@@ -358,11 +548,38 @@ def get_articles(request):
         from_date=from_date,
         until_date=until_date,
         replace_journal_metadata=True,
-        body=body
+        body=body,
+        count=count
     )
 
     return articles
 
+@view_config(route_name='stream_articles',
+             request_method='GET')
+def stream_articles(request):
+
+    collection = request.GET.get('collection', None)
+    issn = request.GET.get('issn', None)
+    from_date = _get_request_date_param(request, 'from', DEFAULT_FROM_DATE)
+    until_date = _get_request_date_param(
+        request, 'until', datetime.now().date().isoformat())
+    body = request.GET.get('body', 'false')
+
+    if body not in ['true', 'false']:
+        raise exc.HTTPBadRequest("parameter 'body' must be 'true' or 'false', default is 'false'")
+
+    articles = request.databroker.iter_articles_full(
+        collection=collection,
+        issn=issn,
+        from_date=from_date,
+        until_date=until_date,
+        replace_journal_metadata=True,
+        body=asbool(body)
+    )
+
+    return _ndjson_response(articles)
+
+
 @view_config(route_name='list_historychanges_article', request_method='GET', renderer='jsonp')
 @view_config(route_name='list_historychanges_journal', request_method='GET', renderer='jsonp')
 @view_config(route_name='list_historychanges_issue', request_method='GET', renderer='jsonp')
@@ -396,6 +613,7 @@ def list_historychanges(request):
     until_date = request.GET.get('until', None)
     offset = request.GET.get('offset', 0)
     limit = _get_request_limit_param(request, force_max_limit_to_default=True)
+    count = _get_request_count_param(request)
 
     try:
         offset = int(offset)
@@ -410,7 +628,8 @@ def list_historychanges(request):
         limit=limit,
         offset=offset,
         from_date=from_date,
-        until_date=until_date
+        until_date=until_date,
+        count=count
     )
 
     return objs
@@ -425,6 +644,7 @@ def counter_dict(request):
     from_date = request.GET.get('from', DEFAULT_FROM_DATE)
     until_date = request.GET.get('until', datetime.now().date().isoformat())
     limit = _get_request_limit_param(request)
+    count = _get_request_count_param(request)
     offset = request.GET.get('offset', 0)
 
     try:
@@ -441,6 +661,7 @@ def counter_dict(request):
             limit=limit,
             offset=offset,
             from_date=from_date,
-            until_date=until_date)
+            until_date=until_date,
+            count=count)
 
     return ids
@@ -0,0 +1,312 @@
+# coding: utf-8
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache(object):
+    """
+    In-process LRU cache whose entries expire after ``ttl`` seconds.
+
+    The cache is bounded to ``maxsize`` entries, the least recently used entry
+    is evicted when a new one is added to a full cache. It is safe to share an
+    instance between threads of the same process.
+
+    Hit and miss counters are available through ``stats``.
+    """
+
+    def __init__(self, maxsize=1024, ttl=300, timer=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._timer = timer
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                expires_at, value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+
+            if expires_at <= self._timer():
+                del self._data[key]
+                self.misses += 1
+                return default
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._set(key, value)
+
+    def _set(self, key, value):
+        self._data[key] = (self._timer() + self.ttl, value)
+        self._data.move_to_end(key)
+
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def invalidate_many(self, predicate):
+        """
+        Remove every entry whose key satisfies ``predicate``.
+        """
+        with self._lock:
+            for key in [key for key in self._data if predicate(key)]:
+                del self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __contains__(self, key):
+        with self._lock:
+            try:
+                expires_at, _ = self._data[key]
+            except KeyError:
+                return False
+
+            return expires_at > self._timer()
+
+    def __len__(self):
+        return len(self._data)
+
+    @property
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'ttl': self.ttl,
+        }
+
+
+class ReplicaAwareCache(TTLCache):
+    """
+    TTLCache of documents that may be read from the secondaries of a replica
+    set.
+
+    A secondary lagging behind the primary may still return the previous
+    version of a document just written, which would then be cached for
+    ``ttl`` seconds. ``invalidate`` keeps the time of the write of the key:
+    ``written`` tells the readers to read it from the primary, until a read
+    made after the write is cached, or ``ttl`` seconds have passed. ``set``
+    ignores the values read before the last write of the key.
+
+    Usage::
+
+        read_at = cache.now()
+        db = primary if cache.written(key) else secondary
+        cache.set(key, db.find_one(...), read_at=read_at)
+    """
+
+    def __init__(self, maxsize=1024, ttl=300, timer=time.monotonic):
+        super().__init__(maxsize=maxsize, ttl=ttl, timer=timer)
+        # {key: time of the write}
+        self._written = OrderedDict()
+
+    def now(self):
+        return self._timer()
+
+    def written(self, key):
+        """
+        Whether ``key`` was invalidated and not read again since.
+        """
+        with self._lock:
+            written_at = self._written.get(key)
+            if written_at is None:
+                return False
+
+            if written_at + self.ttl <= self._timer():
+                del self._written[key]
+                return False
+
+            return True
+
+    def set(self, key, value, read_at=None):
+        """
+        Cache ``value``, read at ``read_at`` (see ``now``), unless the key was
+        written since. Without ``read_at`` the value is always cached.
+        """
+        with self._lock:
+            written_at = self._written.get(key)
+            if written_at is not None and read_at is not None and \
+                    written_at >= read_at:
+                return
+
+            self._written.pop(key, None)
+            self._set(key, value)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+            self._written[key] = self._timer()
+            self._written.move_to_end(key)
+
+            while len(self._written) > self.maxsize:
+                self._written.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._written.clear()
+
+
+class RenderedExportCache(object):
+    """
+    Cache of rendered article exports (xmlwos, xmlrsps, ...), as bytes, keyed by
+    ``(collection, code, fmt, version)`` where ``version`` identifies the
+    state of the source metadata, so that a changed document is never served
+    from a stale entry.
+
+    Entries are kept in an in-memory LRU tier and, when ``directory`` is
+    given, in an on-disk tier shared by every process using the same
+    directory. The disk layout is::
+
+        <directory>/<collection>/<issn>/<code>/<fmt>-<sha1 of version>
+
+    ``invalidate`` removes every entry of the documents whose code starts
+    with a prefix, so a single call covers an article (its code), all
+    articles of an issue ('S' + issue code) or of a journal ('S' + issn).
+    """
+
+    def __init__(self, maxsize=1024, ttl=3600, directory=None,
+                 timer=time.monotonic):
+        self.memory = TTLCache(maxsize=maxsize, ttl=ttl, timer=timer)
+        self.directory = directory
+
+    @classmethod
+    def from_settings(cls, settings):
+        """
+        Build an instance from the application settings: ``render_cache_dir``
+        (or the env variable RENDER_CACHE_DIR) enables the on-disk tier,
+        ``render_cache_maxsize`` and ``render_cache_ttl`` set up the
+        in-memory tier.
+
+        @param settings: flat dict of settings, as in the ``app:main`` section
+        """
+        return cls(
+            maxsize=int(settings.get('render_cache_maxsize', 1024)),
+            ttl=int(settings.get('render_cache_ttl', 3600)),
+            directory=os.environ.get(
+                'RENDER_CACHE_DIR', settings.get('render_cache_dir')) or None,
+        )
+
+    def _path(self, collection, code, fmt=None, version=None):
+        path = os.path.join(self.directory, collection or '_', code[1:10], code)
+
+        if fmt is None:
+            return path
+
+        return os.path.join(path, '%s-%s' % (
+            fmt, hashlib.sha1(version.encode('utf-8')).hexdigest()))
+
+    def get(self, collection, code, fmt, version):
+        key = (collection, code, fmt, version)
+
+        value = self.memory.get(key)
+        if value is not None or self.directory is None:
+            return value
+
+        try:
+            with open(self._path(*key), 'rb') as fp:
+                value = fp.read()
+        except (IOError, OSError):
+            return None
+
+        self.memory.set(key, value)
+        return value
+
+    def set(self, collection, code, fmt, version, value):
+        key = (collection, code, fmt, version)
+        self.memory.set(key, value)
+
+        if self.directory is None:
+            return
+
+        path = self._path(*key)
+        dirname = os.path.dirname(path)
+
+        try:
+            os.makedirs(dirname, exist_ok=True)
+
+            # stale renderings of the same format are replaced.
+            for name in os.listdir(dirname):
+                if name.startswith(fmt + '-'):
+                    os.remove(os.path.join(dirname, name))
+
+            fd, tmp = tempfile.mkstemp(dir=dirname)
+            with os.fdopen(fd, 'wb') as fp:
+                fp.write(value)
+            os.replace(tmp, path)
+        except (IOError, OSError):
+            # the disk tier is an optimization, it must never fail a request.
+            pass
+
+    def get_or_render(self, collection, code, fmt, version, render):
+        """
+        Return the cached rendering or call ``render()`` and cache its result.
+        """
+        value = self.get(collection, code, fmt, version)
+
+        if value is None:
+            value = render()
+            self.set(collection, code, fmt, version, value)
+
+        return value
+
+    def invalidate(self, collection, prefix):
+        """
+        Remove the entries of every document of ``collection`` (or of any
+        collection, if it is None) whose code starts with ``prefix``.
+        """
+        self.memory.invalidate_many(
+            lambda key: (collection is None or key[0] == collection) and
+            key[1].startswith(prefix))
+
+        if self.directory is None or len(prefix) < 10:
+            return
+
+        if collection:
+            collections = [collection]
+        else:
+            try:
+                collections = os.listdir(self.directory)
+            except (IOError, OSError):
+                return
+
+        for coll in collections:
+            issn_dir = os.path.join(self.directory, coll, prefix[1:10])
+            try:
+                codes = os.listdir(issn_dir)
+            except (IOError, OSError):
+                continue
+
+            for code in codes:
+                if code.startswith(prefix):
+                    shutil.rmtree(os.path.join(issn_dir, code),
+                                  ignore_errors=True)
+
+    def clear(self):
+        """
+        Clear the in-memory tier. The on-disk tier is left untouched.
+        """
+        self.memory.clear()
+
+    @property
+    def stats(self):
+        return self.memory.stats
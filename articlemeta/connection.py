@@ -0,0 +1,196 @@
+# coding: utf-8
+"""
+MongoDB clients shared by the process.
+
+A ``pymongo.MongoClient`` holds a pool of connections and monitoring threads,
+so a process must create a single client per server and reuse it. The clients
+are kept here by DSN and options; ``get_database`` returns a database handle
+of the shared client, and is cheap enough to be called for every request.
+
+The clients are dropped in a forked child (gunicorn with ``preload_app``
+forks the workers after the application was loaded), which creates its own
+on the first use: a client must not be used across a fork.
+
+The options of the clients come from the ``mongo_*`` settings, see
+``SETTINGS``. Options given in the query string of the DSN are kept, unless
+the same option is set in the settings.
+
+The read-only queries may use a handle of the same client with another read
+preference (``read_settings``), sending them to the secondaries of a replica
+set while the writes go to the primary.
+"""
+import os
+import threading
+import functools
+
+import pymongo
+from pymongo import uri_parser, read_preferences
+
+from articlemeta import indexes
+
+DEFAULT_DATABASE = 'articlemeta'
+
+# ini setting, MongoClient option, type
+SETTINGS = [
+    ('mongo_max_pool_size', 'maxPoolSize', int),
+    ('mongo_min_pool_size', 'minPoolSize', int),
+    ('mongo_max_idle_time_ms', 'maxIdleTimeMS', int),
+    ('mongo_wait_queue_timeout_ms', 'waitQueueTimeoutMS', int),
+    ('mongo_connect_timeout_ms', 'connectTimeoutMS', int),
+    ('mongo_socket_timeout_ms', 'socketTimeoutMS', int),
+    ('mongo_server_selection_timeout_ms', 'serverSelectionTimeoutMS', int),
+    ('mongo_compressors', 'compressors', str),
+    ('mongo_replica_set', 'replicaSet', str),
+    ('mongo_app_name', 'appname', str),
+]
+
+# Used when neither the settings nor the DSN set the option. A request must
+# not wait forever for a connection of an exhausted pool.
+DEFAULTS = {
+    'connectTimeoutMS': 10000,
+    'waitQueueTimeoutMS': 10000,
+    'appname': 'articlemeta',
+}
+
+READ_PREFERENCES = {
+    'primary': read_preferences.Primary,
+    'primarypreferred': read_preferences.PrimaryPreferred,
+    'secondary': read_preferences.Secondary,
+    'secondarypreferred': read_preferences.SecondaryPreferred,
+    'nearest': read_preferences.Nearest,
+}
+
+_clients = {}
+_checked = set()
+_lock = threading.Lock()
+
+
+def _reset():
+    global _lock
+    _clients.clear()
+    _checked.clear()
+    _lock = threading.Lock()
+
+
+# The lock may be held by another thread at the time of the fork.
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset)
+
+
+@functools.lru_cache(maxsize=32)
+def parse_dsn(db_dsn):
+    """
+    Return the MongoDB URI, the database name and the options of ``db_dsn``,
+    which may omit the scheme (``host:port/database``) and the database.
+    """
+    if '://' not in db_dsn:
+        db_dsn = 'mongodb://%s' % db_dsn
+
+    parsed = uri_parser.parse_uri(db_dsn)
+
+    return db_dsn, parsed['database'] or DEFAULT_DATABASE, parsed['options']
+
+
+def client_options(settings=None, uri_options=None):
+    """
+    The MongoClient options from the ``mongo_*`` settings.
+
+    @param settings: flat dict of settings, as in the ``app:main`` section
+    @param uri_options: options given in the DSN, which take precedence over
+        ``DEFAULTS``
+    """
+    settings = settings or {}
+    given = set(k.lower() for k in (uri_options or {}))
+
+    options = {k: v for k, v in DEFAULTS.items() if k.lower() not in given}
+    for setting, option, type_ in SETTINGS:
+        value = settings.get(setting)
+        if value is None or str(value).strip() == '':
+            continue
+        options[option] = type_(str(value).strip())
+
+    return options
+
+
+def read_preference(name, max_staleness=-1):
+    """
+    The read preference named ``name``, as in the MongoDB URI
+    (``secondaryPreferred``), case insensitive.
+
+    @param max_staleness: maxStalenessSeconds, how far behind the primary a
+        secondary may be to be read, -1 for no limit. Not allowed for
+        ``primary``.
+    """
+    try:
+        mode = READ_PREFERENCES[name.strip().lower()]
+    except KeyError:
+        raise ValueError('invalid read preference: %s' % name)
+
+    if mode is read_preferences.Primary:
+        if max_staleness != -1:
+            raise ValueError(
+                'maxStalenessSeconds is not allowed with the primary read '
+                'preference')
+        return mode()
+
+    return mode(max_staleness=max_staleness)
+
+
+def read_settings(settings=None):
+    """
+    The read preference of the read-only handles, from the
+    ``mongo_read_preference`` and ``mongo_max_staleness_seconds`` settings,
+    or None for the read preference of the client.
+    """
+    settings = settings or {}
+    name = (settings.get('mongo_read_preference') or '').strip()
+    max_staleness = int(
+        str(settings.get('mongo_max_staleness_seconds') or '').strip() or -1)
+
+    if not name:
+        if max_staleness != -1:
+            raise ValueError(
+                'mongo_max_staleness_seconds requires mongo_read_preference')
+        return None
+
+    return read_preference(name, max_staleness=max_staleness)
+
+
+def get_client(db_dsn, settings=None):
+    """
+    The MongoClient of this process for ``db_dsn`` and the ``mongo_*``
+    settings, created on the first call.
+    """
+    uri, _, uri_options = parse_dsn(db_dsn)
+    options = client_options(settings, uri_options)
+    key = (uri, tuple(sorted(options.items())))
+
+    client = _clients.get(key)
+    if client is not None:
+        return client
+
+    with _lock:
+        client = _clients.get(key)
+        if client is None:
+            client = pymongo.MongoClient(uri, **options)
+            _clients[key] = client
+
+    return client
+
+
+def get_database(db_dsn, settings=None, read_preference=None):
+    """
+    A database handle of the shared client. The version of the indexes is
+    checked once per client and database.
+
+    @param read_preference: a read preference of the handle, instead of
+        the one of the client
+    """
+    client = get_client(db_dsn, settings)
+    name = parse_dsn(db_dsn)[1]
+
+    if (id(client), name) not in _checked:
+        _checked.add((id(client), name))
+        indexes.check_schema_version(client[name])
+
+    return client.get_database(name, read_preference=read_preference)
@@ -1,17 +1,59 @@
 # coding: utf-8
-from urllib.parse import urlparse
 import warnings
+import base64
+import copy
 import json
+import os
+import re
+import threading
+import time
+from concurrent import futures
 
 import pymongo
+from bson.objectid import ObjectId
+from bson.errors import InvalidId
 from xylose.scielodocument import Article, Journal, Issue, UnavailableMetadataException
 from articlemeta.decorators import LogHistoryChange
+from articlemeta.cache import TTLCache, ReplicaAwareCache
+from articlemeta import connection
+from articlemeta.export import Export
 from articlemeta.data import COLLECTIONS_PATH
 from datetime import datetime
 import requests
 
 LIMIT = 1000
 
+KEYSET_SORT = [('processing_date', pymongo.ASCENDING), ('_id', pymongo.ASCENDING)]
+
+COUNT_MODES = ('exact', 'estimated', 'false')
+COUNT_CACHE_TTL = 300
+
+_count_cache = TTLCache(maxsize=2048, ttl=COUNT_CACHE_TTL)
+
+# quantidade de documentos trazida do MongoDB a cada ida ao servidor pelos
+# métodos ``iter_*``, e também o tamanho dos lotes enriquecidos de uma vez.
+STREAM_BATCH_SIZE = 500
+
+PID_REGEX = re.compile(r'^S\d{4}-\d{3}[\dX]\d{13}$', re.IGNORECASE)
+DOI_PREFIX = '10.'
+
+METADATA_CACHE_MAXSIZE = 20000
+METADATA_CACHE_TTL = 600
+
+# caches por processo dos metadados de periódicos e fascículos utilizados no
+# enriquecimento dos artigos. Os registros alterados são lidos do primário até
+# que sejam novamente armazenados, ver ``ReplicaAwareCache``.
+_journal_cache = ReplicaAwareCache(maxsize=METADATA_CACHE_MAXSIZE, ttl=METADATA_CACHE_TTL)
+_issue_cache = ReplicaAwareCache(maxsize=METADATA_CACHE_MAXSIZE, ttl=METADATA_CACHE_TTL)
+
+# tempo, em segundos, de validade das contagens obtidas do serviço de status
+# de publicação, renovadas em segundo plano.
+PUBLICATION_STATUS_TTL = 600
+# consultas simultâneas ao serviço de status de publicação, e o prazo total,
+# em segundos, de cada renovação das contagens.
+PUBLICATION_STATUS_WORKERS = 16
+PUBLICATION_STATUS_DEADLINE = 2
+
 
 def _doi_with_lang(doi_and_lang):
     d = {}
@@ -86,6 +128,85 @@ def _get_article_record_fields(record, fields=None):
     return {k: record.get(k) for k in fields}
 
 
+def identifier_type(code):
+    """Classifica o identificador de artigo ``code`` em 'code' (PID do
+    SciELO), 'doi' ou 'aid'.
+    """
+    if PID_REGEX.match(code):
+        return 'code'
+
+    if code.startswith(DOI_PREFIX):
+        return 'doi'
+
+    return 'aid'
+
+
+def get_identifier_filters(code):
+    """Filtros de consulta, a serem tentados em ordem, para obter o artigo de
+    identificador ``code``. Cada filtro utiliza um único campo indexado, no
+    lugar de um ``$or`` entre code, doi e aid.
+
+    Os DOIs são armazenados em caixa alta (ver ``ArticleMeta.check``), mas o
+    valor informado também é consultado, para os registros legados. Os
+    identificadores que não são PID nem DOI são buscados como aid e, em
+    seguida, como código.
+    """
+    kind = identifier_type(code)
+
+    if kind == 'code':
+        return [{'code': code}]
+
+    if kind == 'doi':
+        return [{'doi': {'$in': sorted(set([code.upper(), code]))}}]
+
+    return [{'aid': code}, {'code': code}]
+
+
+def get_export_version(article):
+    """Identifica o estado dos metadados a partir dos quais o artigo
+    ``article`` é exportado: datas de atualização e revisões do artigo, do
+    periódico e do fascículo, e a presença do texto completo.
+
+    Deve ser obtida dos dados originais, antes de ``dates_to_string``, que
+    reduz as datas ao dia (ver ``ArticleDocument``).
+    """
+    parts = []
+    for data in (article, article.get('title') or {}, article.get('issue') or {}):
+        part = str(data.get('updated_at') or data.get('processing_date'))
+        if data.get('revision'):
+            part += '#%s' % data['revision']
+        parts.append(part)
+
+    parts.append('body' if 'body' in article else '')
+
+    return '|'.join(parts)
+
+
+class ArticleDocument(dict):
+    """Artigo conforme retornado por ``ArticleMeta.get``, acompanhado da
+    versão de exportação (``export_version``) calculada antes da conversão
+    das datas.
+    """
+    export_version = None
+
+    @classmethod
+    def from_record(cls, record):
+        document = cls(dates_to_string(record))
+        document.export_version = get_export_version(record)
+        return document
+
+
+def _revision_update(fields):
+    """Operação de atualização que grava ``fields`` e incrementa o campo
+    ``revision``, de forma que cada alteração do documento produza uma nova
+    versão de exportação, mesmo quando as datas não mudam.
+    """
+    fields = dict(fields)
+    fields.pop('revision', None)
+
+    return {'$set': fields, '$inc': {'revision': 1}}
+
+
 def YYYYMMDD_separated_by_hyphen(yyyymmdd):
     return datetime.strptime(yyyymmdd, "%Y%m%d").isoformat()[:10]
 
@@ -170,101 +291,256 @@ def get_date_range_filter(from_date=None, until_date=None):
     return filter_range
 
 
-def get_dbconn(db_dsn):
-    """Connects to the MongoDB server and returns a database handler."""
+# tipos BSON que ``processing_date`` pode ter em registros legados, na ordem
+# em que o MongoDB os ordena. Os valores ausentes ordenam como ``null``.
+RESUME_TOKEN_TYPES = ('null', 'number', 'string', 'date')
 
-    def _create_indexes(db):
-        """
-        Ensures that an index exists on specified collections.
-
-        Definitions:
-        index_by_collection = {
-            'collection_name': [
-                ('field_name_1', pymongo.DESCENDING),
-                ('field_name_2', pymongo.ASCENDING),
-                ...
-            ],
-        }
 
-        Obs:
-        Care must be taken when the database is being accessed through multiple clients at once.
-        If an index is created using this client and deleted using another,
-        any call to ensure_index() within the cache window will fail to re-create the missing index.
+def _resume_token_type(value):
+    if isinstance(value, datetime):
+        return 'date'
 
-        Docs:
-        http://api.mongodb.org/python/current/api/pymongo/collection.html#pymongo.collection.Collection.ensure_index
-        """
-        index_by_collection = {
-            'historychanges_article': [
-                [[('date', pymongo.ASCENDING)], {'background': True}],
-                [[('collection', pymongo.ASCENDING)], {'background': True}],
-                [[('code', pymongo.ASCENDING)], {'background': True}],
-                [[('collection', pymongo.ASCENDING), ('date',  pymongo.ASCENDING)], {'background': True}]
-            ],
-            'historychanges_journal': [
-                [[('date', pymongo.ASCENDING)], {'background': True}],
-                [[('collection', pymongo.ASCENDING)], {'background': True}],
-                [[('code', pymongo.ASCENDING)], {'background': True}],
-                [[('collection', pymongo.ASCENDING), ('date',  pymongo.ASCENDING)], {'background': True}]
-            ],
-            'historychanges_issue': [
-                [[('date', pymongo.ASCENDING)], {'background': True}],
-                [[('collection', pymongo.ASCENDING)], {'background': True}],
-                [[('code', pymongo.ASCENDING)], {'background': True}],
-                [[('collection', pymongo.ASCENDING), ('date',  pymongo.ASCENDING)], {'background': True}]
-            ],
-            'issues': [
-                [[('code', pymongo.ASCENDING)], {'background': True}],
-                [[('collection', pymongo.ASCENDING)], {'background': True}],
-                [[('processing_date', pymongo.ASCENDING)], {'background': True}],
-                [[('publication_year', pymongo.ASCENDING)], {'background': True}],
-                [[('code', pymongo.ASCENDING), ('collection',  pymongo.ASCENDING)], {'unique': True, 'background': True}],
-                [[('code_title', pymongo.ASCENDING)], {'background': True}],
-                [[('collection', pymongo.ASCENDING), ('processing_date',  pymongo.ASCENDING)], {'background': True}]
-            ],
-            'journals': [
-                [[('code', pymongo.ASCENDING)], {'background': True}],
-                [[('code', pymongo.ASCENDING), ('collection',  pymongo.ASCENDING)], {'unique': True, 'background': True}],
-                [[('collection', pymongo.ASCENDING), ('processing_date',  pymongo.ASCENDING)], {'background': True}]
-            ],
-            'articles': [
-                [[('document_type', pymongo.ASCENDING)], {'background': True}],
-                [[('collection', pymongo.ASCENDING)], {'background': True}],
-                [[('code_title', pymongo.ASCENDING)], {'background': True}],
-                [[('applicable', pymongo.ASCENDING)], {'background': True}],
-                [[('code', pymongo.ASCENDING)], {'background': True}],
-                [[('sent_wos', pymongo.ASCENDING)], {'background': True}],
-                [[('publication_year', pymongo.ASCENDING)], {'background': True}],
-                [[('processing_date', pymongo.ASCENDING)], {'background': True}],
-                [[('license', pymongo.ASCENDING)], {'background': True}],
-                [[('section', pymongo.ASCENDING)], {'background': True}],
-                [[('aid', pymongo.ASCENDING)], {'background': True}],
-                [[('version', pymongo.ASCENDING)], {'background': True}],
-                [[('code', pymongo.ASCENDING), ('collection',  pymongo.ASCENDING)], {'unique': True, 'background': True}],
-                [[('collection', pymongo.ASCENDING), ('processing_date',  pymongo.ASCENDING)], {'background': True}]
-            ]
-        }
+    if isinstance(value, str):
+        return 'string'
+
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return 'number'
+
+    return 'null'
+
+
+def encode_resume_token(record):
+    """Produz um token opaco que permite retomar a listagem logo após
+    ``record``, a partir dos valores de ``processing_date`` e ``_id``.
+
+    Registros legados sem ``processing_date``, ou com um valor que não é uma
+    data, também produzem um token válido; o tipo do valor é mantido no token
+    para que a listagem continue na ordem do MongoDB. Valores de outros tipos
+    são tratados como ausentes.
+    """
+    processing_date = record.get('processing_date')
+    _id = record['_id']
+    kind = _resume_token_type(processing_date)
+
+    token = {
+        'i': str(_id),
+        'o': isinstance(_id, ObjectId),
+    }
+
+    if kind == 'date':
+        token['d'] = processing_date.isoformat()
+    elif kind != 'null':
+        token['d'] = processing_date
+        token['t'] = kind
+    else:
+        token['t'] = kind
+
+    return base64.urlsafe_b64encode(
+        json.dumps(token, separators=(',', ':')).encode('utf-8')).decode('ascii')
+
+
+def decode_resume_token(token):
+    """Decodifica um token produzido por ``encode_resume_token``, retornando
+    a tupla ``(processing_date, _id)``, onde ``processing_date`` pode ser None,
+    um número ou um texto em registros legados.
+
+    Lança ``ValueError`` caso o token seja inválido.
+    """
+    try:
+        data = json.loads(base64.urlsafe_b64decode(token.encode('ascii')))
+        kind = data.get('t', 'date')
+
+        if kind == 'date':
+            processing_date = datetime.fromisoformat(data['d'])
+        elif kind == 'null':
+            processing_date = None
+        else:
+            processing_date = data['d']
+
+        if kind not in RESUME_TOKEN_TYPES or \
+                _resume_token_type(processing_date) != kind:
+            raise ValueError(kind)
+
+        _id = ObjectId(data['i']) if data.get('o') else data['i']
+    except (ValueError, TypeError, KeyError, AttributeError, UnicodeError,
+            InvalidId):
+        raise ValueError('invalid resume token: %s' % token)
+
+    return processing_date, _id
+
+
+def get_resume_filter(fltr, resume_token):
+    """Acrescenta ao filtro ``fltr`` a condição que seleciona apenas os
+    registros posteriores ao indicado por ``resume_token``, considerando a
+    ordenação ``KEYSET_SORT``. Dessa forma a consulta percorre o índice a partir
+    do ponto de parada, sem a necessidade de descartar registros com ``skip``.
+
+    Como as comparações do MongoDB não atravessam tipos, os registros cujo
+    ``processing_date`` tem um tipo posterior na ordenação são selecionados
+    pelo tipo.
+    """
+    processing_date, _id = decode_resume_token(resume_token)
+    kind = _resume_token_type(processing_date)
+
+    conditions = [
+        {'processing_date': processing_date, '_id': {'$gt': _id}},
+    ]
+
+    if kind != 'null':
+        conditions.insert(0, {'processing_date': {'$gt': processing_date}})
+
+    for later in RESUME_TOKEN_TYPES[RESUME_TOKEN_TYPES.index(kind) + 1:]:
+        conditions.append({'processing_date': {'$type': later}})
+
+    after = {'$or': conditions}
+
+    if not fltr:
+        return after
+
+    return {'$and': [fltr, after]}
+
+
+def get_full_filter(collection=None, issn=None, from_date='1500-01-01',
+        until_date=None, extra_filter=None):
+    """Filtro das listagens completas de artigos e fascículos, por coleção,
+    ISSN, intervalo da data de processamento e ``extra_filter`` (JSON).
+    """
+    fltr = {}
+    fltr['processing_date'] = get_date_range_filter(from_date, until_date)
+
+    if collection:
+        fltr['collection'] = collection
+
+    if issn:
+        fltr['code_title'] = issn
+
+    if extra_filter:
+        fltr.update(json.loads(extra_filter))
+
+    return fltr
+
+
+def count_documents(collection, fltr, count='exact'):
+    """Obtém o total de registros de ``collection`` que atendem a ``fltr``,
+    conforme o modo ``count``:
+
+    * ``exact``: contagem completa no MongoDB (padrão);
+    * ``estimated``: usa os metadados da coleção quando não há filtro, caso
+      contrário reaproveita, por até ``COUNT_CACHE_TTL`` segundos, a contagem
+      já realizada para o mesmo filtro;
+    * ``false``: não realiza a contagem e retorna None.
+    """
+    if count in (False, 'false'):
+        return None
+
+    if count == 'estimated':
+        if not fltr:
+            return collection.estimated_document_count()
+
+        key = (collection.full_name,
+               json.dumps(fltr, sort_keys=True, default=str))
+        total = _count_cache.get(key)
+
+        if total is None:
+            total = collection.find(fltr).count()
+            _count_cache.set(key, total)
+
+        return total
+
+    return collection.find(fltr).count()
+
+
+def get_dbconn(db_dsn, settings=None, read_preference=None):
+    """Returns a database handler of the MongoDB client of the process.
+
+    The client is created on the first call of the process (and again after
+    a fork) with the ``mongo_*`` options of ``settings`` (see
+    ``articlemeta.connection``), so it may be called for every request.
+
+    The indexes are not created here, only their version is checked (see
+    ``articlemeta.indexes`` and the ``articlemeta_ensure_indexes`` command).
+
+    @param read_preference: name of the read preference of the handler, ex:
+        ``secondaryPreferred``
+    """
+    if read_preference:
+        read_preference = connection.read_preference(read_preference)
+
+    return connection.get_database(db_dsn, settings,
+                                   read_preference=read_preference)
 
-        for collection, indexes in index_by_collection.items():
-            for index in indexes:
-                print('create index %s (%s)' % (index, collection))
-                if len(index) == 1:
-                    db[collection].create_index(index[0])
-                else:
-                    db[collection].create_index(index[0], **index[1])
 
-    print('End Creation index')
-    db_url = urlparse(db_dsn)
-    conn = pymongo.MongoClient('mongodb://%s' % db_url.netloc)
-    db = conn[db_url.path[1:]]
-    _create_indexes(db)
-    return db
+def get_read_dbconn(db_dsn, settings=None):
+    """Returns a database handler for the read-only queries, of the same
+    client of ``get_dbconn``, with the read preference of the
+    ``mongo_read_preference`` and ``mongo_max_staleness_seconds`` settings.
+    """
+    return connection.get_database(
+        db_dsn, settings, read_preference=connection.read_settings(settings))
+
+
+def _exists(db, code, collection=None):
+    """Se o documento de código ``code`` existe em ``db``. As inclusões
+    consultam o primário, para não duplicar um registro recém incluído que
+    ainda não chegou ao secundário.
+    """
+    fltr = {'code': code}
+    if collection:
+        fltr['collection'] = collection
+
+    if db.find(fltr).count() >= 1:
+        return True
+
+    return False
+
+
+def _cache_reader(meta, key):
+    """Instante da leitura e handle a ser consultado para preencher o cache
+    de ``meta`` com a chave ``key``: o primário, se a chave foi alterada
+    recentemente, pois um secundário ainda pode retornar a versão anterior.
+    """
+    if meta.cache is None:
+        return None, meta.reader
+
+    read_at = meta.cache.now()
+    if meta.cache.written(key):
+        return read_at, meta.db
+
+    return read_at, meta.reader
+
+
+def _cache_readers(meta, codes):
+    """Como ``_cache_reader``, para os códigos ``codes`` de uma consulta
+    em lote. Retorna o instante da leitura e uma lista de pares (handle,
+    códigos).
+
+    Toda alteração invalida também a chave ``(None, code)``, que é então
+    verificada independentemente da coleção consultada.
+    """
+    if meta.cache is None:
+        return None, [(meta.reader, codes)]
+
+    read_at = meta.cache.now()
+    written = set(code for code in codes if meta.cache.written((None, code)))
+
+    readers = [(meta.reader, set(codes) - written), (meta.db, written)]
+
+    return read_at, [(reader, chunk) for reader, chunk in readers if chunk]
 
 
 class IssueMeta:
-    def __init__(self, db, journalmeta):
+    def __init__(self, db, journalmeta, cache=None, reader=None):
         self.db = db
+        self.reader = db if reader is None else reader
         self.journalmeta = journalmeta
+        self.cache = cache
+
+    def _invalidate(self, code, collection=None):
+        if self.cache is None:
+            return
+
+        self.cache.invalidate((collection, code))
+        self.cache.invalidate((None, code))
 
     def check(self, metadata):
         """Enriquece e normaliza itens do dicionário ``metadata``, que representa
@@ -302,9 +578,12 @@ class IssueMeta:
 
     def identifiers(self, collection=None, issn=None,
             from_date='1500-01-01', until_date=None, limit=None, offset=0,
-            extra_filter=None):
+            extra_filter=None, resume_token=None, count='exact'):
         """Lista os códigos identificadores dos fascículos. A listagem pode ser
         completa, por coleção, por ISSN ou por intervalo da data de processamento.
+
+        O arg ``resume_token`` recebe o valor de ``meta.resume_token`` da
+        página anterior e, quando presente, substitui o ``offset``.
         """
         if offset < 0:
             offset = 0
@@ -312,39 +591,42 @@ class IssueMeta:
         if limit is None or limit < 0:
             limit = LIMIT
 
-        fltr = {}
-        fltr['processing_date'] = get_date_range_filter(from_date, until_date)
+        fltr = get_full_filter(collection=collection, issn=issn,
+                from_date=from_date, until_date=until_date,
+                extra_filter=extra_filter)
 
-        if collection:
-            fltr['collection'] = collection
-
-        if issn:
-            fltr['code_title'] = issn
+        total = count_documents(self.reader, fltr, count=count)
+        projection = {'code': 1, 'collection': 1, 'processing_date': 1}
 
-        if extra_filter:
-            fltr.update(json.loads(extra_filter))
-
-        total = self.db.find(fltr).count()
-        data = self.db.find(fltr, {
-            'code': 1, 'collection': 1, 'processing_date': 1}).sort(
-                    'processing_date').skip(offset).limit(limit)
+        if resume_token:
+            data = self.reader.find(get_resume_filter(fltr, resume_token),
+                    projection).sort(KEYSET_SORT).limit(limit)
+        else:
+            data = self.reader.find(fltr, projection).sort(
+                    KEYSET_SORT).skip(offset).limit(limit)
 
         meta = {
             'limit': limit,
             'offset': offset,
             'filter': fltr,
-            'total': total
+            'total': total,
+            'resume_token': None
         }
 
         result = {'meta': meta, 'objects': []}
+        last = None
         for i in data:
             rec = {
                 'code': i['code'],
                 'collection': i['collection'],
-                'processing_date': i['processing_date']
+                'processing_date': i.get('processing_date')
             }
 
             result['objects'].append(dates_to_string(rec))
+            last = i
+
+        if last and len(result['objects']) == limit:
+            result['meta']['resume_token'] = encode_resume_token(last)
 
         result['meta']['filter'] = dates_to_string(result['meta']['filter'])
 
@@ -360,26 +642,76 @@ class IssueMeta:
 
         Retorna um dicionário ou None.
         """
-        fltr = {'code': code}
-        if collection:
-            fltr['collection'] = collection
+        key = (collection, code)
+        data = self.cache.get(key) if self.cache is not None else None
 
-        data = self.db.find_one(fltr)
+        if data is None:
+            fltr = {'code': code}
+            if collection:
+                fltr['collection'] = collection
 
-        if not data:
-            return None
+            read_at, reader = _cache_reader(self, key)
+            data = reader.find_one(fltr, {'_id': 0})
+
+            if not data:
+                return None
+
+            data = dates_to_string(data)
+
+            if self.cache is not None:
+                self.cache.set(key, data, read_at=read_at)
+
+        data = copy.deepcopy(data)
 
         if replace_journal_metadata:
             journal = self.journalmeta.get(collection=collection, issn=code[0:9])
             if journal and len(journal) != 0:
                 data['title'] = journal[0]
 
-        del(data['_id'])
+        return data
+
+    def get_many(self, codes, collection=None):
+        """Obtém, em uma única consulta, os fascículos de códigos
+        identificadores ``codes``. O arg ``collection`` pode ser um acrônimo
+        de coleção ou uma lista de acrônimos.
 
-        return dates_to_string(data)
+        Retorna um dicionário cujas chaves são tuplas ``(collection, code)``.
+        """
+        codes = set(code for code in codes if code)
+        issues = {}
+
+        if self.cache is not None and isinstance(collection, str):
+            for code in list(codes):
+                issue = self.cache.get((collection, code))
+                if issue is not None:
+                    issues[(collection, code)] = copy.deepcopy(issue)
+                    codes.remove(code)
+
+        if not codes:
+            return issues
+
+        read_at, readers = _cache_readers(self, codes)
+
+        for reader, chunk in readers:
+            fltr = {'code': {'$in': list(chunk)}}
+            if isinstance(collection, (list, tuple, set)):
+                fltr['collection'] = {'$in': list(collection)}
+            elif collection:
+                fltr['collection'] = collection
+
+            for issue in reader.find(fltr, {'_id': 0}):
+                key = (issue['collection'], issue['code'])
+                issues[key] = dates_to_string(issue)
+
+                if self.cache is not None:
+                    self.cache.set(key, copy.deepcopy(issues[key]),
+                                   read_at=read_at)
+
+        return issues
 
     def get_issues_full(self, collection=None, issn=None, from_date='1500-01-01',
-            until_date=None, limit=LIMIT, offset=0, extra_filter=None):
+            until_date=None, limit=LIMIT, offset=0, extra_filter=None,
+            count='exact'):
         """Obtém uma lista dos fascículos, que pode ser geral, por coleção,
         por periódico ou intervalo de data de publicação. Há ainda a
         possibilidade de usar filtros adhoc por meio de consultas diretas ao
@@ -403,8 +735,8 @@ class IssueMeta:
         if extra_filter:
             fltr.update(json.loads(extra_filter))
 
-        total = self.db.find(fltr).count()
-        data = self.db.find(fltr, {'_id': 0}).sort(
+        total = count_documents(self.reader, fltr, count=count)
+        data = self.reader.find(fltr, {'_id': 0}).sort(
                 'processing_date').skip(offset).limit(limit)
 
         meta = {
@@ -422,18 +754,29 @@ class IssueMeta:
 
         return result
 
+    def iter_issues_full(self, collection=None, issn=None,
+            from_date='1500-01-01', until_date=None, extra_filter=None,
+            batch_size=STREAM_BATCH_SIZE):
+        """Percorre todos os fascículos que atendem aos mesmos filtros de
+        ``get_issues_full``, sem paginação. Os registros são obtidos do
+        MongoDB em lotes de ``batch_size`` e entregues um a um, de forma que
+        o consumo de memória não depende do tamanho do resultado.
+        """
+        fltr = get_full_filter(collection=collection, issn=issn,
+                from_date=from_date, until_date=until_date,
+                extra_filter=extra_filter)
+
+        data = self.reader.find(fltr, {'_id': 0}).sort(KEYSET_SORT).batch_size(
+                batch_size)
+
+        for issue in data:
+            yield dates_to_string(issue)
+
     def exists(self, code, collection=None):
         """Se o fascículo de código ``code`` existe. A consulta pode ser
         realizada no contexto global ou de coleção.
         """
-        fltr = {'code': code}
-        if collection:
-            fltr['collection'] = collection
-
-        if self.db.find(fltr).count() >= 1:
-            return True
-
-        return False
+        return _exists(self.reader, code, collection)
 
     def delete(self, code, collection=None):
         """Remove o fascículo de código igual a ``code``, da coleção
@@ -450,6 +793,7 @@ class IssueMeta:
             fltr['collection'] = collection
 
         deleted = self.db.delete_one(fltr)
+        self._invalidate(code, collection)
 
         fltr['deleted_count'] = deleted.deleted_count
 
@@ -466,15 +810,16 @@ class IssueMeta:
         if not issue:
             return None
 
-        if self.exists(issue['code'], issue['collection']):
+        if _exists(self.db, issue['code'], issue['collection']):
             return self.update(issue)
 
         issue['created_at'] = issue['processing_date']
 
         self.db.update_one(
                 {'code': issue['code'], 'collection': issue['collection']},
-                {'$set': issue},
+                _revision_update(issue),
                 upsert=True)
+        self._invalidate(issue['code'], issue['collection'])
 
         return dates_to_string(issue)
 
@@ -493,8 +838,9 @@ class IssueMeta:
 
         self.db.update_one(
                 {'code': issue['code'], 'collection': issue['collection']},
-                {'$set': issue},
+                _revision_update(issue),
                 upsert=True)
+        self._invalidate(issue['code'], issue['collection'])
 
         return dates_to_string(issue)
 
@@ -516,7 +862,7 @@ class IssueMeta:
                 }
         projection = {'code': True, '_id': False}
 
-        data = self.db.find_one(fltr, projection)
+        data = self.reader.find_one(fltr, projection)
         try:
             return data.get('code', '')
         except AttributeError:
@@ -530,7 +876,7 @@ class IssueMeta:
                 }
         projection = {'code': True, '_id': False}
 
-        data = self.db.find_one(fltr, projection)
+        data = self.reader.find_one(fltr, projection)
         try:
             return data.get('code', '')
         except AttributeError:
@@ -538,8 +884,17 @@ class IssueMeta:
 
 
 class JournalMeta:
-    def __init__(self, db):
+    def __init__(self, db, cache=None, reader=None):
         self.db = db
+        self.reader = db if reader is None else reader
+        self.cache = cache
+
+    def _invalidate(self, code, collection=None):
+        if self.cache is None:
+            return
+
+        self.cache.invalidate((collection, code))
+        self.cache.invalidate((None, code))
 
     def check(self, metadata):
         """Enriquece e normaliza itens do dicionário ``metadata``, que representa
@@ -570,12 +925,36 @@ class JournalMeta:
 
         return metadata_copy
 
+    def iter_journals(self, collection=None, issn=None,
+            batch_size=STREAM_BATCH_SIZE):
+        """Percorre os periódicos filtrados por coleção e/ou por ISSN, obtendo
+        os registros do MongoDB em lotes de ``batch_size``.
+        """
+        fltr = {}
+        if issn:
+            fltr['code'] = issn
+
+        if collection:
+            fltr['collection'] = collection
+
+        data = self.reader.find(fltr, {'_id': 0}).sort(KEYSET_SORT).batch_size(
+                batch_size)
+
+        for journal in data:
+            yield dates_to_string(journal)
+
     def get(self, collection=None, issn=None):
         """Obtém uma lista de periódicos que pode ser filtrada por coleção e/ou
         por ISSN.
 
         Retorna uma lista de dicionários ou None.
         """
+        key = (collection, issn)
+        if issn and self.cache is not None:
+            data = self.cache.get(key)
+            if data is not None:
+                return copy.deepcopy(data)
+
         fltr = {}
         if issn:
             fltr['code'] = issn
@@ -583,12 +962,59 @@ class JournalMeta:
         if collection:
             fltr['collection'] = collection
 
-        data = self.db.find(fltr, {'_id': 0})
+        read_at, reader = _cache_reader(self, key)
+        data = reader.find(fltr, {'_id': 0})
 
         if not data:
             return None
 
-        return [dates_to_string(i) for i in data]
+        data = [dates_to_string(i) for i in data]
+
+        if issn and self.cache is not None:
+            self.cache.set(key, copy.deepcopy(data), read_at=read_at)
+
+        return data
+
+    def get_many(self, issns, collection=None):
+        """Obtém, em uma única consulta, os periódicos de ISSN ``issns``,
+        opcionalmente filtrados por coleção.
+
+        Retorna um dicionário de ISSN para a lista de periódicos, equivalente
+        ao resultado de ``get`` para cada ISSN.
+        """
+        issns = set(issn for issn in issns if issn)
+        journals = {}
+
+        if self.cache is not None:
+            for issn in list(issns):
+                journal = self.cache.get((collection, issn))
+                if journal is not None:
+                    journals[issn] = copy.deepcopy(journal)
+                    issns.remove(issn)
+
+        if not issns:
+            return journals
+
+        read_at, readers = _cache_readers(self, issns)
+
+        found = {}
+        for reader, chunk in readers:
+            fltr = {'code': {'$in': list(chunk)}}
+            if collection:
+                fltr['collection'] = collection
+
+            for journal in reader.find(fltr, {'_id': 0}):
+                found.setdefault(journal['code'], []).append(
+                    dates_to_string(journal))
+
+        if self.cache is not None:
+            for issn, journal in found.items():
+                self.cache.set((collection, issn), copy.deepcopy(journal),
+                               read_at=read_at)
+
+        journals.update(found)
+
+        return journals
 
     def delete(self, code, collection):
         """Remove o periódico de ISSN igual a ``code``, da coleção
@@ -605,6 +1031,7 @@ class JournalMeta:
                 'collection': collection,
                 }
         deleted = self.db.delete_one(fltr)
+        self._invalidate(code, collection)
         fltr['deleted_count'] = deleted.deleted_count
         return fltr
 
@@ -620,16 +1047,17 @@ class JournalMeta:
             return None
 
         # aqui tem um comportamento de upsert!
-        if self.exists(journal['code'], journal['collection']):
+        if _exists(self.db, journal['code'], journal['collection']):
             return self.update(journal)
 
         journal['created_at'] = journal['processing_date']
 
         self.db.update_one(
                 {'code': journal['code'], 'collection': journal['collection']},
-                {'$set': journal},
+                _revision_update(journal),
                 upsert=True
         )
+        self._invalidate(journal['code'], journal['collection'])
 
         return dates_to_string(journal)
 
@@ -648,17 +1076,21 @@ class JournalMeta:
 
         self.db.update_one(
             {'code': journal['code'], 'collection': journal['collection']},
-            {'$set': journal},
+            _revision_update(journal),
             upsert=True
         )
+        self._invalidate(journal['code'], journal['collection'])
 
         return dates_to_string(journal)
 
     def identifiers(self, collection=None, issn=None, limit=None,
-            offset=0, extra_filter=None):
+            offset=0, extra_filter=None, resume_token=None, count='exact'):
         """Lista os códigos identificadores dos periódicos. A listagem pode ser
         completa, por coleção ou por ISSN (Fabio e eu pensamos que a listagem
         por ISSN não faz sentido, e o arg ``issn`` deveria ser removido).
+
+        O arg ``resume_token`` recebe o valor de ``meta.resume_token`` da
+        página anterior e, quando presente, substitui o ``offset``.
         """
         if offset < 0:
             offset = 0
@@ -676,26 +1108,36 @@ class JournalMeta:
         if extra_filter:
             fltr.update(json.loads(extra_filter))
 
-        total = self.db.find(fltr).count()
-        data = self.db.find(
-                fltr,
-                {'code': 1, 'collection': 1, 'processing_date': 1}).sort(
-                        'processing_date').skip(offset).limit(limit)
+        total = count_documents(self.reader, fltr, count=count)
+        projection = {'code': 1, 'collection': 1, 'processing_date': 1}
+
+        if resume_token:
+            data = self.reader.find(get_resume_filter(fltr, resume_token),
+                    projection).sort(KEYSET_SORT).limit(limit)
+        else:
+            data = self.reader.find(fltr, projection).sort(
+                    KEYSET_SORT).skip(offset).limit(limit)
+
+        data = list(data)
 
         meta = {
                 'limit': limit,
                 'offset': offset,
                 'filter': fltr,
                 'total': total,
+                'resume_token': None,
                 }
 
+        if data and len(data) == limit:
+            meta['resume_token'] = encode_resume_token(data[-1])
+
         result = {
                 'meta': meta,
                 'objects': [
                     dates_to_string({
                         'code': d['code'],
                         'collection': d['collection'],
-                        'processing_date': d['processing_date']}) for d in data]}
+                        'processing_date': d.get('processing_date')}) for d in data]}
 
         result['meta']['filter'] = dates_to_string(result['meta']['filter'])
 
@@ -705,20 +1147,13 @@ class JournalMeta:
         """Se o periódico de código ``code`` existe. A consulta pode ser
         realizada no contexto global ou de coleção.
         """
-        fltr = {'code': code}
-
-        if collection:
-            fltr['collection'] = collection
-
-        if self.db.find(fltr).count() >= 1:
-            return True
-
-        return False
+        return _exists(self.reader, code, collection)
 
 
 class ArticleMeta:
-    def __init__(self, db, journalmeta, issuemeta):
+    def __init__(self, db, journalmeta, issuemeta, reader=None):
         self.db = db
+        self.reader = db if reader is None else reader
         self.journalmeta = journalmeta
         self.issuemeta = issuemeta
 
@@ -766,9 +1201,14 @@ class ArticleMeta:
         return metadata_copy
 
     def identifiers(self, collection=None, issn=None, from_date='1500-01-01',
-            until_date=None, limit=LIMIT, offset=0, extra_filter=None):
+            until_date=None, limit=LIMIT, offset=0, extra_filter=None,
+            resume_token=None, count='exact'):
         """Lista os códigos identificadores dos artigos. A listagem pode ser
         completa, por coleção, por ISSN ou por intervalo da data de processamento.
+
+        O arg ``resume_token`` recebe o valor de ``meta.resume_token`` da
+        página anterior e, quando presente, substitui o ``offset``. Cada página
+        tem então o mesmo custo, independente da profundidade da paginação.
         """
         if offset < 0:
             offset = 0
@@ -788,27 +1228,36 @@ class ArticleMeta:
         if extra_filter:
             fltr.update(json.loads(extra_filter))
 
-        total = self.db.find(fltr).count()
-        data = self.db.find(fltr, {
+        total = count_documents(self.reader, fltr, count=count)
+        projection = {
             'code': 1,
             'collection': 1,
             'processing_date': 1,
             'aid': 1,
-            'doi': 1}).sort('processing_date').skip(offset).limit(limit)
+            'doi': 1}
+
+        if resume_token:
+            data = self.reader.find(get_resume_filter(fltr, resume_token),
+                    projection).sort(KEYSET_SORT).limit(limit)
+        else:
+            data = self.reader.find(fltr, projection).sort(
+                    KEYSET_SORT).skip(offset).limit(limit)
 
         meta = {
             'limit': limit,
             'offset': offset,
             'filter': fltr,
-            'total': total
+            'total': total,
+            'resume_token': None
         }
 
         result = {'meta': meta, 'objects': []}
+        last = None
         for i in data:
             rec = {
                 'code': i['code'],
                 'collection': i['collection'],
-                'processing_date': i['processing_date']
+                'processing_date': i.get('processing_date')
             }
             if 'aid' in i:
                 rec['aid'] = i['aid']
@@ -817,13 +1266,18 @@ class ArticleMeta:
                 rec['doi'] = i['doi']
 
             result['objects'].append(dates_to_string(rec))
+            last = i
+
+        if last and len(result['objects']) == limit:
+            result['meta']['resume_token'] = encode_resume_token(last)
 
         result['meta']['filter'] = dates_to_string(result['meta']['filter'])
 
         return result
 
     def counter_dict(self, collection=None, issn=None, from_date='1500-01-01',
-            until_date=None, limit=LIMIT, offset=0, extra_filter=None):
+            until_date=None, limit=LIMIT, offset=0, extra_filter=None,
+            count='exact'):
         """Lista os códigos identificadores dos artigos. A listagem pode ser
         completa, por coleção, por ISSN ou por intervalo da data de processamento.
         """
@@ -845,8 +1299,8 @@ class ArticleMeta:
         if extra_filter:
             fltr.update(json.loads(extra_filter))
 
-        total = self.db.find(fltr).count()
-        items = self.db.find(fltr, {
+        total = count_documents(self.reader, fltr, count=count)
+        items = self.reader.find(fltr, {
             'code': 1,
             'collection': 1,
             'processing_date': 1,
@@ -871,8 +1325,13 @@ class ArticleMeta:
 
         result = {'meta': meta, 'objects': []}
 
+        items = list(items)
+        issues = self.issuemeta.get_many(
+            [item.get('code_issue') for item in items],
+            collection=set(item['collection'] for item in items))
+
         for item in items:
-            issue = self.issuemeta.get(collection=item['collection'], code=item['code_issue'])
+            issue = issues.get((item['collection'], item['code_issue']))
             if issue:
                 item['issue'] = issue
 
@@ -887,7 +1346,7 @@ class ArticleMeta:
         """Obtém um artigo de código identificador ``code``. Opcionalmente,
         um acrônimo de coleção pode ser passado por meio do arg ``collection``
         para especializar a busca. O código identificador poderá ser: o código
-        de fato, o doi ou o aid do artigo.
+        de fato, o doi ou o aid do artigo (ver ``get_identifier_filters``).
 
         O arg ``replace_journal_metadata`` faz com que o resultado da
         consulta contenha a versão mais atualizada dos metadados do periódico.
@@ -895,31 +1354,34 @@ class ArticleMeta:
 
         Retorna um dicionário ou None.
         """
-        fltr = {'$or': [{'code': code}, {'doi': code}, {'aid': code}]}
-        if collection:
-            fltr['collection'] = collection
-
         fields = None
 
         if not body:
             fields = {'body': 0}
 
-        if fields:
-            data = self.db.find_one(fltr, fields)
-        else:
-            data = self.db.find_one(fltr)
+        for fltr in get_identifier_filters(code):
+            if collection:
+                fltr['collection'] = collection
 
-        if not data:
+            if fields:
+                data = self.reader.find_one(fltr, fields)
+            else:
+                data = self.reader.find_one(fltr)
+
+            if data:
+                break
+        else:
             return None
 
         if replace_journal_metadata is True:
-            journal = self.journalmeta.get(collection=collection,
+            journal = self.journalmeta.get(collection=data['collection'],
                     issn=data['title']['v400'][0]['_'])
 
             if journal and len(journal) != 0:
                 data['title'] = journal[0]
 
-        issue = self.issuemeta.get(collection=collection, code=data['code'][1:18])
+        issue = self.issuemeta.get(collection=data['collection'],
+                code=data['code'][1:18])
 
         if issue:
             data['issue'] = issue
@@ -928,11 +1390,144 @@ class ArticleMeta:
 
         del(data['_id'])
 
-        return dates_to_string(data)
+        return ArticleDocument.from_record(data)
+
+    def get_many(self, codes, collection=None, replace_journal_metadata=False,
+            body=False):
+        """Obtém os artigos de códigos identificadores ``codes``, que assim
+        como em ``get`` podem ser o código de fato, o doi ou o aid do artigo.
+        Os artigos são obtidos com uma consulta ao MongoDB por tipo de
+        identificador, e os metadados de fascículo e periódico com uma
+        consulta cada, para toda a lista.
+
+        Retorna um dicionário na forma:
+
+        .. code-block:: python
+
+            {'meta': {'total': 2, 'found': 1, 'not_found': ['S0000']},
+             'objects': [{...}, None]}
+
+        onde ``objects`` segue a ordem de ``codes`` e contém None para os
+        códigos não encontrados, também listados em ``meta.not_found``.
+        """
+        fields = {'_id': 0}
+        if not body:
+            fields['body'] = 0
+
+        articles = self._resolve_many(codes, collection=collection,
+                fields=fields)
+
+        self._join_issues_and_journals(
+            list({id(a): a for a in articles.values()}.values()),
+            replace_journal_metadata=replace_journal_metadata,
+            issue_title=False)
+
+        objects = []
+        not_found = []
+        for code in codes:
+            article = articles.get(code)
+
+            if article is None:
+                not_found.append(code)
+                objects.append(None)
+                continue
+
+            objects.append(ArticleDocument.from_record(article))
+
+        meta = {
+            'total': len(codes),
+            'found': len(codes) - len(not_found),
+            'not_found': not_found,
+        }
+
+        return {'meta': meta, 'objects': objects}
+
+    def _resolve_many(self, codes, collection=None, fields=None):
+        """Obtém os artigos de identificadores ``codes`` com, no máximo, uma
+        consulta ``$in`` por tipo de identificador (ver
+        ``get_identifier_filters``).
+
+        Retorna um dicionário de identificador para artigo.
+        """
+        by_type = {'code': set(), 'doi': set(), 'aid': set()}
+        for code in codes:
+            if code:
+                by_type[identifier_type(code)].add(code)
+
+        def find(field, values):
+            fltr = {field: {'$in': sorted(values)}}
+            if collection:
+                fltr['collection'] = collection
+
+            return self.reader.find(fltr, fields)
+
+        articles = {}
+
+        if by_type['doi']:
+            dois = {}
+            for code in by_type['doi']:
+                dois.setdefault(code.upper(), []).append(code)
+
+            for article in find('doi', by_type['doi'] | set(dois)):
+                for code in dois.get(article['doi'].upper(), []):
+                    articles.setdefault(code, article)
+
+        if by_type['aid']:
+            for article in find('aid', by_type['aid']):
+                articles.setdefault(article['aid'], article)
+
+        by_type['code'].update(by_type['aid'] - set(articles))
+
+        if by_type['code']:
+            for article in find('code', by_type['code']):
+                articles.setdefault(article['code'], article)
+
+        return articles
+
+    def _join_issues_and_journals(self, articles,
+            replace_journal_metadata=False, issue_title=True):
+        """Atualiza os metadados de fascículo e, opcionalmente, de periódico
+        dos artigos em ``articles`` da mesma forma que ``get``, ou seja, a
+        partir dos registros da coleção de cada artigo, realizando uma
+        consulta do MongoDB para toda a lista.
+
+        Com ``issue_title=False`` os metadados do periódico contidos no
+        fascículo (``title``) são removidos, como em ``get``.
+        """
+        if not articles:
+            return articles
+
+        collections = list(set(article['collection'] for article in articles))
+
+        journals = {}
+        if replace_journal_metadata:
+            journals = self.journalmeta.get_many(
+                [article['title']['v400'][0]['_'] for article in articles])
+
+        issues = self.issuemeta.get_many(
+            [article['code'][1:18] for article in articles],
+            collection=collections)
+
+        for article in articles:
+            if replace_journal_metadata:
+                for journal in journals.get(article['title']['v400'][0]['_'], []):
+                    if journal['collection'] == article['collection']:
+                        article['title'] = journal
+                        break
+
+            issue = issues.get((article['collection'], article['code'][1:18]))
+
+            if issue:
+                article['issue'] = dict(issue)
+                if not issue_title and 'title' in article['issue']:
+                    del(article['issue']['title'])
+
+        return articles
 
     def get_articles_full(self, collection=None, issn=None,
             from_date='1500-01-01', until_date=None, limit=100, offset=0,
-            extra_filter=None, replace_journal_metadata=False, body=False):
+            extra_filter=None, replace_journal_metadata=False, body=False,
+            count='exact'):
         """Obtém uma lista dos artigos, que pode ser geral, por coleção,
         por periódico ou intervalo de data de publicação. Há ainda a
         possibilidade de usar filtros adhoc por meio de consultas diretas ao
@@ -948,17 +1543,9 @@ class ArticleMeta:
         if limit < 0:
             limit = 100
 
-        fltr = {}
-        fltr['processing_date'] = get_date_range_filter(from_date, until_date)
-
-        if collection:
-            fltr['collection'] = collection
-
-        if issn:
-            fltr['code_title'] = issn
-
-        if extra_filter:
-            fltr.update(json.loads(extra_filter))
+        fltr = get_full_filter(collection=collection, issn=issn,
+                from_date=from_date, until_date=until_date,
+                extra_filter=extra_filter)
 
         content = {
             '_id': 0
@@ -967,8 +1554,8 @@ class ArticleMeta:
         if body is False:
             content['body'] = 0
 
-        total = self.db.find(fltr).count()
-        data = self.db.find(fltr, content).sort(
+        total = count_documents(self.reader, fltr, count=count)
+        data = self.reader.find(fltr, content).sort(
                 'processing_date').skip(offset).limit(limit)
 
         meta = {
@@ -979,38 +1566,62 @@ class ArticleMeta:
         }
 
         result = {'meta': meta, 'objects': []}
-        for article in data:
-            if replace_journal_metadata:
-                journal = self.journalmeta.get(collection=collection,
-                        issn=article['title']['v400'][0]['_'])
+        for article in self._join_issues_and_journals(list(data),
+                replace_journal_metadata=replace_journal_metadata):
+            result['objects'].append(dates_to_string(article))
 
-                if journal and len(journal) == 1:
-                    article['title'] = journal[0]
+        result['meta']['filter'] = dates_to_string(result['meta']['filter'])
 
-            issue = self.issuemeta.get(collection=collection,
-                    code=article['code_issue'])
+        return result
 
-            if issue:
-                article['issue'] = issue
+    def iter_articles_full(self, collection=None, issn=None,
+            from_date='1500-01-01', until_date=None, extra_filter=None,
+            replace_journal_metadata=False, body=False,
+            batch_size=STREAM_BATCH_SIZE):
+        """Percorre todos os artigos que atendem aos mesmos filtros de
+        ``get_articles_full``, sem paginação e sem o limite de registros por
+        página.
+
+        Os registros são obtidos do MongoDB em lotes de ``batch_size`` e os
+        metadados de fascículo e periódico são atualizados lote a lote, de
+        forma que o consumo de memória não depende do tamanho do resultado.
+        """
+        fltr = get_full_filter(collection=collection, issn=issn,
+                from_date=from_date, until_date=until_date,
+                extra_filter=extra_filter)
 
-            result['objects'].append(dates_to_string(article))
+        content = {
+            '_id': 0
+        }
 
-        result['meta']['filter'] = dates_to_string(result['meta']['filter'])
+        if body is False:
+            content['body'] = 0
 
-        return result
+        data = self.reader.find(fltr, content).sort(KEYSET_SORT).batch_size(
+                batch_size)
+
+        chunk = []
+        for article in data:
+            chunk.append(article)
+
+            if len(chunk) < batch_size:
+                continue
+
+            for item in self._join_issues_and_journals(chunk,
+                    replace_journal_metadata=replace_journal_metadata):
+                yield dates_to_string(item)
+
+            chunk = []
+
+        for item in self._join_issues_and_journals(chunk,
+                replace_journal_metadata=replace_journal_metadata):
+            yield dates_to_string(item)
 
     def exists(self, code, collection=None):
         """Se o artigo de código ``code`` existe. A consulta pode ser
         realizada no contexto global ou de coleção.
         """
-        fltr = {'code': code}
-        if collection:
-            fltr['collection'] = collection
-
-        if self.db.find(fltr).count() >= 1:
-            return True
-
-        return False
+        return _exists(self.reader, code, collection)
 
     def delete(self, code, collection=None):
         """Remove o artigo de código igual a ``code``, da coleção
@@ -1044,14 +1655,14 @@ class ArticleMeta:
         if not article:
             return None
 
-        if self.exists(article['code'], article['collection']):
+        if _exists(self.db, article['code'], article['collection']):
             return self.update(article)
 
         article['created_at'] = article['processing_date']
 
         self.db.update_one(
             {'code': article['code'], 'collection': article['collection']},
-            {'$set': article},
+            _revision_update(article),
             upsert=True
         )
 
@@ -1072,14 +1683,15 @@ class ArticleMeta:
 
         self.db.update_one(
             {'code': article['code'], 'collection': article['collection']},
-            {'$set': article},
+            _revision_update(article),
             upsert=True
         )
 
         return dates_to_string(article)
 
     def identifiers_press_release(self, collection=None, issn=None,
-            from_date='1500-01-01', until_date=None, limit=LIMIT, offset=0):
+            from_date='1500-01-01', until_date=None, limit=LIMIT, offset=0,
+            count='exact'):
         if offset < 0:
             offset = 0
 
@@ -1097,8 +1709,8 @@ class ArticleMeta:
         if issn:
             fltr['code_title'] = issn
 
-        total = self.db.find(fltr).count()
-        data = self.db.find(fltr, {
+        total = count_documents(self.reader, fltr, count=count)
+        data = self.reader.find(fltr, {
             'code': 1,
             'collection': 1,
             'processing_date': 1,
@@ -1117,7 +1729,7 @@ class ArticleMeta:
             rec = {
                 'code': i['code'],
                 'collection': i['collection'],
-                'processing_date': i['processing_date']
+                'processing_date': i.get('processing_date')
             }
             if 'aid' in i:
                 rec['aid'] = i['aid']
@@ -1136,25 +1748,44 @@ class ArticleMeta:
         if collection:
             fltr['collection'] = collection
 
-        self.db.update_one(fltr, {'$set': {'doaj_id': str(doaj_id)}})
+        self.db.update_one(fltr, _revision_update({'doaj_id': str(doaj_id)}))
 
     def set_aid(self, code, collection, aid):
         fltr = {'code': code}
         if collection:
             fltr['collection'] = collection
 
-        self.db.update_one(fltr, {'$set': {'aid': str(aid)}})
+        self.db.update_one(fltr, _revision_update({'aid': str(aid)}))
 
 
 class CollectionMeta:
+    # conteúdo dos arquivos de coleções já lidos, por caminho:
+    # {filepath: (mtime, tamanho, dados)}.
+    _files = {}
+    _files_lock = threading.Lock()
+
     def __init__(self, pubstatus, filepath=COLLECTIONS_PATH):
         self._filepath = filepath
         self._pubstatus = pubstatus
 
     @property
     def _data(self):
-        with open(self._filepath) as f:
-            return json.load(f)
+        """Conteúdo do arquivo de coleções. O arquivo é lido apenas uma vez
+        por processo, e novamente somente quando é alterado (data de
+        modificação ou tamanho). Retorna uma cópia, que pode ser modificada.
+        """
+        stat = os.stat(self._filepath)
+        version = (stat.st_mtime_ns, stat.st_size)
+
+        with self._files_lock:
+            cached = self._files.get(self._filepath)
+
+            if cached is None or cached[:2] != version:
+                with open(self._filepath) as f:
+                    cached = version + (json.load(f),)
+                self._files[self._filepath] = cached
+
+        return copy.deepcopy(cached[2])
 
     def _add_counts(self, data, docs_count):
         data['document_count'] = docs_count.get(data.get('acron'))
@@ -1179,36 +1810,222 @@ class CollectionMeta:
 
 
 class PublicationStatus:
-    def __init__(self, host='http://publication.scielo.org'):
-        self._host = host
+    """Contagens de documentos e de periódicos por coleção, obtidas do
+    serviço de status de publicação.
 
-    def documents_count(self):
+    As contagens são servidas de um cache e nunca aguardam o serviço: uma
+    contagem ainda não obtida é retornada vazia e solicitada a uma thread em
+    segundo plano, que também renova as contagens a cada ``ttl`` segundos.
+    Em caso de falha do serviço, a última contagem obtida é mantida.
+
+    O arg ``background=False`` desativa a thread; as contagens são então
+    obtidas apenas por meio de ``refresh``.
+
+    As contagens de uma renovação são obtidas simultaneamente, por até
+    ``workers`` consultas que compartilham as conexões de uma mesma sessão
+    HTTP, e a renovação aguarda no máximo ``deadline`` segundos. As consultas
+    que excederem o prazo são registradas quando concluídas.
+    """
+
+    def __init__(self, host='http://publication.scielo.org',
+                 ttl=PUBLICATION_STATUS_TTL, background=True,
+                 workers=PUBLICATION_STATUS_WORKERS,
+                 deadline=PUBLICATION_STATUS_DEADLINE, timer=time.monotonic):
+        self._host = host
+        self.ttl = ttl
+        self.background = background
+        self.workers = workers
+        self.deadline = deadline
+        self._timer = timer
+        # {chave: (obtida em, contagem)}, onde a chave é ('documents',) ou
+        # ('journals', coleção).
+        self._counts = {}
+        self._requested = set()
+        self._fetching = set()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._pool = None
+        self._pool_pid = None
+
+    def _http(self):
+        """Sessão HTTP e pool de threads das consultas, recriados nos
+        processos filhos, após um fork.
+        """
+        with self._lock:
+            if self._pool is None or self._pool_pid != os.getpid():
+                session = requests.Session()
+                adapter = requests.adapters.HTTPAdapter(
+                    pool_connections=1, pool_maxsize=self.workers)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                executor = futures.ThreadPoolExecutor(
+                    max_workers=self.workers,
+                    thread_name_prefix='publication-status')
+
+                self._pool = (session, executor)
+                self._pool_pid = os.getpid()
+
+            return self._pool
+
+    def _fetch_documents_count(self, session):
         try:
-            data = requests.get(self._host+'/api/v1/documents?aggs=collection', timeout=1).json()
+            data = session.get(self._host+'/api/v1/documents?aggs=collection', timeout=1).json()
         except (requests.exceptions.RequestException, json.JSONDecodeError):
-            data = {}
+            return None
         return {item['key']: item['doc_count'] for item in data.get('collection', {}).get('buckets', [])}
 
-    def journals_count(self, collection):
+    def _fetch_journals_count(self, session, collection):
         try:
-            data = requests.get(self._host+'/api/v1/journals?aggs=status&collection=%s' % collection, timeout=0.5).json()
+            data = session.get(self._host+'/api/v1/journals?aggs=status&collection=%s' % collection, timeout=0.5).json()
         except (requests.exceptions.RequestException, json.JSONDecodeError):
-            data = {}
+            return None
         return {item['key']: item['doc_count'] for item in data.get('status', {}).get('buckets', [])}
 
+    def _fetch(self, session, key):
+        """Obtém e registra a contagem ``key``.
+        """
+        try:
+            if key[0] == 'documents':
+                count = self._fetch_documents_count(session)
+            else:
+                count = self._fetch_journals_count(session, key[1])
+        except Exception:
+            count = None
+
+        with self._lock:
+            self._fetching.discard(key)
+
+            if count is not None:
+                self._counts[key] = (self._timer(), count)
+            elif key in self._counts:
+                # mantém a última contagem, tentando novamente após o ttl.
+                self._counts[key] = (self._timer(), self._counts[key][1])
+            else:
+                self._counts[key] = (self._timer(), {})
+
+    def _due(self):
+        """Chaves sem contagem ou com a contagem expirada, exceto as que já
+        estão sendo obtidas.
+        """
+        now = self._timer()
+
+        with self._lock:
+            return [key for key in self._requested - self._fetching
+                    if key not in self._counts or
+                    self._counts[key][0] + self.ttl <= now]
+
+    def refresh(self, keys=None):
+        """Obtém do serviço as contagens ``keys``, por padrão as que estão
+        pendentes ou expiradas, aguardando no máximo ``deadline`` segundos.
+
+        Retorna as chaves cujas contagens não foram obtidas no prazo.
+        """
+        keys = self._due() if keys is None else keys
+
+        if not keys:
+            return []
+
+        session, executor = self._http()
+
+        with self._lock:
+            self._fetching.update(keys)
+
+        pending = {executor.submit(self._fetch, session, key): key
+                   for key in keys}
+        futures.wait(pending, timeout=self.deadline)
+
+        return [key for future, key in pending.items() if not future.done()]
+
+    def _run(self):
+        while True:
+            # as contagens em andamento não definem o prazo, a renovação
+            # seguinte não as solicitaria novamente.
+            with self._lock:
+                fetched = [fetched_at
+                           for key, (fetched_at, _) in self._counts.items()
+                           if key not in self._fetching]
+            wait = self.ttl
+            if fetched:
+                wait = max(0, min(fetched) + self.ttl - self._timer())
+
+            self._wakeup.wait(wait)
+            self._wakeup.clear()
+
+            try:
+                self.refresh()
+            except Exception:
+                # a thread de renovação não pode ser interrompida.
+                pass
+
+    def _start(self):
+        """Inicia a thread de renovação, também nos processos criados por
+        fork após o seu início, como os workers do gunicorn.
+        """
+        if not self.background:
+            return
+
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+
+            self._pid = os.getpid()
+            self._thread = threading.Thread(
+                target=self._run, name='publication-status', daemon=True)
+            self._thread.start()
+
+    def _get(self, key):
+        self._start()
+
+        with self._lock:
+            self._requested.add(key)
+            cached = self._counts.get(key)
+
+        if cached is None:
+            self._wakeup.set()
+            return {}
+
+        return cached[1]
+
+    def documents_count(self):
+        return self._get(('documents',))
+
+    def journals_count(self, collection):
+        return self._get(('journals', collection))
+
+
+# instância compartilhada pelos DataBrokers do processo, mantendo o cache das
+# contagens entre as requisições.
+_publication_status = PublicationStatus()
+
 
 class DataBroker(object):
-    def __init__(self, db_client):
+    """Acesso aos dados do Articlemeta.
+
+    As consultas são feitas em ``read_db``, que pode ser um handler do mesmo
+    banco com outra preferência de leitura (ver ``get_read_dbconn``), e as
+    alterações em ``db_client``. Na ausência de ``read_db``, tudo é feito em
+    ``db_client``.
+    """
+    def __init__(self, db_client, render_cache=None, read_db=None):
         self.db = db_client
-        self.journalmeta = JournalMeta(self.db['journals'])
-        self.issuemeta = IssueMeta(self.db['issues'], self.journalmeta)
+        self.read_db = db_client if read_db is None else read_db
+        self.render_cache = render_cache
+        self.journalmeta = JournalMeta(self.db['journals'], cache=_journal_cache,
+                                       reader=self.read_db['journals'])
+        self.issuemeta = IssueMeta(self.db['issues'], self.journalmeta,
+                                   cache=_issue_cache,
+                                   reader=self.read_db['issues'])
         self.articlemeta = ArticleMeta(self.db['articles'], self.journalmeta,
-                                       self.issuemeta)
-        pubstatus = PublicationStatus()
-        self.collectionmeta = CollectionMeta(pubstatus=pubstatus)
+                                       self.issuemeta,
+                                       reader=self.read_db['articles'])
+        self.collectionmeta = CollectionMeta(pubstatus=_publication_status)
 
     def _log_changes(self, document_type, code, event, collection=None, date=None):
 
+        self._invalidate_rendered(document_type, code, collection)
+
         if document_type in ['article', 'journal', 'issue']:
             log_data = {
                 'code': code,
@@ -1219,9 +2036,39 @@ class DataBroker(object):
             log_id = self.db['historychanges_%s' % document_type].insert(log_data)
             return log_id
 
+    def _invalidate_rendered(self, document_type, code, collection=None):
+        """Remove do cache as exportações dos artigos afetados pela alteração
+        do documento ``code``: o próprio artigo, ou todos os artigos do
+        fascículo ou do periódico.
+        """
+        if self.render_cache is None or not code:
+            return
+
+        if document_type == 'article':
+            self.render_cache.invalidate(collection, code)
+        elif document_type in ['journal', 'issue']:
+            self.render_cache.invalidate(collection, 'S' + code)
+
+    def render_article(self, article, fmt):
+        """Exporta o artigo ``article``, conforme retornado por
+        ``get_article``, para o formato XML ``fmt``. Quando configurado, o
+        resultado é obtido do cache de exportações.
+        """
+        export = Export(article)
+
+        if self.render_cache is None:
+            return export.render(fmt)
+
+        version = getattr(article, 'export_version', None) or \
+            get_export_version(article)
+
+        return self.render_cache.get_or_render(
+            article['collection'], article['code'], fmt, version,
+            lambda: export.render(fmt))
+
     def historychanges(self, document_type, collection=None, event=None,
                        code=None, from_date='1997-01-01',
-                       until_date=None, limit=LIMIT, offset=0):
+                       until_date=None, limit=LIMIT, offset=0, count='exact'):
 
         if offset < 0:
             offset = 0
@@ -1242,8 +2089,9 @@ class DataBroker(object):
         if code:
             fltr['code'] = code
 
-        total = self.db['historychanges_%s' % document_type].find(fltr).count()
-        data = self.db['historychanges_%s' % document_type].find(fltr).sort("date").skip(offset).limit(limit)
+        total = count_documents(self.read_db['historychanges_%s' % document_type],
+                fltr, count=count)
+        data = self.read_db['historychanges_%s' % document_type].find(fltr).sort("date").skip(offset).limit(limit)
 
         meta = {
             'limit': limit,
@@ -1262,9 +2110,23 @@ class DataBroker(object):
 
         return result
 
+    def cache_stats(self):
+        """Contadores de acertos e falhas dos caches de metadados do processo.
+        """
+        return {
+            'journals': _journal_cache.stats,
+            'issues': _issue_cache.stats,
+            'counts': _count_cache.stats,
+        }
+
     def get_journal(self, collection=None, issn=None):
         return self.journalmeta.get(collection=collection, issn=issn)
 
+    def iter_journals(self, collection=None, issn=None,
+            batch_size=STREAM_BATCH_SIZE):
+        return self.journalmeta.iter_journals(collection=collection,
+                issn=issn, batch_size=batch_size)
+
     @LogHistoryChange(document_type="journal", event_type="delete")
     def delete_journal(self, code, collection=None):
         return self.journalmeta.delete(code=code, collection=collection)
@@ -1292,26 +2154,37 @@ class DataBroker(object):
         self.get_collection(collection=collection)
 
     def identifiers_journal(self, collection=None, issn=None, limit=LIMIT,
-            offset=0, extra_filter=None):
+            offset=0, extra_filter=None, resume_token=None, count='exact'):
         return self.journalmeta.identifiers(collection=collection, issn=issn,
-                limit=limit, offset=offset, extra_filter=extra_filter)
+                limit=limit, offset=offset, extra_filter=extra_filter,
+                resume_token=resume_token, count=count)
 
     def identifiers_issue(self, collection=None, issn=None,
             from_date='1500-01-01', until_date=None, limit=LIMIT, offset=0,
-            extra_filter=None):
+            extra_filter=None, resume_token=None, count='exact'):
         return self.issuemeta.identifiers(collection=collection, issn=issn,
                 from_date=from_date, until_date=until_date, limit=limit,
-                offset=offset, extra_filter=extra_filter)
+                offset=offset, extra_filter=extra_filter,
+                resume_token=resume_token, count=count)
 
     def get_issue(self, code, collection=None, replace_journal_metadata=False):
         return self.issuemeta.get(code=code, collection=collection,
                 replace_journal_metadata=replace_journal_metadata)
 
     def get_issues_full(self, collection=None, issn=None, from_date='1500-01-01',
-            until_date=None, limit=LIMIT, offset=0, extra_filter=None):
+            until_date=None, limit=LIMIT, offset=0, extra_filter=None,
+            count='exact'):
         return self.issuemeta.get_issues_full(collection=collection,
                 issn=issn, from_date=from_date, until_date=until_date,
-                limit=limit, offset=offset, extra_filter=extra_filter)
+                limit=limit, offset=offset, extra_filter=extra_filter,
+                count=count)
+
+    def iter_issues_full(self, collection=None, issn=None,
+            from_date='1500-01-01', until_date=None, extra_filter=None,
+            batch_size=STREAM_BATCH_SIZE):
+        return self.issuemeta.iter_issues_full(collection=collection,
+                issn=issn, from_date=from_date, until_date=until_date,
+                extra_filter=extra_filter, batch_size=batch_size)
 
     def get_issues(self, code, collection=None, replace_journal_metadata=False):
         """Esse método não é utilizado em nenhum local do projeto, e tampouco
@@ -1322,7 +2195,7 @@ class DataBroker(object):
         if collection:
             fltr['collection'] = collection
 
-        data = self.db['issues'].find(fltr, {'_id': 0})
+        data = self.read_db['issues'].find(fltr, {'_id': 0})
 
         for issue in data:
             if replace_journal_metadata is True:
@@ -1357,10 +2230,11 @@ class DataBroker(object):
                             until_date=None,
                             limit=LIMIT,
                             offset=0,
-                            extra_filter=None):
+                            extra_filter=None,
+                            count='exact'):
         return self.articlemeta.counter_dict(collection=collection, issn=issn,
                 from_date=from_date, until_date=until_date, limit=limit,
-                offset=offset, extra_filter=extra_filter)
+                offset=offset, extra_filter=extra_filter, count=count)
 
     def identifiers_article(self,
                             collection=None,
@@ -1369,10 +2243,13 @@ class DataBroker(object):
                             until_date=None,
                             limit=LIMIT,
                             offset=0,
-                            extra_filter=None):
+                            extra_filter=None,
+                            resume_token=None,
+                            count='exact'):
         return self.articlemeta.identifiers(collection=collection, issn=issn,
                 from_date=from_date, until_date=until_date, limit=limit,
-                offset=offset, extra_filter=extra_filter)
+                offset=offset, extra_filter=extra_filter,
+                resume_token=resume_token, count=count)
 
     def identifiers_press_release(self,
                                   collection=None,
@@ -1380,10 +2257,11 @@ class DataBroker(object):
                                   from_date='1500-01-01',
                                   until_date=None,
                                   limit=LIMIT,
-                                  offset=0):
+                                  offset=0,
+                                  count='exact'):
         return self.articlemeta.identifiers_press_release(collection=collection,
                 issn=issn, from_date=from_date, until_date=until_date,
-                limit=limit, offset=offset)
+                limit=limit, offset=offset, count=count)
 
     def get_article(self, code, collection=None, replace_journal_metadata=False,
             body=False):
@@ -1398,13 +2276,30 @@ class DataBroker(object):
         return self.articlemeta.get(code=code, collection=collection,
                 replace_journal_metadata=replace_journal_metadata, body=body)
 
+    def get_articles_by_codes(self, codes, collection=None,
+            replace_journal_metadata=False, body=False):
+        return self.articlemeta.get_many(codes, collection=collection,
+                replace_journal_metadata=replace_journal_metadata, body=body)
+
     def get_articles_full(self, collection=None, issn=None,
             from_date='1500-01-01', until_date=None, limit=100, offset=0,
-            extra_filter=None, replace_journal_metadata=False, body=False):
+            extra_filter=None, replace_journal_metadata=False, body=False,
+            count='exact'):
         return self.articlemeta.get_articles_full(collection=collection,
                 issn=issn, from_date=from_date, until_date=until_date,
                 limit=limit, offset=offset, extra_filter=extra_filter,
-                replace_journal_metadata=replace_journal_metadata, body=body)
+                replace_journal_metadata=replace_journal_metadata, body=body,
+                count=count)
+
+    def iter_articles_full(self, collection=None, issn=None,
+            from_date='1500-01-01', until_date=None, extra_filter=None,
+            replace_journal_metadata=False, body=False,
+            batch_size=STREAM_BATCH_SIZE):
+        return self.articlemeta.iter_articles_full(collection=collection,
+                issn=issn, from_date=from_date, until_date=until_date,
+                extra_filter=extra_filter,
+                replace_journal_metadata=replace_journal_metadata, body=body,
+                batch_size=batch_size)
 
     def get_articles(self, code, collection=None, replace_journal_metadata=False):
 
@@ -1412,7 +2307,7 @@ class DataBroker(object):
         if collection:
             fltr['collection'] = collection
 
-        data = self.db['articles'].find(fltr, {'_id': 0})
+        data = self.read_db['articles'].find(fltr, {'_id': 0})
 
         for article in data:
             if replace_journal_metadata:
@@ -1444,12 +2339,16 @@ class DataBroker(object):
         return self.articlemeta.update(metadata)
 
     def set_doaj_id(self, code, collection, doaj_id):
-        return self.articlemeta.set_doaj_id(code=code, collection=collection,
+        result = self.articlemeta.set_doaj_id(code=code, collection=collection,
                 doaj_id=doaj_id)
+        self._invalidate_rendered('article', code, collection)
+        return result
 
     def set_aid(self, code, collection, aid):
-        return self.articlemeta.set_aid(code=code, collection=collection,
+        result = self.articlemeta.set_aid(code=code, collection=collection,
                 aid=aid)
+        self._invalidate_rendered('article', code, collection)
+        return result
 
     def get_issue_code_from_label(self, label, journal_code, collection):
         return self.issuemeta.get_code_from_label(label=label,
@@ -4,6 +4,7 @@ import plumber
 from xylose.scielodocument import Article, Journal
 import xylose
 
+from articlemeta import utils
 from articlemeta import export_sci
 from articlemeta import export_rsps
 from articlemeta import export_doaj
@@ -47,181 +48,255 @@ class JournalExport:
                 'status': _safegetter(lambda: journal.current_status)}
 
 
+def _build_pipeline_sci():
+    return plumber.Pipeline(
+        export_sci.SetupArticlePipe(),
+        export_sci.XMLArticlePipe(),
+        export_sci.XMLFrontPipe(),
+        export_sci.XMLJournalMetaJournalIdPipe(),
+        export_sci.XMLJournalMetaJournalTitleGroupPipe(),
+        export_sci.XMLJournalMetaISSNPipe(),
+        export_sci.XMLJournalMetaCollectionPipe(),
+        export_sci.XMLJournalMetaPublisherPipe(),
+        export_sci.XMLArticleMetaUniqueArticleIdPipe(),
+        export_sci.XMLArticleMetaArticleIdPublisherPipe(),
+        export_sci.XMLArticleMetaArticleIdDOIPipe(),
+        export_sci.XMLArticleMetaArticleCategoriesPipe(),
+        export_sci.XMLArticleMetaTitleGroupPipe(),
+        export_sci.XMLArticleMetaTranslatedTitleGroupPipe(),
+        export_sci.XMLArticleMetaContribGroupPipe(),
+        export_sci.XMLArticleMetaAffiliationPipe(),
+        export_sci.XMLArticleMetaDatesInfoPipe(),
+        export_sci.XMLArticleMetaIssueInfoPipe(),
+        export_sci.XMLArticleMetaElocationInfoPipe(),
+        export_sci.XMLArticleMetaPagesInfoPipe(),
+        export_sci.XMLArticleMetaPermissionPipe(),
+        export_sci.XMLArticleMetaURLsPipe(),
+        export_sci.XMLArticleMetaAbstractsPipe(),
+        export_sci.XMLArticleMetaKeywordsPipe(),
+        export_sci.XMLArticleMetaCitationsPipe(),
+        export_sci.XMLClosePipe()
+    )
+
+
+def _build_pipeline_rsps():
+    return plumber.Pipeline(
+        export_rsps.SetupArticlePipe(),
+        export_rsps.XMLArticlePipe(),
+        export_rsps.XMLFrontPipe(),
+        export_rsps.XMLJournalMetaJournalIdPipe(),
+        export_rsps.XMLJournalMetaJournalTitleGroupPipe(),
+        export_rsps.XMLJournalMetaISSNPipe(),
+        export_rsps.XMLJournalMetaPublisherPipe(),
+        export_rsps.XMLArticleMetaArticleIdPublisherPipe(),
+        export_rsps.XMLArticleMetaArticleIdDOIPipe(),
+        export_rsps.XMLArticleMetaArticleCategoriesPipe(),
+        export_rsps.XMLArticleMetaTitleGroupPipe(),
+        export_rsps.XMLArticleMetaTranslatedTitleGroupPipe(),
+        export_rsps.XMLArticleMetaContribGroupPipe(),
+        export_rsps.XMLArticleMetaAffiliationPipe(),
+        export_rsps.XMLArticleMetaDatesInfoPipe(),
+        export_rsps.XMLArticleMetaIssueInfoPipe(),
+        export_rsps.XMLArticleMetaElocationInfoPipe(),
+        export_rsps.XMLArticleMetaPagesInfoPipe(),
+        export_rsps.XMLArticleMetaHistoryPipe(),
+        export_rsps.XMLArticleMetaPermissionPipe(),
+        export_rsps.XMLArticleMetaSelfUriPipe(),
+        export_rsps.XMLArticleMetaAbstractsPipe(),
+        export_rsps.XMLArticleMetaKeywordsPipe(),
+        export_rsps.XMLArticleMetaCountsPipe(),
+        export_rsps.XMLBodyPipe(),
+        export_rsps.XMLArticleMetaCitationsPipe(),
+        export_rsps.XMLSubArticlePipe(),
+        export_rsps.XMLClosePipe()
+    )
+
+
+def _build_pipeline_doaj():
+    return plumber.Pipeline(
+        export_doaj.SetupArticlePipe(),
+        export_doaj.XMLArticlePipe(),
+        export_doaj.XMLJournalMetaPublisherPipe(),
+        export_doaj.XMLJournalMetaJournalTitlePipe(),
+        export_doaj.XMLJournalMetaISSNPipe(),
+        export_doaj.XMLArticleMetaPublicationDatePipe(),
+        export_doaj.XMLArticleMetaVolumePipe(),
+        export_doaj.XMLArticleMetaIssuePipe(),
+        export_doaj.XMLArticleMetaStartPagePipe(),
+        export_doaj.XMLArticleMetaEndPagePipe(),
+        export_doaj.XMLArticleMetaArticleIdDOIPipe(),
+        export_doaj.XMLArticleMetaIdPipe(),
+        export_doaj.XMLArticleMetaDocumentTypePipe(),
+        export_doaj.XMLArticleMetaTitlePipe(),
+        export_doaj.XMLArticleMetaAuthorsPipe(),
+        export_doaj.XMLArticleMetaAffiliationPipe(),
+        export_doaj.XMLArticleMetaAbstractsPipe(),
+        export_doaj.XMLArticleMetaFullTextUrlPipe(),
+        export_doaj.XMLArticleMetaKeywordsPipe(),
+        export_doaj.XMLClosePipe()
+    )
+
+
+def _build_pipeline_pubmed():
+    return plumber.Pipeline(
+        export_pubmed.SetupArticleSetPipe(),
+        export_pubmed.XMLArticlePipe(),
+        export_pubmed.XMLJournalPipe(),
+        export_pubmed.XMLPublisherNamePipe(),
+        export_pubmed.XMLJournalTitlePipe(),
+        export_pubmed.XMLISSNPipe(),
+        export_pubmed.XMLVolumePipe(),
+        export_pubmed.XMLIssuePipe(),
+        export_pubmed.XMLPubDatePipe(),
+        export_pubmed.XMLReplacesPipe(),
+        export_pubmed.XMLArticleTitlePipe(),
+        export_pubmed.XMLFirstPagePipe(),
+        export_pubmed.XMLLastPagePipe(),
+        export_pubmed.XMLElocationIDPipe(),
+        export_pubmed.XMLLanguagePipe(),
+        export_pubmed.XMLAuthorListPipe(),
+        export_pubmed.XMLPublicationTypePipe(),
+        export_pubmed.XMLArticleIDListPipe(),
+        export_pubmed.XMLHistoryPipe(),
+        export_pubmed.XMLAbstractPipe(),
+        export_pubmed.XMLClosePipe()
+    )
+
+
+def _build_pipeline_crossref():
+    return plumber.Pipeline(
+        export_crossref.SetupDoiBatchPipe(),
+        export_crossref.XMLHeadPipe(),
+        export_crossref.XMLBodyPipe(),
+        export_crossref.XMLDoiBatchIDPipe(),
+        export_crossref.XMLTimeStampPipe(),
+        export_crossref.XMLDepositorPipe(),
+        export_crossref.XMLRegistrantPipe(),
+        export_crossref.XMLJournalPipe(),
+        export_crossref.XMLJournalMetadataPipe(),
+        export_crossref.XMLJournalTitlePipe(),
+        export_crossref.XMLAbbreviatedJournalTitlePipe(),
+        export_crossref.XMLISSNPipe(),
+        export_crossref.XMLJournalIssuePipe(),
+        export_crossref.XMLPubDatePipe(),
+        export_crossref.XMLVolumePipe(),
+        export_crossref.XMLIssuePipe(),
+        export_crossref.XMLJournalArticlePipe(),
+        export_crossref.XMLArticleTitlesPipe(),
+        export_crossref.XMLArticleTitlePipe(),
+        export_crossref.XMLArticleContributorsPipe(),
+        export_crossref.XMLArticleAbstractPipe(),
+        export_crossref.XMLArticlePubDatePipe(),
+        export_crossref.XMLPagesPipe(),
+        export_crossref.XMLPIDPipe(),
+        export_crossref.XMLElocationPipe(),
+        export_crossref.XMLPermissionsPipe(),
+        export_crossref.XMLProgramRelatedItemPipe(),
+        export_crossref.XMLDOIDataPipe(),
+        export_crossref.XMLDOIPipe(),
+        export_crossref.XMLResourcePipe(),
+        export_crossref.XMLCollectionPipe(),
+        export_crossref.XMLArticleCitationsPipe(),
+        export_crossref.XMLFundingDataPipe(),
+        export_crossref.XMLClosePipe()
+    )
+
+
+def _doaj_article(data):
+    return Article(data, iso_format='iso 639-2')
+
+
+# construtor do pipeline e do objeto xylose de entrada de cada formato XML.
+PIPELINES = {
+    'xmlwos': (_build_pipeline_sci, Article),
+    'xmlrsps': (_build_pipeline_rsps, Article),
+    'xmldoaj': (_build_pipeline_doaj, _doaj_article),
+    'xmlpubmed': (_build_pipeline_pubmed, _doaj_article),
+    'xmlcrossref': (_build_pipeline_crossref, CustomArticle),
+}
+
+
+def get_pipeline(fmt):
+    """Pipeline do formato ``fmt`` da thread corrente. Cada pipeline é
+    construído uma única vez por thread e reutilizado nas exportações
+    seguintes, já que suas pipes não podem ser compartilhadas entre threads.
+    """
+    return utils.get_thread_instance(('pipeline', fmt), PIPELINES[fmt][0])
+
+
 class Export(object):
 
+    # formatos XML de saída e os respectivos métodos de pipeline.
+    XML_FORMATS = {
+        'xmlwos': 'pipeline_sci',
+        'xmlrsps': 'pipeline_rsps',
+        'xmldoaj': 'pipeline_doaj',
+        'xmlpubmed': 'pipeline_pubmed',
+        'xmlcrossref': 'pipeline_crossref',
+    }
+
     def __init__(self, article):
         self._article = article
 
-    def pipeline_sci(self):
-        xylose_article = Article(self._article)
-
-        ppl = plumber.Pipeline(export_sci.SetupArticlePipe(),
-                               export_sci.XMLArticlePipe(),
-                               export_sci.XMLFrontPipe(),
-                               export_sci.XMLJournalMetaJournalIdPipe(),
-                               export_sci.XMLJournalMetaJournalTitleGroupPipe(),
-                               export_sci.XMLJournalMetaISSNPipe(),
-                               export_sci.XMLJournalMetaCollectionPipe(),
-                               export_sci.XMLJournalMetaPublisherPipe(),
-                               export_sci.XMLArticleMetaUniqueArticleIdPipe(),
-                               export_sci.XMLArticleMetaArticleIdPublisherPipe(),
-                               export_sci.XMLArticleMetaArticleIdDOIPipe(),
-                               export_sci.XMLArticleMetaArticleCategoriesPipe(),
-                               export_sci.XMLArticleMetaTitleGroupPipe(),
-                               export_sci.XMLArticleMetaTranslatedTitleGroupPipe(),
-                               export_sci.XMLArticleMetaContribGroupPipe(),
-                               export_sci.XMLArticleMetaAffiliationPipe(),
-                               export_sci.XMLArticleMetaDatesInfoPipe(),
-                               export_sci.XMLArticleMetaIssueInfoPipe(),
-                               export_sci.XMLArticleMetaElocationInfoPipe(),
-                               export_sci.XMLArticleMetaPagesInfoPipe(),
-                               export_sci.XMLArticleMetaPermissionPipe(),
-                               export_sci.XMLArticleMetaURLsPipe(),
-                               export_sci.XMLArticleMetaAbstractsPipe(),
-                               export_sci.XMLArticleMetaKeywordsPipe(),
-                               export_sci.XMLArticleMetaCitationsPipe(),
-                               export_sci.XMLClosePipe())
-
-        transformed_data = ppl.run(xylose_article, rewrap=True)
+    @staticmethod
+    def run_many(articles, fmt):
+        """Exporta os artigos de ``articles``, um iterável de dicionários,
+        para o formato XML ``fmt``, utilizando o mesmo pipeline para todos.
 
-        return next(transformed_data)
+        Retorna um gerador de tuplas ``(xml, erro)``, na ordem de
+        ``articles``: ``erro`` é None quando o artigo foi exportado, ou a
+        exceção que impediu a sua exportação, quando ``xml`` é None. A falha
+        de um artigo não interrompe a exportação dos demais.
 
-    def pipeline_rsps(self):
-        xylose_article = Article(self._article)
-
-        ppl = plumber.Pipeline(export_rsps.SetupArticlePipe(),
-                               export_rsps.XMLArticlePipe(),
-                               export_rsps.XMLFrontPipe(),
-                               export_rsps.XMLJournalMetaJournalIdPipe(),
-                               export_rsps.XMLJournalMetaJournalTitleGroupPipe(),
-                               export_rsps.XMLJournalMetaISSNPipe(),
-                               export_rsps.XMLJournalMetaPublisherPipe(),
-                               export_rsps.XMLArticleMetaArticleIdPublisherPipe(),
-                               export_rsps.XMLArticleMetaArticleIdDOIPipe(),
-                               export_rsps.XMLArticleMetaArticleCategoriesPipe(),
-                               export_rsps.XMLArticleMetaTitleGroupPipe(),
-                               export_rsps.XMLArticleMetaTranslatedTitleGroupPipe(),
-                               export_rsps.XMLArticleMetaContribGroupPipe(),
-                               export_rsps.XMLArticleMetaAffiliationPipe(),
-                               export_rsps.XMLArticleMetaDatesInfoPipe(),
-                               export_rsps.XMLArticleMetaIssueInfoPipe(),
-                               export_rsps.XMLArticleMetaElocationInfoPipe(),
-                               export_rsps.XMLArticleMetaPagesInfoPipe(),
-                               export_rsps.XMLArticleMetaHistoryPipe(),
-                               export_rsps.XMLArticleMetaPermissionPipe(),
-                               export_rsps.XMLArticleMetaSelfUriPipe(),
-                               export_rsps.XMLArticleMetaAbstractsPipe(),
-                               export_rsps.XMLArticleMetaKeywordsPipe(),
-                               export_rsps.XMLArticleMetaCountsPipe(),
-                               export_rsps.XMLBodyPipe(),
-                               export_rsps.XMLArticleMetaCitationsPipe(),
-                               export_rsps.XMLSubArticlePipe(),
-                               export_rsps.XMLClosePipe())
-
-        transformed_data = ppl.run(xylose_article, rewrap=True)
+        Lança ``ValueError`` imediatamente para um formato desconhecido.
+        """
+        try:
+            ppl = get_pipeline(fmt)
+        except KeyError:
+            raise ValueError('unknown export format: %s' % fmt)
 
-        return next(transformed_data)
+        return Export._run_many(ppl, PIPELINES[fmt][1], articles)
 
-    def pipeline_doaj(self):
-        xylose_article = Article(self._article, iso_format='iso 639-2')
-
-        ppl = plumber.Pipeline(export_doaj.SetupArticlePipe(),
-                               export_doaj.XMLArticlePipe(),
-                               export_doaj.XMLJournalMetaPublisherPipe(),
-                               export_doaj.XMLJournalMetaJournalTitlePipe(),
-                               export_doaj.XMLJournalMetaISSNPipe(),
-                               export_doaj.XMLArticleMetaPublicationDatePipe(),
-                               export_doaj.XMLArticleMetaVolumePipe(),
-                               export_doaj.XMLArticleMetaIssuePipe(),
-                               export_doaj.XMLArticleMetaStartPagePipe(),
-                               export_doaj.XMLArticleMetaEndPagePipe(),
-                               export_doaj.XMLArticleMetaArticleIdDOIPipe(),
-                               export_doaj.XMLArticleMetaIdPipe(),
-                               export_doaj.XMLArticleMetaDocumentTypePipe(),
-                               export_doaj.XMLArticleMetaTitlePipe(),
-                               export_doaj.XMLArticleMetaAuthorsPipe(),
-                               export_doaj.XMLArticleMetaAffiliationPipe(),
-                               export_doaj.XMLArticleMetaAbstractsPipe(),
-                               export_doaj.XMLArticleMetaFullTextUrlPipe(),
-                               export_doaj.XMLArticleMetaKeywordsPipe(),
-                               export_doaj.XMLClosePipe())
-
-        transformed_data = ppl.run(xylose_article, rewrap=True)
+    @staticmethod
+    def _run_many(ppl, wrapper, articles):
+        for article in articles:
+            try:
+                xml = next(ppl.run(wrapper(article), rewrap=True))
+            except Exception as e:
+                yield None, e
+            else:
+                yield xml, None
+
+    def _run(self, fmt):
+        transformed_data = get_pipeline(fmt).run(
+            PIPELINES[fmt][1](self._article), rewrap=True)
 
         return next(transformed_data)
 
-    def pipeline_pubmed(self):
-        xylose_article = Article(self._article, iso_format='iso 639-2')
-
-        ppl = plumber.Pipeline(export_pubmed.SetupArticleSetPipe(),
-                               export_pubmed.XMLArticlePipe(),
-                               export_pubmed.XMLJournalPipe(),
-                               export_pubmed.XMLPublisherNamePipe(),
-                               export_pubmed.XMLJournalTitlePipe(),
-                               export_pubmed.XMLISSNPipe(),
-                               export_pubmed.XMLVolumePipe(),
-                               export_pubmed.XMLIssuePipe(),
-                               export_pubmed.XMLPubDatePipe(),
-                               export_pubmed.XMLReplacesPipe(),
-                               export_pubmed.XMLArticleTitlePipe(),
-                               export_pubmed.XMLFirstPagePipe(),
-                               export_pubmed.XMLLastPagePipe(),
-                               export_pubmed.XMLElocationIDPipe(),
-                               export_pubmed.XMLLanguagePipe(),
-                               export_pubmed.XMLAuthorListPipe(),
-                               export_pubmed.XMLPublicationTypePipe(),
-                               export_pubmed.XMLArticleIDListPipe(),
-                               export_pubmed.XMLHistoryPipe(),
-                               export_pubmed.XMLAbstractPipe(),
-                               export_pubmed.XMLClosePipe())
-
-        transformed_data = ppl.run(xylose_article, rewrap=True)
+    def render(self, fmt):
+        """Executa o pipeline do formato XML ``fmt`` (ver ``XML_FORMATS``).
+        """
+        try:
+            pipeline = getattr(self, self.XML_FORMATS[fmt])
+        except KeyError:
+            raise ValueError('unknown export format: %s' % fmt)
 
-        return next(transformed_data)
+        return pipeline()
 
-    def pipeline_crossref(self):
-        xylose_article = CustomArticle(self._article)
-
-        ppl = plumber.Pipeline(
-            export_crossref.SetupDoiBatchPipe(),
-            export_crossref.XMLHeadPipe(),
-            export_crossref.XMLBodyPipe(),
-            export_crossref.XMLDoiBatchIDPipe(),
-            export_crossref.XMLTimeStampPipe(),
-            export_crossref.XMLDepositorPipe(),
-            export_crossref.XMLRegistrantPipe(),
-            export_crossref.XMLJournalPipe(),
-            export_crossref.XMLJournalMetadataPipe(),
-            export_crossref.XMLJournalTitlePipe(),
-            export_crossref.XMLAbbreviatedJournalTitlePipe(),
-            export_crossref.XMLISSNPipe(),
-            export_crossref.XMLJournalIssuePipe(),
-            export_crossref.XMLPubDatePipe(),
-            export_crossref.XMLVolumePipe(),
-            export_crossref.XMLIssuePipe(),
-            export_crossref.XMLJournalArticlePipe(),
-            export_crossref.XMLArticleTitlesPipe(),
-            export_crossref.XMLArticleTitlePipe(),
-            export_crossref.XMLArticleContributorsPipe(),
-            export_crossref.XMLArticleAbstractPipe(),
-            export_crossref.XMLArticlePubDatePipe(),
-            export_crossref.XMLPagesPipe(),
-            export_crossref.XMLPIDPipe(),
-            export_crossref.XMLElocationPipe(),
-            export_crossref.XMLPermissionsPipe(),
-            export_crossref.XMLProgramRelatedItemPipe(),
-            export_crossref.XMLDOIDataPipe(),
-            export_crossref.XMLDOIPipe(),
-            export_crossref.XMLResourcePipe(),
-            export_crossref.XMLCollectionPipe(),
-            export_crossref.XMLArticleCitationsPipe(),
-            export_crossref.XMLFundingDataPipe(),
-            export_crossref.XMLClosePipe()
-        )
-
-        transformed_data = ppl.run(xylose_article, rewrap=True)
+    def pipeline_sci(self):
+        return self._run('xmlwos')
 
-        return next(transformed_data)
+    def pipeline_rsps(self):
+        return self._run('xmlrsps')
+
+    def pipeline_doaj(self):
+        return self._run('xmldoaj')
+
+    def pipeline_pubmed(self):
+        return self._run('xmlpubmed')
+
+    def pipeline_crossref(self):
+        return self._run('xmlcrossref')
 
     def pipeline_opac(self):
         article = self._article.copy()
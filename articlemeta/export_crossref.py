@@ -10,6 +10,8 @@ from itertools import product
 from xylose.scielodocument import UnavailableMetadataException
 import plumber
 
+from articlemeta import utils
+
 SUPPLBEG_REGEX = re.compile(r'^0 ')
 SUPPLEND_REGEX = re.compile(r' 0$')
 
@@ -814,7 +816,7 @@ class XMLArticleCitationsPipe(plumber.Pipe):
 
         citations = ET.Element('citation_list')
 
-        cit = XMLCitation()
+        cit = XMLCitation.get_instance()
         for citation in raw.citations:
             citations.append(cit.deploy(citation)[1])
 
@@ -824,7 +826,7 @@ class XMLArticleCitationsPipe(plumber.Pipe):
         return data
 
 
-class XMLCitation(object):
+class XMLCitation(utils.ThreadLocalInstanceMixin):
 
     def __init__(self):
         self._ppl = plumber.Pipeline(self.SetupCitationPipe(),
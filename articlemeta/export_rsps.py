@@ -23,7 +23,7 @@ SELF_URI_TEXT_TRANSLATIONS = {
     "es": "Texto completo solamente en formato PDF",
 }
 
-class XMLCitation(object):
+class XMLCitation(utils.ThreadLocalInstanceMixin):
 
     def __init__(self):
         self._ppl = plumber.Pipeline(self.SetupCitationPipe(),
@@ -1238,7 +1238,7 @@ class XMLArticleMetaCitationsPipe(plumber.Pipe):
 
         reflist = xml.find('./back/ref-list')
 
-        cit = XMLCitation()
+        cit = XMLCitation.get_instance()
         for citation in raw.citations:
             reflist.append(cit.deploy(citation)[1])
 
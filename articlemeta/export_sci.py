@@ -7,6 +7,8 @@ from lxml import etree as ET
 from xylose.scielodocument import UnavailableMetadataException
 import plumber
 
+from articlemeta import utils
+
 SUPPLBEG_REGEX = re.compile(r'^0 ')
 SUPPLEND_REGEX = re.compile(r' 0$')
 
@@ -45,7 +47,7 @@ def create_date_elem(element_date_name, splited_yyyy_mm_dd, date_type=None):
         return create_children(elem_date, tags, values)
 
 
-class XMLCitation(object):
+class XMLCitation(utils.ThreadLocalInstanceMixin):
 
     def __init__(self):
         self._ppl = plumber.Pipeline(self.SetupCitationPipe(),
@@ -1060,7 +1062,7 @@ class XMLArticleMetaCitationsPipe(plumber.Pipe):
         reflist = xml.find('./article/back/ref-list')
 
         
-        cit = XMLCitation()
+        cit = XMLCitation.get_instance()
         for citation in raw.citations:
             ref = cit.deploy(citation)[1]
             extlinks = ref.xpath("element-citation/ext-link[@ext-link-type='uri']")
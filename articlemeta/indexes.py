@@ -0,0 +1,251 @@
+# coding: utf-8
+"""
+Indexes of the Articlemeta database.
+
+The indexes are declared in ``INDEXES`` and created by the
+``articlemeta_ensure_indexes`` command, which compares the declared indexes
+with the existing ones, creates the missing ones and, optionally, drops the
+ones that are not declared. It then stores ``SCHEMA_VERSION``, a digest of
+the declaration, in the database.
+
+The applications only check the stored version when they connect
+(``check_schema_version``), warning when the command must be run, so
+starting a worker never creates indexes.
+"""
+import os
+import sys
+import json
+import hashlib
+import logging
+import argparse
+from datetime import datetime
+
+import pymongo
+
+logger = logging.getLogger(__name__)
+
+SCHEMA_COLLECTION = 'articlemeta_schema'
+SCHEMA_ID = 'indexes'
+
+_HISTORY_INDEXES = [
+    [[('date', pymongo.ASCENDING)], {'background': True}],
+    [[('collection', pymongo.ASCENDING)], {'background': True}],
+    [[('code', pymongo.ASCENDING)], {'background': True}],
+    [[('collection', pymongo.ASCENDING), ('date', pymongo.ASCENDING)], {'background': True}]
+]
+
+INDEXES = {
+    'historychanges_article': _HISTORY_INDEXES,
+    'historychanges_journal': _HISTORY_INDEXES,
+    'historychanges_issue': _HISTORY_INDEXES,
+    'issues': [
+        [[('code', pymongo.ASCENDING)], {'background': True}],
+        [[('processing_date', pymongo.ASCENDING), ('_id', pymongo.ASCENDING)], {'background': True}],
+        [[('collection', pymongo.ASCENDING), ('processing_date', pymongo.ASCENDING), ('_id', pymongo.ASCENDING)], {'background': True}],
+        [[('collection', pymongo.ASCENDING)], {'background': True}],
+        [[('processing_date', pymongo.ASCENDING)], {'background': True}],
+        [[('publication_year', pymongo.ASCENDING)], {'background': True}],
+        [[('code', pymongo.ASCENDING), ('collection', pymongo.ASCENDING)], {'unique': True, 'background': True}],
+        [[('code_title', pymongo.ASCENDING)], {'background': True}],
+        [[('collection', pymongo.ASCENDING), ('processing_date', pymongo.ASCENDING)], {'background': True}]
+    ],
+    'journals': [
+        [[('code', pymongo.ASCENDING)], {'background': True}],
+        [[('code', pymongo.ASCENDING), ('collection', pymongo.ASCENDING)], {'unique': True, 'background': True}],
+        [[('collection', pymongo.ASCENDING), ('processing_date', pymongo.ASCENDING)], {'background': True}],
+        [[('processing_date', pymongo.ASCENDING), ('_id', pymongo.ASCENDING)], {'background': True}],
+        [[('collection', pymongo.ASCENDING), ('processing_date', pymongo.ASCENDING), ('_id', pymongo.ASCENDING)], {'background': True}]
+    ],
+    'articles': [
+        [[('document_type', pymongo.ASCENDING)], {'background': True}],
+        [[('collection', pymongo.ASCENDING)], {'background': True}],
+        [[('code_title', pymongo.ASCENDING)], {'background': True}],
+        [[('applicable', pymongo.ASCENDING)], {'background': True}],
+        [[('code', pymongo.ASCENDING)], {'background': True}],
+        [[('sent_wos', pymongo.ASCENDING)], {'background': True}],
+        [[('publication_year', pymongo.ASCENDING)], {'background': True}],
+        [[('processing_date', pymongo.ASCENDING)], {'background': True}],
+        [[('license', pymongo.ASCENDING)], {'background': True}],
+        [[('section', pymongo.ASCENDING)], {'background': True}],
+        [[('aid', pymongo.ASCENDING)], {'background': True}],
+        [[('doi', pymongo.ASCENDING)], {'background': True}],
+        [[('version', pymongo.ASCENDING)], {'background': True}],
+        [[('code', pymongo.ASCENDING), ('collection', pymongo.ASCENDING)], {'unique': True, 'background': True}],
+        [[('collection', pymongo.ASCENDING), ('processing_date', pymongo.ASCENDING)], {'background': True}],
+        [[('processing_date', pymongo.ASCENDING), ('_id', pymongo.ASCENDING)], {'background': True}],
+        [[('collection', pymongo.ASCENDING), ('processing_date', pymongo.ASCENDING), ('_id', pymongo.ASCENDING)], {'background': True}]
+    ]
+}
+
+SCHEMA_VERSION = hashlib.sha1(
+    json.dumps(INDEXES, sort_keys=True).encode('utf-8')).hexdigest()[:12]
+
+
+def _signature(keys, options):
+    """
+    What identifies an index: its keys and whether it is unique. The server
+    may report the directions as floats.
+    """
+    return tuple(
+        (field, int(direction) if isinstance(direction, float) else direction)
+        for field, direction in keys), bool(options.get('unique', False))
+
+
+def diff(db, indexes=INDEXES):
+    """
+    Compare the declared ``indexes`` with the existing ones of ``db``.
+
+    Returns {collection: {'missing': [(keys, options)], 'extra': [name]}}
+    for the collections that differ. An existing index with the keys of a
+    declared one but other options (unique) is both extra and missing.
+    """
+    result = {}
+
+    for collection, declared in indexes.items():
+        existing = {
+            name: _signature(info['key'], info)
+            for name, info in db[collection].index_information().items()
+            if name != '_id_'
+        }
+        declared_signatures = set(_signature(*index) for index in declared)
+        existing_signatures = set(existing.values())
+
+        missing = []
+        for keys, options in declared:
+            signature = _signature(keys, options)
+            if signature not in existing_signatures and \
+                    (keys, options) not in missing:
+                missing.append((keys, options))
+
+        extra = sorted(name for name, signature in existing.items()
+                       if signature not in declared_signatures)
+
+        if missing or extra:
+            result[collection] = {'missing': missing, 'extra': extra}
+
+    return result
+
+
+def get_schema_version(db):
+    data = db[SCHEMA_COLLECTION].find_one({'_id': SCHEMA_ID})
+
+    return data.get('version') if data else None
+
+
+def check_schema_version(db):
+    """
+    Return whether the indexes of ``db`` were ensured for the current
+    declaration, warning when they were not. A single read, meant to be run
+    when the applications connect.
+    """
+    version = get_schema_version(db)
+
+    if version == SCHEMA_VERSION:
+        return True
+
+    logger.warning(
+        'Database indexes are at version %s, expected %s. Run '
+        'articlemeta_ensure_indexes.', version, SCHEMA_VERSION)
+
+    return False
+
+
+def ensure_indexes(db, drop_extra=False, dry_run=False, indexes=INDEXES):
+    """
+    Create the missing indexes of ``db`` and store the schema version, unless
+    a declared index could not be created.
+
+    @param drop_extra: also drop the existing indexes that are not declared,
+        and the ones with the keys of a declared index but other options.
+    @param dry_run: only compute the differences.
+
+    Returns the differences found, as ``diff``.
+    """
+    differences = diff(db, indexes=indexes)
+
+    if dry_run:
+        return differences
+
+    complete = True
+    for collection, changes in differences.items():
+        if drop_extra:
+            for name in changes['extra']:
+                logger.info('Dropping index %s of %s', name, collection)
+                db[collection].drop_index(name)
+
+        existing = set(
+            _signature(info['key'], {}) for info in
+            db[collection].index_information().values())
+
+        for keys, options in changes['missing']:
+            if _signature(keys, {}) in existing:
+                logger.warning(
+                    'Index %s of %s exists with other options, use '
+                    '--drop-extra to replace it', keys, collection)
+                complete = False
+                continue
+
+            logger.info('Creating index %s of %s', keys, collection)
+            db[collection].create_index(keys, **options)
+            existing.add(_signature(keys, {}))
+
+    if complete:
+        db[SCHEMA_COLLECTION].update_one(
+            {'_id': SCHEMA_ID},
+            {'$set': {'version': SCHEMA_VERSION, 'updated_at': datetime.now()}},
+            upsert=True
+        )
+
+    return differences
+
+
+def main():
+    from articlemeta.controller import get_dbconn
+
+    parser = argparse.ArgumentParser(
+        description='Create the indexes of the Articlemeta database'
+    )
+
+    parser.add_argument(
+        '--mongodb_host',
+        default=os.environ.get('MONGODB_HOST', 'mongodb://localhost:27017/articlemeta'),
+        help='MongoDB DSN, default from the env variable MONGODB_HOST'
+    )
+
+    parser.add_argument(
+        '--drop-extra',
+        dest='drop_extra',
+        action='store_true',
+        help='Drop the existing indexes that are not declared'
+    )
+
+    parser.add_argument(
+        '--dry-run',
+        dest='dry_run',
+        action='store_true',
+        help='Only show the differences between the declared and the existing indexes'
+    )
+
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO,
+                        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    db = get_dbconn(args.mongodb_host)
+    differences = ensure_indexes(db, drop_extra=args.drop_extra,
+                                 dry_run=args.dry_run)
+
+    for collection, changes in sorted(differences.items()):
+        for keys, options in changes['missing']:
+            print('missing %s %s %s' % (collection, keys, options))
+        for name in changes['extra']:
+            print('extra %s %s' % (collection, name))
+
+    if not differences:
+        print('Indexes are up to date (version %s)' % SCHEMA_VERSION)
+    elif args.dry_run:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,4 @@
-const string VERSION = "1.2.0"
+const string VERSION = "1.4.0"
 
 exception ValueError {
     1: string message,
@@ -30,12 +30,14 @@ struct article_identifiers {
     3: string processing_date,
     4: string aid,
     5: string doi,
+    6: optional string resume_token,
 }
 
 struct issue_identifiers {
     1: string code,
     2: string collection,
-    3: string processing_date
+    3: string processing_date,
+    4: optional string resume_token
 }
 
 struct journal_identifiers {
@@ -72,11 +74,12 @@ service ArticleMeta {
     list<event_journal> journal_history_changes(1: string collection, 2: string event, 3: string code, 4: string from_date, 5: string until_date, 6:i32 limit, 7: i32 offset) throws (1: ValueError value_err, 2:ServerError server_err),
     collection get_collection(1: string code) throws (1: ValueError value_err, 2:ServerError server_err),
     string get_article(1: string code, 2: string collection, 3: bool replace_journal_metadata, 4: string fmt, 5: bool body) throws (1: ValueError value_err, 2:ServerError server_err),
+    string get_articles_by_codes(1: list<string> codes, 2: optional string collection, 3: optional bool replace_journal_metadata, 4: optional bool body) throws (1: ValueError value_err, 2:ServerError server_err),
     string get_issue(1: string code, 2: string collection, 3: bool replace_journal_metadata) throws (1: ValueError value_err, 2:ServerError server_err),
     string get_journal(1: string code, 2: string collection) throws (1: ValueError value_err, 2:ServerError server_err),
-    list<article_identifiers> get_article_identifiers(1: optional string collection, 2: optional string issn, 3: optional string from_date, 4: optional string until_date, 5: i32 limit, 6: i32 offset, 7: optional string extra_filter) throws (1:ValueError value_err, 2:ServerError server_err),
+    list<article_identifiers> get_article_identifiers(1: optional string collection, 2: optional string issn, 3: optional string from_date, 4: optional string until_date, 5: i32 limit, 6: i32 offset, 7: optional string extra_filter, 8: optional string resume_token) throws (1:ValueError value_err, 2:ServerError server_err),
     string get_articles(1: optional string collection, 2: optional string issn, 3: optional string from_date, 4: optional string until_date, 5: i32 limit, 6: i32 offset, 7: optional string extra_filter, 8: optional bool replace_journal_metadata, 9: optional bool body) throws (1:ValueError value_err, 2:ServerError server_err),
-    list<issue_identifiers> get_issue_identifiers(1: optional string collection, 2: optional string issn, 3: optional string from_date, 4: optional string until_date, 5: i32 limit, 6: i32 offset, 7: optional string extra_filter) throws (1:ValueError value_err, 2:ServerError server_err),
+    list<issue_identifiers> get_issue_identifiers(1: optional string collection, 2: optional string issn, 3: optional string from_date, 4: optional string until_date, 5: i32 limit, 6: i32 offset, 7: optional string extra_filter, 8: optional string resume_token) throws (1:ValueError value_err, 2:ServerError server_err),
     string get_issues(1: optional string collection, 2: optional string issn, 3: optional string from_date, 4: optional string until_date, 5: i32 limit, 6: i32 offset, 7: optional string extra_filter) throws (1:ValueError value_err, 2:ServerError server_err),
     list<journal_identifiers> get_journal_identifiers(1: optional string collection, 2: optional string issn, 3: i32 limit, 4: i32 offset, 5: optional string extra_filter) throws (1: ValueError value_err, 2:ServerError server_err),
     list<collection> get_collection_identifiers() throws(1: ServerError server_err),
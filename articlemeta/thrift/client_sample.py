@@ -43,6 +43,12 @@ if __name__ == '__main__':
     print("Listando ID's de artigos")
     identifiers = client.get_article_identifiers(collection='scl', issn='2317-4889', limit=10, offset=0)
 
+    for i in identifiers:
+        print(i.collection, i.code, i.doi, i.aid, i.processing_date)
+
+    print("Listando ID's de artigos, página seguinte via resume_token")
+    identifiers = client.get_article_identifiers(collection='scl', issn='2317-4889', limit=10, offset=0, resume_token=identifiers[-1].resume_token)
+
     for i in identifiers:
         print(i.collection, i.code, i.doi, i.aid, i.processing_date)
 
@@ -77,3 +83,14 @@ if __name__ == '__main__':
     issue = client.get_issue(code='0103-733120080004', collection='scl')
 
     print(issue)
+
+    print("Recuperando vários artigos em uma única requisição")
+    articles = json.loads(client.get_articles_by_codes(
+        codes=['S0103-49792010000200006', 'S0103-49792010000200007'],
+        collection='scl'))
+
+    for article in articles['objects']:
+        if article:
+            print(article['collection'], article['code'])
+
+    print(articles['meta']['not_found'])
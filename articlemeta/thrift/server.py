@@ -7,9 +7,10 @@ import uuid
 import thriftpywrap
 import thriftpy2
 
-from articlemeta.controller import DataBroker, get_dbconn
+from articlemeta.controller import DataBroker, get_dbconn, get_read_dbconn, decode_resume_token
 from articlemeta import utils
 from articlemeta.export import Export
+from articlemeta.cache import RenderedExportCache
 
 logger = logging.getLogger(__name__)
 
@@ -74,8 +75,12 @@ class Dispatcher(object):
 
         self._admintoken = os.environ.get('ADMIN_TOKEN', None) or settings['app:main'].get('admintoken', uuid.uuid4().hex)
 
-        db_client = get_dbconn(db_dsn)
-        self._databroker = DataBroker(db_client)
+        db_client = get_dbconn(db_dsn, settings.get('app:main', {}))
+        read_db = get_read_dbconn(db_dsn, settings.get('app:main', {}))
+        render_cache = RenderedExportCache.from_settings(
+            settings.get('app:main', {}))
+        self._databroker = DataBroker(db_client, render_cache=render_cache,
+                                      read_db=read_db)
 
     def getInterfaceVersion(self):
         return articlemeta_thrift.VERSION
@@ -132,7 +137,8 @@ class Dispatcher(object):
                                                    from_date=from_date,
                                                    until_date=until_date,
                                                    limit=limit,
-                                                   offset=offset)
+                                                   offset=offset,
+                                                   count='false')
         except:
             raise articlemeta_thrift.ServerError(
                 'Server error: DataBroker.historychanges')
@@ -168,7 +174,8 @@ class Dispatcher(object):
                 from_date=from_date,
                 until_date=until_date,
                 limit=limit,
-                offset=offset
+                offset=offset,
+                count='false'
             )
         except:
             raise articlemeta_thrift.ServerError(
@@ -220,19 +227,28 @@ class Dispatcher(object):
         return json.dumps(data)
 
     def get_article_identifiers(self, collection, issn, from_date, until_date,
-                                limit, offset, extra_filter=None):
+                                limit, offset, extra_filter=None,
+                                resume_token=None):
 
         logger.debug(
             'AM Thrift - get_article_identifiers('
             'collection=%s,issn=%s,from_date=%s,until_date=%s,limit=%s,'
-            'offset=%s,extra_filter=%s)'
-            % (collection, issn, from_date, until_date, limit, offset, extra_filter)
+            'offset=%s,extra_filter=%s,resume_token=%s)'
+            % (collection, issn, from_date, until_date, limit, offset,
+                extra_filter, resume_token)
         )
 
         from_date = from_date or '1500-01-01'
         limit = limit or 1000
         offset = offset or 0
 
+        if resume_token:
+            try:
+                decode_resume_token(resume_token)
+            except ValueError:
+                raise articlemeta_thrift.ValueError(
+                    'Value error: invalid resume_token')
+
         try:
             data = self._databroker.identifiers_article(
                 collection=collection,
@@ -241,7 +257,9 @@ class Dispatcher(object):
                 until_date=until_date,
                 limit=limit,
                 offset=offset,
-                extra_filter=extra_filter
+                extra_filter=extra_filter,
+                resume_token=resume_token,
+                count='false'
             )
         except:
             raise articlemeta_thrift.ServerError(
@@ -254,6 +272,10 @@ class Dispatcher(object):
             aid=i.get('aid', ''),
             doi=i.get('doi', '')) for i in data['objects']]
 
+        # o último item da página carrega o token para a próxima requisição.
+        if objs and data['meta']['resume_token']:
+            objs[-1].resume_token = data['meta']['resume_token']
+
         return objs
 
     def get_issues(
@@ -289,19 +311,28 @@ class Dispatcher(object):
         return json.dumps(data)
 
     def get_issue_identifiers(self, collection, issn, from_date, until_date,
-                                limit, offset, extra_filter=None):
+                                limit, offset, extra_filter=None,
+                                resume_token=None):
 
         logger.debug(
             'AM Thrift - get_issue_identifiers('
             'collection=%s,issn=%s,from_date=%s,until_date=%s,limit=%s,'
-            'offset=%s,extra_filter=%s)'
-            % (collection, issn, from_date, until_date, limit, offset, extra_filter)
+            'offset=%s,extra_filter=%s,resume_token=%s)'
+            % (collection, issn, from_date, until_date, limit, offset,
+                extra_filter, resume_token)
         )
 
         from_date = from_date or '1500-01-01'
         limit = limit or 1000
         offset = offset or 0
 
+        if resume_token:
+            try:
+                decode_resume_token(resume_token)
+            except ValueError:
+                raise articlemeta_thrift.ValueError(
+                    'Value error: invalid resume_token')
+
         try:
             data = self._databroker.identifiers_issue(
                 collection=collection,
@@ -310,7 +341,9 @@ class Dispatcher(object):
                 until_date=until_date,
                 limit=limit,
                 offset=offset,
-                extra_filter=extra_filter
+                extra_filter=extra_filter,
+                resume_token=resume_token,
+                count='false'
             )
         except:
             raise articlemeta_thrift.ServerError(
@@ -321,6 +354,10 @@ class Dispatcher(object):
             collection=i['collection'],
             processing_date=i['processing_date']) for i in data['objects']]
 
+        # o último item da página carrega o token para a próxima requisição.
+        if objs and data['meta']['resume_token']:
+            objs[-1].resume_token = data['meta']['resume_token']
+
         return objs
 
     def delete_journal(self, code, collection, admintoken):
@@ -499,23 +536,37 @@ class Dispatcher(object):
                 'Server error: DataBroker.get_article')
 
         if data:
-            if fmt == 'xmlwos':
-                return Export(data).pipeline_sci()
+            if fmt in Export.XML_FORMATS:
+                return self._databroker.render_article(data, fmt)
 
-            if fmt == 'xmldoaj':
-                return Export(data).pipeline_doaj()
+            if fmt == 'opac':
+                return json.dumps(Export(data).pipeline_opac())
+
+        return json.dumps(data)
 
-            if fmt == 'xmlrsps':
-                return Export(data).pipeline_rsps()
+    def get_articles_by_codes(self, codes, collection=None,
+                              replace_journal_metadata=False, body=False):
 
-            if fmt == 'xmlpubmed':
-                return Export(data).pipeline_pubmed()
+        logger.debug(
+            'AM Thrift - get_articles_by_codes('
+            'codes=%s,collection=%s,replace_journal_metadata=%s,body=%s)'
+            % (codes, collection, replace_journal_metadata, body)
+        )
 
-            if fmt == 'xmlcrossref':
-                return Export(data).pipeline_crossref()
+        if not codes:
+            raise articlemeta_thrift.ValueError(
+                'Value error: at least one code must be given')
 
-            if fmt == 'opac':
-                return json.dumps(Export(data).pipeline_opac())
+        try:
+            data = self._databroker.get_articles_by_codes(
+                codes,
+                collection=collection,
+                replace_journal_metadata=replace_journal_metadata,
+                body=body
+            )
+        except:
+            raise articlemeta_thrift.ServerError(
+                'Server error: DataBroker.get_articles_by_codes')
 
         return json.dumps(data)
 
@@ -560,7 +611,8 @@ class Dispatcher(object):
                                                    from_date=from_date,
                                                    until_date=until_date,
                                                    limit=limit,
-                                                   offset=offset)
+                                                   offset=offset,
+                                                   count='false')
         except:
             raise articlemeta_thrift.ServerError(
                 'Server error: DataBroker.historychanges')
@@ -589,7 +641,8 @@ class Dispatcher(object):
                                                         issn=issn,
                                                         limit=limit,
                                                         offset=offset,
-                                                        extra_filter=extra_filter)
+                                                        extra_filter=extra_filter,
+                                                        count='false')
         except:
             raise articlemeta_thrift.ServerError(
                 'Server error: DataBroker.identifiers_journal')
@@ -1,5 +1,6 @@
 # coding: utf-8
 import os
+import threading
 import weakref
 
 from configparser import ConfigParser
@@ -53,6 +54,39 @@ def convert_all_html_tags_to_jats(xml_etree):
     return xml_etree
 
 
+_thread_instances = threading.local()
+
+
+def get_thread_instance(key, factory):
+    """
+    Returns the object of the current thread for ``key``, built by calling
+    ``factory`` on its first use in the thread.
+
+    Meant for objects that are expensive to build and can not be shared
+    between threads, as plumber pipelines.
+    """
+    instances = getattr(_thread_instances, 'instances', None)
+    if instances is None:
+        instances = _thread_instances.instances = {}
+
+    try:
+        return instances[key]
+    except KeyError:
+        instance = instances[key] = factory()
+        return instance
+
+
+class ThreadLocalInstanceMixin(object):
+    """
+    Adds a ``get_instance`` classmethod, that returns the instance of the
+    class of the current thread (see ``get_thread_instance``).
+    """
+
+    @classmethod
+    def get_instance(cls):
+        return get_thread_instance(cls, cls)
+
+
 class SingletonMixin(object):
     """
     Adds a singleton behaviour to an existing class.
@@ -0,0 +1,371 @@
+# coding: utf-8
+"""
+Benchmark of the DataBroker methods behind the most used API endpoints.
+
+For each database size the collections are filled by benchmarks.datagen and
+each operation is called ``--calls`` times with random arguments, reporting
+the latency percentiles and the number of database commands per call.
+
+The database is a local mongod, given by ``--mongodb`` (the declared indexes
+are created), or mongomock when it is not given. mongomock has no
+indexes and keeps everything in memory, it is only meaningful for the query
+counts and the smaller sizes.
+
+The results can be kept as a baseline (``--save-baseline``) and the next runs
+compared against it (``--compare``), exiting with status 1 when an operation
+got slower than the tolerance or issues more commands.
+
+Run from the root of the repository:
+
+    python -m benchmarks.bench_databroker --sizes 10000
+    python -m benchmarks.bench_databroker --mongodb mongodb://localhost:27017/articlemeta_bench --save-baseline
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import warnings
+import threading
+from unittest import mock
+from collections import Counter
+
+import mongomock
+from pymongo import monitoring
+
+from articlemeta import controller, indexes
+from benchmarks import datagen
+
+SIZES = [10000, 100000, 1000000]
+MONGOMOCK_SIZES = [10000]
+CALLS = 100
+MONGOMOCK_CALLS = 10
+WARMUP = 5
+TOLERANCE = 0.5
+PERCENTILES = [50, 90, 99]
+BASELINES = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                         'baselines')
+
+# Commands of the driver itself, not issued by the DataBroker.
+IGNORED_COMMANDS = frozenset([
+    'isMaster', 'ismaster', 'hello', 'ping', 'buildInfo', 'buildinfo',
+    'endSessions', 'saslStart', 'saslContinue', 'getnonce', 'authenticate',
+    'createIndexes', 'drop', 'insert'])
+
+
+class CommandCounter(monitoring.CommandListener):
+    """
+    Counts the commands sent to a mongod, by command name.
+    """
+
+    def __init__(self):
+        self.commands = Counter()
+        self._lock = threading.Lock()
+
+    def started(self, event):
+        if event.command_name in IGNORED_COMMANDS:
+            return
+
+        with self._lock:
+            self.commands[event.command_name] += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+    def reset(self):
+        with self._lock:
+            self.commands.clear()
+
+
+class MongomockCounter(object):
+    """
+    Counts the queries sent to mongomock, which has no command monitoring,
+    by wrapping the methods that would send a command to a mongod. ``find_one``
+    is counted as the ``find`` it calls.
+    """
+
+    METHODS = [
+        (mongomock.collection.Collection, 'find', 'find'),
+        (mongomock.collection.Collection, 'aggregate', 'aggregate'),
+        (mongomock.collection.Collection, 'estimated_document_count', 'count'),
+        (mongomock.collection.Cursor, 'count', 'count'),
+    ]
+
+    def __init__(self):
+        self.commands = Counter()
+        self._patchers = []
+
+        for owner, method, command in self.METHODS:
+            self._patchers.append(mock.patch.object(
+                owner, method, self._counting(getattr(owner, method), command)))
+
+    def _counting(self, func, command):
+        def wrapper(*args, **kwargs):
+            self.commands[command] += 1
+            return func(*args, **kwargs)
+
+        return wrapper
+
+    def start(self):
+        for patcher in self._patchers:
+            patcher.start()
+
+    def stop(self):
+        for patcher in self._patchers:
+            patcher.stop()
+
+    def reset(self):
+        self.commands.clear()
+
+
+def percentile(values, percent):
+    values = sorted(values)
+    index = int(round(percent / 100.0 * (len(values) - 1)))
+
+    return values[index]
+
+
+def operations(size):
+    """
+    The benchmarked operations, as (name, function of a random generator
+    and the broker).
+    """
+    collections = datagen.COLLECTIONS[:datagen.journals_count(size)]
+
+    def get_article(rnd, broker):
+        code, collection = datagen.article_code(rnd.randrange(size))
+        return broker.get_article(code, collection=rnd.choice([collection, None]))
+
+    def get_articles_full(rnd, broker):
+        return broker.get_articles_full(collection=rnd.choice(collections),
+                                        offset=rnd.randrange(0, 1000, 100),
+                                        limit=100)
+
+    def identifiers_article(rnd, broker):
+        return broker.identifiers_article(collection=rnd.choice(collections),
+                                          offset=rnd.randrange(0, 10000, 1000))
+
+    def counter_dict(rnd, broker):
+        return broker.counter_dict(collection=rnd.choice(collections),
+                                   offset=rnd.randrange(0, 1000, 100),
+                                   limit=100)
+
+    def historychanges(rnd, broker):
+        return broker.historychanges('article',
+                                     collection=rnd.choice(collections),
+                                     offset=rnd.randrange(0, 10000, 1000))
+
+    return [
+        ('get_article', get_article),
+        ('get_articles_full', get_articles_full),
+        ('identifiers_article', identifiers_article),
+        ('counter_dict', counter_dict),
+        ('historychanges', historychanges),
+    ]
+
+
+def clear_caches():
+    for cache in [controller._journal_cache, controller._issue_cache,
+                  controller._count_cache]:
+        cache.clear()
+
+
+def measure(func, broker, counter, calls, warmup, seed):
+    """
+    Call ``func`` ``calls`` times, after ``warmup`` calls, returning the
+    latency percentiles in milliseconds and the commands per call.
+    """
+    rnd = random.Random(seed)
+    clear_caches()
+
+    for _ in range(warmup):
+        func(rnd, broker)
+
+    counter.reset()
+    latencies = []
+    for _ in range(calls):
+        started = time.perf_counter()
+        func(rnd, broker)
+        latencies.append((time.perf_counter() - started) * 1000)
+
+    result = {'p%d' % i: round(percentile(latencies, i), 3)
+              for i in PERCENTILES}
+    result['mean'] = round(sum(latencies) / len(latencies), 3)
+    result['queries'] = round(sum(counter.commands.values()) / float(calls), 2)
+    result['commands'] = {
+        k: round(v / float(calls), 2) for k, v in counter.commands.items()}
+
+    return result
+
+
+def compare(results, baseline, tolerance):
+    """
+    Return the regressions of ``results`` against ``baseline``, both as
+    {size: {operation: result}}.
+    """
+    regressions = []
+
+    for size, operations_results in results.items():
+        for name, result in operations_results.items():
+            previous = baseline.get(size, {}).get(name)
+            if previous is None:
+                continue
+
+            for key in ['p50', 'p90']:
+                if result[key] > previous[key] * (1 + tolerance):
+                    regressions.append('%s@%s: %s %.3fms > %.3fms' % (
+                        name, size, key, result[key], previous[key]))
+
+            if result['queries'] > previous['queries']:
+                regressions.append('%s@%s: %.2f queries > %.2f' % (
+                    name, size, result['queries'], previous['queries']))
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark of the DataBroker hot paths'
+    )
+
+    parser.add_argument(
+        '--mongodb',
+        default=None,
+        help='URI of the mongod database, ex: mongodb://localhost:27017/articlemeta_bench. Its collections are replaced. mongomock is used when not given'
+    )
+
+    parser.add_argument(
+        '--sizes',
+        type=lambda x: [int(i) for i in x.split(',')],
+        default=None,
+        help='Comma separated numbers of articles, default %s for a mongod and %s for mongomock' % (
+            ','.join(str(i) for i in SIZES),
+            ','.join(str(i) for i in MONGOMOCK_SIZES))
+    )
+
+    parser.add_argument(
+        '--calls',
+        type=int,
+        default=None,
+        help='Measured calls of each operation, default %d for a mongod and %d for mongomock' % (
+            CALLS, MONGOMOCK_CALLS)
+    )
+
+    parser.add_argument(
+        '--warmup',
+        type=int,
+        default=WARMUP,
+        help='Calls of each operation before the measured ones'
+    )
+
+    parser.add_argument(
+        '--seed',
+        type=int,
+        default=0
+    )
+
+    parser.add_argument(
+        '--baseline',
+        default=None,
+        help='Baseline file, default benchmarks/baselines/<mongod|mongomock>.json'
+    )
+
+    parser.add_argument(
+        '--save-baseline',
+        dest='save_baseline',
+        action='store_true',
+        help='Store the results in the baseline file'
+    )
+
+    parser.add_argument(
+        '--compare',
+        action='store_true',
+        help='Compare the results with the baseline file, exit with status 1 on regressions'
+    )
+
+    parser.add_argument(
+        '--tolerance',
+        type=float,
+        default=TOLERANCE,
+        help='Slowdown of p50 and p90 accepted by --compare, 0.5 means 50%%'
+    )
+
+    args = parser.parse_args()
+
+    # Cursor.count, used by count_documents, is deprecated.
+    warnings.simplefilter('ignore', DeprecationWarning)
+
+    backend = 'mongod' if args.mongodb else 'mongomock'
+    sizes = args.sizes or (SIZES if args.mongodb else MONGOMOCK_SIZES)
+    calls = args.calls or (CALLS if args.mongodb else MONGOMOCK_CALLS)
+    baseline_file = args.baseline or os.path.join(BASELINES, backend + '.json')
+
+    if args.mongodb:
+        counter = CommandCounter()
+        monitoring.register(counter)
+        db = controller.get_dbconn(args.mongodb)
+        indexes.ensure_indexes(db)
+    else:
+        counter = MongomockCounter()
+        db = mongomock.MongoClient().articlemeta_bench
+
+    broker = controller.DataBroker(db)
+
+    row = '%-20s %9s %9s %9s %9s %9s %8s'
+    results = {}
+    for size in sizes:
+        started = time.time()
+        generated = datagen.generate(db, size)
+        print('\n%d articles, %d issues, %d journals, %d changes (%.1fs)' % (
+            generated['articles'], generated['issues'], generated['journals'],
+            generated['changes'], time.time() - started))
+        print(row % ('operation', 'p50 ms', 'p90 ms', 'p99 ms', 'mean ms',
+                     'calls', 'queries'))
+
+        if isinstance(counter, MongomockCounter):
+            counter.start()
+
+        try:
+            results[str(size)] = {}
+            for name, func in operations(size):
+                result = measure(func, broker, counter, calls,
+                                 args.warmup, args.seed)
+                results[str(size)][name] = result
+                print(row % (name, result['p50'], result['p90'],
+                             result['p99'], result['mean'], calls,
+                             result['queries']))
+        finally:
+            if isinstance(counter, MongomockCounter):
+                counter.stop()
+
+    baseline = {}
+    if os.path.exists(baseline_file):
+        with open(baseline_file) as fp:
+            baseline = json.load(fp)
+
+    status = 0
+    if args.compare:
+        regressions = compare(results, baseline, args.tolerance)
+        for regression in regressions:
+            print('REGRESSION %s' % regression)
+        if regressions:
+            status = 1
+        else:
+            print('\nNo regressions against %s' % baseline_file)
+
+    if args.save_baseline:
+        baseline.update(results)
+        os.makedirs(os.path.dirname(baseline_file), exist_ok=True)
+        with open(baseline_file, 'w') as fp:
+            json.dump(baseline, fp, indent=2, sort_keys=True)
+        print('\nBaseline saved to %s' % baseline_file)
+
+    sys.exit(status)
+
+
+if __name__ == "__main__":
+    main()
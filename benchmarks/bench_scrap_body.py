@@ -0,0 +1,98 @@
+# coding: utf-8
+"""
+Micro-benchmark of the body extraction of processing.load_body.
+
+The corpus is the fixed set of SciELO pages of tests/fixtures, each page is
+extracted ``--number`` times per round and the best of ``--repeat`` rounds is
+reported, together with the time of detecting the charset with chardet over
+the whole page, as it was done before.
+
+Run from the root of the repository:
+
+    python -m benchmarks.bench_scrap_body
+"""
+import os
+import glob
+import timeit
+import argparse
+
+import chardet
+
+from processing import load_body, escape_html_http_tags
+
+FIXTURES = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), 'tests', 'fixtures')
+LANGUAGES = ['pt', 'en']
+
+
+def load_corpus(path=FIXTURES):
+    corpus = []
+
+    for name in sorted(glob.glob(os.path.join(path, 'body_*.html'))):
+        with open(name, 'rb') as fp:
+            data = fp.read()
+
+        # the language of the body of the page, the other one is not found.
+        language = [i for i in LANGUAGES if load_body.scrap_body(data, i)]
+        corpus.append((os.path.basename(name), data, (language or ['pt'])[0]))
+
+    return corpus
+
+
+def best(func, number, repeat):
+    """
+    Best time of ``repeat`` rounds, in milliseconds per call.
+    """
+    return min(timeit.repeat(func, number=number, repeat=repeat)) / number * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark of processing.load_body.scrap_body'
+    )
+
+    parser.add_argument(
+        '--number',
+        '-n',
+        type=int,
+        default=20,
+        help='Calls per round'
+    )
+
+    parser.add_argument(
+        '--repeat',
+        '-r',
+        type=int,
+        default=5,
+        help='Rounds, the best one is reported'
+    )
+
+    args = parser.parse_args()
+
+    row = '%-28s %8s %10s %10s %10s %10s'
+    print(row % ('page', 'KiB', 'scrap ms', 'escape ms', 'charset ms',
+                 'chardet ms'))
+
+    totals = [0, 0, 0, 0]
+    for name, data, language in load_corpus():
+        text = data.decode('utf-8')
+
+        timings = [
+            best(lambda: load_body.scrap_body(data, language), args.number,
+                 args.repeat),
+            best(lambda: escape_html_http_tags(text), args.number,
+                 args.repeat),
+            best(lambda: load_body.detect_encoding(data), args.number,
+                 args.repeat),
+            best(lambda: chardet.detect(data), 1, args.repeat),
+        ]
+        totals = [i + j for i, j in zip(totals, timings)]
+
+        print(row % ((name, '%.1f' % (len(data) / 1024.0)) +
+                     tuple('%.3f' % i for i in timings)))
+
+    print(row % (('total', '') + tuple('%.3f' % i for i in totals)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,269 @@
+# coding: utf-8
+"""
+Synthetic SciELO-shaped data for the benchmarks.
+
+The records are made from the article of tests/fixtures/article_meta.json,
+with its journal and issue, so they have the ISIS fields read by xylose and
+by the exports. The codes are derived from the position of the record, the
+same ``articles`` count always produces the same database and the benchmarks
+can pick existing codes without querying it.
+
+Layout: each journal has ``ISSUES_PER_JOURNAL`` issues of
+``ARTICLES_PER_ISSUE`` articles, the journals are spread over
+``COLLECTIONS``. Every record has an ``add`` event in the history, and some
+articles also have ``update`` and ``delete`` ones.
+"""
+import os
+import json
+import random
+from datetime import datetime, timedelta
+
+TEMPLATE = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), 'tests', 'fixtures', 'article_meta.json')
+
+COLLECTIONS = ['scl', 'arg', 'mex', 'spa']
+ARTICLES_PER_ISSUE = 25
+ISSUES_PER_JOURNAL = 40
+ISSUES_PER_YEAR = 4
+FIRST_YEAR = 2000
+# Citations kept of the template (it has 23), to bound the size of the
+# records of the large databases.
+CITATIONS = 10
+UPDATED_RATIO = 0.1
+DELETED_RATIO = 0.01
+BATCH_SIZE = 1000
+
+
+def load_template(path=TEMPLATE):
+    with open(path) as fp:
+        return json.load(fp)
+
+
+def journal_issn(journal):
+    return '%04d-%04d' % (1000 + journal // 10000, journal % 10000)
+
+
+def journal_collection(journal):
+    return COLLECTIONS[journal % len(COLLECTIONS)]
+
+
+def issue_code(journal, issue):
+    """
+    Issue code, as in the ``code`` of the issues: ISSN, year and order.
+    """
+    year = FIRST_YEAR + issue // ISSUES_PER_YEAR
+    order = issue % ISSUES_PER_YEAR + 1
+
+    return '%s%04d%04d' % (journal_issn(journal), year, order)
+
+
+def article_code(index):
+    """
+    Code and collection of the article at position ``index``.
+    """
+    journal, rest = divmod(index, ISSUES_PER_JOURNAL * ARTICLES_PER_ISSUE)
+    issue, order = divmod(rest, ARTICLES_PER_ISSUE)
+
+    code = 'S%s%05d' % (issue_code(journal, issue), order + 1)
+
+    return code, journal_collection(journal)
+
+
+def journals_count(articles):
+    per_journal = ISSUES_PER_JOURNAL * ARTICLES_PER_ISSUE
+
+    return (articles + per_journal - 1) // per_journal
+
+
+def processing_date(journal, issue, order=0):
+    year = FIRST_YEAR + issue // ISSUES_PER_YEAR
+    month = (issue % ISSUES_PER_YEAR) * 3 + 1
+
+    return datetime(year, month, 1) + timedelta(
+        days=journal % 28, minutes=order)
+
+
+class Generator(object):
+
+    def __init__(self, template=None, citations=CITATIONS, seed=0):
+        self.template = template or load_template()
+        self.citations = citations
+        self.random = random.Random(seed)
+
+    def journal(self, journal):
+        issn = journal_issn(journal)
+        acronym = 'j%d' % journal
+        date = processing_date(journal, 0)
+
+        data = dict(self.template['title'])
+        data.update({
+            'code': issn,
+            'collection': journal_collection(journal),
+            'v400': [{'_': issn}],
+            'v935': [{'_': issn}],
+            'v68': [{'_': acronym}],
+            'v930': [{'_': acronym.upper()}],
+            'v100': [{'_': 'Journal %d' % journal}],
+            'processing_date': date,
+            'created_at': date,
+            'updated_at': date,
+        })
+
+        return data
+
+    def issue(self, journal, issue):
+        code = issue_code(journal, issue)
+        date = processing_date(journal, issue)
+        year = code[9:13]
+
+        data = dict(self.template['issue'])
+        data.pop('_shard_id', None)
+        data.update({
+            'code': code,
+            'collection': journal_collection(journal),
+            'code_title': [journal_issn(journal)],
+            'publication_year': year,
+            'publication_date': '%s-%02d' % (year, date.month),
+            'processing_date': date,
+            'created_at': date,
+            'updated_at': date,
+        })
+        data['issue'] = dict(data['issue'])
+        data['issue'].update({
+            'v35': [{'_': journal_issn(journal)}],
+            'v65': [{'_': '%s%02d00' % (year, date.month)}],
+            'v880': [{'_': code}],
+            'v31': [{'_': str(int(year) - FIRST_YEAR + 1)}],
+            'v32': [{'_': str(issue % ISSUES_PER_YEAR + 1)}],
+        })
+
+        return data
+
+    def article(self, index):
+        code, collection = article_code(index)
+        journal, rest = divmod(index, ISSUES_PER_JOURNAL * ARTICLES_PER_ISSUE)
+        issue, order = divmod(rest, ARTICLES_PER_ISSUE)
+        date = processing_date(journal, issue, order)
+        year = code[10:14]
+        doi = '10.1590/%s' % code
+
+        data = {
+            key: value for key, value in self.template.items()
+            if key not in ('_id', 'body', 'issue')
+        }
+        data.update({
+            'code': code,
+            'collection': collection,
+            'code_title': [journal_issn(journal)],
+            # the code of the issue, so the issue joins are exercised.
+            'code_issue': code[1:18],
+            'doi': doi.upper(),
+            'publication_year': year,
+            'publication_date': '%s-%02d' % (year, date.month),
+            'processing_date': date,
+            'created_at': date,
+            'updated_at': date,
+            'citations': self.template['citations'][:self.citations],
+            'title': self.journal(journal),
+        })
+        data['article'] = dict(data['article'])
+        data['article'].update({
+            'v880': [{'_': code}],
+            'v237': [{'_': doi}],
+            'v35': [{'_': journal_issn(journal)}],
+            'v65': [{'_': '%s%02d00' % (year, date.month)}],
+            'v31': [{'_': str(int(year) - FIRST_YEAR + 1)}],
+            'v32': [{'_': str(issue % ISSUES_PER_YEAR + 1)}],
+            'v121': [{'_': '%02d' % (order + 1)}],
+        })
+
+        return data
+
+    def changes(self, code, collection, date):
+        changes = [{'code': code, 'collection': collection, 'event': 'add',
+                    'date': date}]
+
+        draw = self.random.random()
+        if draw < UPDATED_RATIO:
+            changes.append({
+                'code': code, 'collection': collection, 'event': 'update',
+                'date': date + timedelta(days=self.random.randint(1, 365))})
+        if draw < DELETED_RATIO:
+            changes.append({
+                'code': code, 'collection': collection, 'event': 'delete',
+                'date': date + timedelta(days=400)})
+
+        return changes
+
+
+def insert(collection, documents, batch_size=BATCH_SIZE):
+    batch = []
+
+    for document in documents:
+        batch.append(document)
+        if len(batch) == batch_size:
+            collection.insert_many(batch, ordered=False)
+            batch = []
+
+    if batch:
+        collection.insert_many(batch, ordered=False)
+
+
+def generate(db, articles, citations=CITATIONS, seed=0,
+             batch_size=BATCH_SIZE):
+    """
+    Fill ``db`` (a pymongo or mongomock database) with ``articles`` articles,
+    and their journals, issues and history. The collections are dropped
+    first.
+    """
+    generator = Generator(citations=citations, seed=seed)
+
+    for name in ['articles', 'issues', 'journals', 'historychanges_article',
+                 'historychanges_issue', 'historychanges_journal']:
+        db[name].drop()
+
+    journals = journals_count(articles)
+    issues = [(j, i) for j in range(journals) for i in range(ISSUES_PER_JOURNAL)
+              if (j * ISSUES_PER_JOURNAL + i) * ARTICLES_PER_ISSUE < articles]
+
+    insert(db['journals'], (generator.journal(j) for j in range(journals)),
+           batch_size)
+    insert(db['historychanges_journal'], (
+        {'code': journal_issn(j), 'collection': journal_collection(j),
+         'event': 'add', 'date': processing_date(j, 0)}
+        for j in range(journals)), batch_size)
+
+    insert(db['issues'], (generator.issue(j, i) for j, i in issues),
+           batch_size)
+    insert(db['historychanges_issue'], (
+        {'code': issue_code(j, i), 'collection': journal_collection(j),
+         'event': 'add', 'date': processing_date(j, i)}
+        for j, i in issues), batch_size)
+
+    def articles_and_changes():
+        for index in range(articles):
+            article = generator.article(index)
+            yield article, generator.changes(
+                article['code'], article['collection'],
+                article['processing_date'])
+
+    batch, changes = [], []
+    for article, article_changes in articles_and_changes():
+        batch.append(article)
+        changes.extend(article_changes)
+
+        if len(batch) == batch_size:
+            db['articles'].insert_many(batch, ordered=False)
+            db['historychanges_article'].insert_many(changes, ordered=False)
+            batch, changes = [], []
+
+    if batch:
+        db['articles'].insert_many(batch, ordered=False)
+        db['historychanges_article'].insert_many(changes, ordered=False)
+
+    return {
+        'articles': articles,
+        'issues': len(issues),
+        'journals': journals,
+        'changes': db['historychanges_article'].estimated_document_count(),
+    }
@@ -1,7 +1,14 @@
 import re
 import html
 
-HTTP_SCAPE_CHARS = re.compile(".*(<http.*?>|<http.*?>?).*", re.MULTILINE)
+# Um "<http" até o primeiro ">" da mesma linha, ou apenas o "<http" quando a
+# linha não tem ">".
+HTTP_SCAPE_CHARS = re.compile(r"<http(?:[^>\n]*>)?")
+
+
+def _escape_match(match):
+    return html.escape(match.group())
+
 
 def escape_html_http_tags(string):
     """Escapa trechos de uma string que podem ser interpretadas como tags HTML.
@@ -12,8 +19,7 @@ def escape_html_http_tags(string):
     >>> "Citação disponível em &lt;http://www.scielo.br"
     """
 
-    while HTTP_SCAPE_CHARS.match(string):
-        match = HTTP_SCAPE_CHARS.match(string)
-        http_string = match.groups()[0]
-        string = string.replace(http_string, html.escape(http_string))
-    return string
+    if "<http" not in string:
+        return string
+
+    return HTTP_SCAPE_CHARS.sub(_escape_match, string)
@@ -0,0 +1,183 @@
+# coding: utf-8
+"""
+Batched writer shared by the processing scripts.
+
+The loaders used to issue one ``update`` per document, spending most of the
+time of a full reload in write round trips. ``BulkWriter`` collects the
+operations and sends them with unordered ``bulk_write`` calls, flushing when
+``batch_size`` operations are pending or ``flush_interval`` seconds have
+passed since the last flush.
+"""
+import time
+import logging
+
+from pymongo import UpdateOne
+from pymongo.errors import AutoReconnect, BulkWriteError
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 500
+FLUSH_INTERVAL = 10
+RETRIES = 3
+BACKOFF_FACTOR = 1
+MAX_ERRORS = 1000
+
+
+class BulkWriter(object):
+    """
+    Collects write operations for ``collection`` and sends them in batches.
+
+    When a batch fails with a connection error it is retried ``retries``
+    times, waiting ``backoff_factor * 2 ** attempt`` seconds between the
+    attempts. The operations are kept pending if it still fails, so that a
+    later ``flush`` resumes from the failed batch. The errors of single
+    operations (BulkWriteError) are logged and kept in ``errors``, the
+    remaining operations of an unordered batch are applied anyway.
+
+    Used as a context manager, the pending operations are written when the
+    block is left, also when it is left by an exception.
+
+    Usage::
+
+        with BulkWriter(articlemeta_db['articles']) as writer:
+            writer.update_one({'code': code}, {'$set': {'doi': doi}})
+    """
+
+    def __init__(self, collection, batch_size=BATCH_SIZE,
+                 flush_interval=FLUSH_INTERVAL, ordered=False,
+                 retries=RETRIES, backoff_factor=BACKOFF_FACTOR,
+                 timer=time.monotonic, sleep=time.sleep):
+        self.collection = collection
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.ordered = ordered
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self._timer = timer
+        self._sleep = sleep
+        self._operations = []
+        self._last_flush = timer()
+        # first MAX_ERRORS failed operations, {'operation': ..., 'errmsg': ...}
+        self.errors = []
+        self.stats = {
+            'batches': 0,
+            'operations': 0,
+            'matched': 0,
+            'modified': 0,
+            'upserted': 0,
+            'errors': 0,
+        }
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+            return
+
+        # do not hide the exception that left the block
+        try:
+            self.close()
+        except Exception:
+            logger.exception('Fail to write the pending operations to %s',
+                             self.collection.name)
+
+    def __len__(self):
+        return len(self._operations)
+
+    def add(self, operation):
+        """
+        Queue a pymongo write operation (UpdateOne, ReplaceOne, ...).
+        """
+        self._operations.append(operation)
+
+        if len(self._operations) >= self.batch_size or \
+                self._timer() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def update_one(self, fltr, update, upsert=False):
+        self.add(UpdateOne(fltr, update, upsert=upsert))
+
+    def _write(self, batch):
+        for attempt in range(self.retries + 1):
+            try:
+                return self.collection.bulk_write(batch, ordered=self.ordered)
+            except AutoReconnect as exc:
+                if attempt == self.retries:
+                    raise
+
+                wait = self.backoff_factor * 2 ** attempt
+                logger.warning(
+                    'Fail to write a batch of %d operations (%s), retrying in %s seconds',
+                    len(batch), exc, wait)
+                self._sleep(wait)
+
+    def _report(self, batch, matched, modified, upserted, errors):
+        self.stats['batches'] += 1
+        self.stats['operations'] += len(batch)
+        self.stats['matched'] += matched
+        self.stats['modified'] += modified
+        self.stats['upserted'] += upserted
+        self.stats['errors'] += errors
+
+        logger.debug(
+            'Batch %d written to %s: %d operations, %d matched, %d modified, '
+            '%d upserted, %d errors', self.stats['batches'],
+            self.collection.name, len(batch), matched, modified, upserted,
+            errors)
+
+    def flush(self):
+        """
+        Write the pending operations. Returns the number of modified
+        documents.
+        """
+        self._last_flush = self._timer()
+
+        if not self._operations:
+            return 0
+
+        batch = self._operations
+
+        try:
+            result = self._write(batch)
+        except BulkWriteError as exc:
+            details = exc.details
+            for error in details.get('writeErrors', []):
+                operation = batch[error['index']]
+                logger.error('Fail to write operation %s: %s',
+                             operation, error.get('errmsg'))
+                if len(self.errors) < MAX_ERRORS:
+                    self.errors.append({'operation': operation,
+                                        'errmsg': error.get('errmsg')})
+            self._operations = []
+            self._report(batch, details.get('nMatched', 0),
+                         details.get('nModified', 0),
+                         details.get('nUpserted', 0),
+                         len(details.get('writeErrors', [])))
+            return details.get('nModified', 0)
+
+        self._operations = []
+        self._report(batch, result.matched_count, result.modified_count,
+                     result.upserted_count, 0)
+
+        return result.modified_count
+
+    def close(self):
+        """
+        Write the pending operations and log the totals. Returns the
+        ``errors`` of the operations that could not be written.
+        """
+        self.flush()
+
+        logger.info(
+            'Writes to %s: %d batches, %d operations, %d modified, %d errors',
+            self.collection.name, self.stats['batches'],
+            self.stats['operations'], self.stats['modified'],
+            self.stats['errors'])
+
+        if self.stats['errors']:
+            logger.error('%d operations could not be written to %s',
+                         self.stats['errors'], self.collection.name)
+
+        return self.errors
@@ -0,0 +1,240 @@
+# coding: utf-8
+"""
+Run state of the processing scripts.
+
+Each run of a loader over a collection keeps a checkpoint in the
+``processing_checkpoints`` collection of the Articlemeta database, with the
+``_id`` of the last processed document, the counters and the failures of the
+run. An interrupted run can be resumed from it (``--resume``) and a later run
+can process only the documents added since it (``--since-checkpoint``).
+
+The incremental runs (``--incremental``) keep, in the same record, the date of
+the last change read from the change log (the watermark).
+"""
+import logging
+from datetime import datetime
+
+from processing.documents import ChangeLog
+
+logger = logging.getLogger(__name__)
+
+COLLECTION = 'processing_checkpoints'
+# Number of processed documents between two saves of the checkpoint.
+SAVE_EVERY = 1000
+# Maximum number of failed document codes kept in the checkpoint.
+MAX_FAILED = 1000
+
+
+def add_arguments(parser):
+    """
+    Add the --resume, --since-checkpoint and --incremental options to an
+    argparse parser.
+    """
+    parser.add_argument(
+        '--resume',
+        action='store_true',
+        help='Resume the last run if it was interrupted'
+    )
+
+    parser.add_argument(
+        '--since-checkpoint',
+        dest='since_checkpoint',
+        action='store_true',
+        help='Process only the documents added after the last processed document of the previous run'
+    )
+
+    parser.add_argument(
+        '--incremental',
+        action='store_true',
+        help='Process only the documents added or updated since the last incremental run, according to the change log, including the documents already processed once'
+    )
+
+
+class Checkpoint(object):
+    """
+    State of a running job. ``after_id`` is where the loading of the
+    documents must start (None for the beginning).
+
+    When a ``writer`` (BulkWriter) is given, it is flushed before each save,
+    so the stored ``last_id`` never gets ahead of the written data.
+
+    In the incremental runs ``changes`` is the ChangeLog of the documents to
+    be processed, the watermark is moved to its last change when the run
+    finishes.
+    """
+
+    def __init__(self, store, job, collection, shard=None, after_id=None,
+                 processed=0, failures=0, failed=None, writer=None,
+                 save_every=SAVE_EVERY):
+        self.store = store
+        self.job = job
+        self.collection = collection
+        self.shard = shard
+        self.after_id = after_id
+        self.last_id = after_id
+        self.processed = processed
+        self.failures = failures
+        self.failed = failed or []
+        self.writer = writer
+        self.save_every = save_every
+        self.status = 'running'
+        self.watermark = None
+        self.changes = None
+        self.started_at = datetime.now()
+        self._unsaved = 0
+
+    def advance(self, document_id):
+        """
+        Mark every document until ``document_id`` as processed.
+        """
+        self.last_id = document_id
+        self.processed += 1
+        self._unsaved += 1
+
+        if self._unsaved >= self.save_every:
+            self.save()
+
+    def fail(self, code):
+        """
+        Register the failure of the document ``code``. The document must still
+        be marked as processed with ``advance``.
+        """
+        self.failures += 1
+
+        if len(self.failed) < MAX_FAILED:
+            self.failed.append(code)
+
+    def track(self, documents):
+        """
+        Yield the xylose documents of ``documents``, advancing the checkpoint
+        once the processing of each one is done.
+        """
+        for document in documents:
+            yield document
+            self.advance(document.data['_id'])
+
+    def save(self):
+        if self.writer is not None:
+            self.writer.flush()
+
+        self.store.save(self)
+        self._unsaved = 0
+
+    def finish(self):
+        self.status = 'finished'
+        if self.changes is not None:
+            self.watermark = self.changes.last_date
+        self.save()
+
+        logger.info(
+            'Run %s finished: %d documents processed, %d failures',
+            self.store.key(self.job, self.collection, self.shard),
+            self.processed, self.failures)
+
+    @property
+    def stats(self):
+        stats = {'processed': self.processed, 'failures': self.failures}
+
+        if self.writer is not None:
+            stats['modified'] = self.writer.stats['modified']
+
+        return stats
+
+    def as_dict(self):
+        data = {
+            'job': self.job,
+            'collection': self.collection,
+            'shard': list(self.shard) if self.shard else None,
+            'status': self.status,
+            'last_id': self.last_id,
+            'processed': self.processed,
+            'failures': self.failures,
+            'failed': self.failed,
+            'started_at': self.started_at,
+            'updated_at': datetime.now(),
+        }
+
+        if self.watermark is not None:
+            data['watermark'] = self.watermark
+
+        return data
+
+
+class CheckpointStore(object):
+    """
+    Keeps the checkpoints keyed by job, collection and shard.
+    """
+
+    def __init__(self, db, collection_name=COLLECTION):
+        self.db = db
+        self.collection = db[collection_name]
+
+    @staticmethod
+    def key(job, collection, shard=None):
+        key = '%s:%s' % (job, collection)
+
+        if shard is not None:
+            key += ':%d/%d' % (shard[0] + 1, shard[1])
+
+        return key
+
+    def get(self, job, collection, shard=None):
+        return self.collection.find_one({'_id': self.key(job, collection, shard)})
+
+    def save(self, checkpoint):
+        self.collection.update_one(
+            {'_id': self.key(checkpoint.job, checkpoint.collection, checkpoint.shard)},
+            {'$set': checkpoint.as_dict()},
+            upsert=True
+        )
+
+    def start(self, job, collection, shard=None, resume=False,
+              since_checkpoint=False, incremental=False, writer=None,
+              save_every=SAVE_EVERY):
+        """
+        Start a run of ``job`` over ``collection``.
+
+        @param resume: continue the previous run, with its counters, if it
+            did not finish.
+        @param since_checkpoint: start after the last document processed by
+            the previous run, even if it has finished.
+        @param incremental: process only the documents changed since the
+            watermark of the previous incremental run. The incremental runs
+            are kept apart from the full ones, as they are processed in a
+            different order.
+        """
+        if incremental:
+            job = '%s:incremental' % job
+
+        key = self.key(job, collection, shard)
+        previous = self.get(job, collection, shard)
+
+        kwargs = {}
+        if previous and resume:
+            if previous['status'] == 'running':
+                logger.info('Resuming %s after _id %s', key, previous['last_id'])
+                kwargs = {
+                    'after_id': previous['last_id'],
+                    'processed': previous['processed'],
+                    'failures': previous['failures'],
+                    'failed': previous['failed'],
+                }
+            else:
+                logger.info('Last run of %s has finished, starting over', key)
+
+        if previous and since_checkpoint:
+            logger.info('Processing %s since _id %s', key, previous['last_id'])
+            kwargs = {'after_id': previous['last_id']}
+
+        checkpoint = Checkpoint(self, job, collection, shard=shard,
+                                writer=writer, save_every=save_every, **kwargs)
+        if previous:
+            checkpoint.watermark = previous.get('watermark')
+
+        if incremental:
+            checkpoint.changes = ChangeLog(self.db, collection,
+                                           since=checkpoint.watermark)
+
+        checkpoint.save()
+
+        return checkpoint
@@ -0,0 +1,240 @@
+# coding: utf-8
+"""
+Streaming document loader shared by the processing scripts.
+
+The documents are read with a single server side cursor sorted by ``_id``,
+so a run can be resumed after the last processed ``_id`` and split among
+workers by ``_id`` ranges.
+
+``ChangeLog`` loads only the documents changed since a given date, according
+to the ``historychanges_article`` collection, for the incremental runs.
+"""
+import logging
+
+from pymongo.errors import CursorNotFound
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 500
+# Number of codes or _ids of an $in query.
+CHUNK_SIZE = 1000
+
+# Fields never used by the loaders, the citations and the body are the
+# biggest parts of a document.
+PROJECTION = {'citations': 0, 'body': 0}
+
+
+def chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def parse_shard(value):
+    """
+    Parse a shard given as ``INDEX/TOTAL`` (1 based), returning the 0 based
+    tuple (index, total). Meant to be used as an argparse ``type``.
+    """
+    try:
+        index, total = [int(i) for i in value.split('/')]
+    except ValueError:
+        raise ValueError('shard must be given as INDEX/TOTAL, ex: 1/4')
+
+    if total < 1 or not 1 <= index <= total:
+        raise ValueError('shard index must be between 1 and TOTAL')
+
+    return index - 1, total
+
+
+def id_boundary(collection, fltr, position):
+    """
+    Return the ``_id`` of the document at ``position`` in the ``_id`` order of
+    the documents matching ``fltr``, or None if there is no such document.
+    """
+    documents = collection.find(fltr, {'_id': 1}).sort('_id', 1).skip(
+        position).limit(1)
+
+    for document in documents:
+        return document['_id']
+
+
+def id_range(collection, fltr, index, total):
+    """
+    Return the (lower, upper) ``_id`` boundaries of the shard ``index`` out of
+    ``total`` shards of similar size. ``lower`` is inclusive, ``upper`` is
+    exclusive, None means unbounded.
+    """
+    if total <= 1:
+        return None, None
+
+    count = collection.count_documents(fltr)
+
+    lower = None
+    if index > 0:
+        lower = id_boundary(collection, fltr, count * index // total)
+
+    upper = None
+    if index < total - 1:
+        upper = id_boundary(collection, fltr, count * (index + 1) // total)
+
+    return lower, upper
+
+
+class DocumentLoader(object):
+    """
+    Iterates over the documents of ``collection`` matching ``fltr``, in the
+    ``_id`` order, using a single batched cursor.
+
+    @param after_id: only documents with ``_id`` greater than it are loaded,
+        used to resume an interrupted run.
+    @param shard: tuple (index, total), 0 based, loads only the ``_id`` range
+        of the given shard. The ranges are computed over ``shard_filter``
+        (``fltr`` by default), that must not change while the workers run.
+    @param missing_field: loads only the documents without this field, the
+        ones not processed yet. ``ChangeLog.documents`` does not take it, as
+        a changed document must be processed again even if it already has
+        the field.
+
+    ``last_id`` keeps the ``_id`` of the last loaded document. If the server
+    drops the cursor the loading is restarted after it.
+    """
+
+    def __init__(self, collection, fltr, projection=PROJECTION,
+                 batch_size=BATCH_SIZE, after_id=None, shard=None,
+                 shard_filter=None, missing_field=None):
+        if missing_field is not None:
+            fltr = dict(fltr, **{missing_field: {'$exists': 0}})
+
+        self.collection = collection
+        self.fltr = fltr
+        self.projection = projection
+        self.batch_size = batch_size
+        self.last_id = after_id
+        self.shard = shard
+        self.shard_filter = shard_filter if shard_filter is not None else fltr
+
+    def _query(self, lower, upper):
+        id_filter = {}
+
+        if self.last_id is not None:
+            id_filter['$gt'] = self.last_id
+
+        if lower is not None and (self.last_id is None or lower > self.last_id):
+            id_filter = {'$gte': lower}
+
+        if upper is not None:
+            id_filter['$lt'] = upper
+
+        if not id_filter:
+            return self.fltr
+
+        return {'$and': [self.fltr, {'_id': id_filter}]}
+
+    def __iter__(self):
+        lower, upper = None, None
+        if self.shard is not None:
+            lower, upper = id_range(self.collection, self.shard_filter,
+                                    *self.shard)
+            logger.info('Loading shard %d/%d: _id from %s to %s',
+                        self.shard[0] + 1, self.shard[1], lower, upper)
+
+        while True:
+            cursor = self.collection.find(
+                self._query(lower, upper),
+                self.projection,
+                no_cursor_timeout=True
+            ).sort('_id', 1).batch_size(self.batch_size)
+
+            try:
+                for document in cursor:
+                    self.last_id = document['_id']
+                    yield document
+            except CursorNotFound:
+                logger.warning('Cursor lost, resuming after _id %s',
+                               self.last_id)
+                continue
+            finally:
+                cursor.close()
+
+            break
+
+
+class ChangeLog(object):
+    """
+    Documents of ``collection`` added or updated since ``since``, according
+    to the change log recorded by the DataBroker.
+
+    ``last_date`` keeps the date of the last change read, to be used as the
+    ``since`` of the next run. Changes made at ``since`` are read again, as
+    the processing is idempotent it is safer than missing some.
+    """
+
+    def __init__(self, db, collection, since=None, events=('add', 'update')):
+        self.db = db
+        self.collection = collection
+        self.since = since
+        self.events = events
+        self.last_date = since
+
+    def codes(self):
+        fltr = {
+            'collection': self.collection,
+            'event': {'$in': list(self.events)}
+        }
+
+        if self.since is not None:
+            fltr['date'] = {'$gte': self.since}
+
+        changes = self.db['historychanges_article'].find(
+            fltr, {'_id': 0, 'code': 1, 'date': 1}
+        ).sort('date', 1).batch_size(BATCH_SIZE)
+
+        codes = set()
+        for change in changes:
+            codes.add(change['code'])
+            self.last_date = change['date']
+
+        logger.info('%d documents of %s changed since %s', len(codes),
+                    self.collection, self.since)
+
+        return codes
+
+    def ids(self, shard=None):
+        """
+        Return the sorted ``_id`` of the changed documents, only the ones of
+        the given ``shard`` (index, total) if it is given.
+        """
+        ids = []
+        for chunk in chunks(sorted(self.codes()), CHUNK_SIZE):
+            documents = self.db['articles'].find(
+                {'collection': self.collection, 'code': {'$in': chunk}},
+                {'_id': 1}
+            )
+            ids.extend(i['_id'] for i in documents)
+
+        ids.sort()
+
+        if shard is not None:
+            index, total = shard
+            ids = ids[len(ids) * index // total:len(ids) * (index + 1) // total]
+
+        return ids
+
+    def documents(self, fltr, projection=PROJECTION, after_id=None, shard=None):
+        """
+        Iterates over the changed documents matching ``fltr``, in the ``_id``
+        order.
+        """
+        ids = self.ids(shard=shard)
+
+        if after_id is not None:
+            ids = [i for i in ids if i > after_id]
+
+        for chunk in chunks(ids, CHUNK_SIZE):
+            loader = DocumentLoader(
+                self.db['articles'],
+                {'$and': [fltr, {'_id': {'$in': chunk}}]},
+                projection=projection
+            )
+
+            for document in loader:
+                yield document
@@ -0,0 +1,390 @@
+# coding: utf-8
+"""
+This script exports the SciELO Network documents to one of the XML formats
+(xmlwos, xmlrsps, xmlcrossref, xmldoaj, xmlpubmed), reading them straight from
+the Articlemeta database through the DataBroker. The rendering is done by a
+pool of processes and the results are streamed into one zip (or tar) file per
+collection or per journal (ISSN).
+"""
+import os
+import io
+import sys
+import time
+import tarfile
+import zipfile
+import argparse
+import logging
+import logging.config
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from articlemeta import controller
+from articlemeta.export import Export
+
+logger = logging.getLogger(__name__)
+SENTRY_DSN = os.environ.get('SENTRY_DSN', None)
+LOGGING_LEVEL = os.environ.get('LOGGING_LEVEL', 'DEBUG')
+MONGODB_HOST = os.environ.get('MONGODB_HOST', None)
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': True,
+
+    'formatters': {
+        'console': {
+            'format': '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+            'datefmt': '%H:%M:%S',
+            },
+        },
+    'handlers': {
+        'console': {
+            'level': LOGGING_LEVEL,
+            'class': 'logging.StreamHandler',
+            'formatter': 'console'
+            }
+        },
+    'loggers': {
+        '': {
+            'handlers': ['console'],
+            'level': LOGGING_LEVEL,
+            'propagate': False,
+            },
+        'processing.exportarticles': {
+            'level': LOGGING_LEVEL,
+            'propagate': True,
+        },
+    }
+}
+
+TRANS_ACRONYM = {'scl': 'bra'}
+
+CHUNK_SIZE = 100
+
+
+def render_chunk(articles, xml_format):
+    """
+    Renders ``articles`` to ``xml_format`` with ``Export.run_many``. It runs
+    in the worker processes, where the export pipelines are built only once.
+
+    Returns a list of tuples (collection, code, xml, error), where ``xml`` is
+    None when the article could not be rendered.
+    """
+    results = []
+    rendered = Export.run_many(articles, xml_format)
+
+    for article, (xml, error) in zip(articles, rendered):
+        results.append((article['collection'], article['code'], xml,
+                        None if error is None else repr(error)))
+
+    return results
+
+
+def chunks(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+
+    if chunk:
+        yield chunk
+
+
+def render(articles, xml_format, executor=None, chunk_size=CHUNK_SIZE,
+           max_pending=4):
+    """
+    Renders ``articles`` to ``xml_format``, yielding the results of
+    ``render_chunk`` in the same order of ``articles``.
+
+    When an ``executor`` is given, the chunks are rendered by it, with at most
+    ``max_pending`` chunks in flight, so that the reading of the database never
+    gets too far ahead of the rendering.
+    """
+    if executor is None:
+        for chunk in chunks(articles, chunk_size):
+            for result in render_chunk(chunk, xml_format):
+                yield result
+        return
+
+    pending = deque()
+
+    for chunk in chunks(articles, chunk_size):
+        pending.append(executor.submit(render_chunk, chunk, xml_format))
+
+        if len(pending) >= max_pending:
+            for result in pending.popleft().result():
+                yield result
+
+    while pending:
+        for result in pending.popleft().result():
+            yield result
+
+
+class ShardWriter(object):
+    """
+    Writes the rendered documents into a zip or tar.gz file, using the same
+    layout of the dumparticles files: ``<collection>/<issn>/<pid>.xml``.
+    """
+
+    def __init__(self, file_name, archive_format='zip'):
+        self.file_name = file_name
+        self.archive_format = archive_format
+        self.total = 0
+
+        if archive_format == 'zip':
+            self._archive = zipfile.ZipFile(
+                file_name, 'w', compression=zipfile.ZIP_DEFLATED,
+                allowZip64=True)
+        else:
+            self._archive = tarfile.open(file_name, 'w:gz')
+
+    def write(self, name, content):
+        if isinstance(content, str):
+            content = content.encode('utf-8')
+
+        if self.archive_format == 'zip':
+            self._archive.writestr(name, content)
+        else:
+            info = tarfile.TarInfo(name)
+            info.size = len(content)
+            info.mtime = time.time()
+            self._archive.addfile(info, io.BytesIO(content))
+
+    def write_document(self, collection, code, xml):
+        collection = TRANS_ACRONYM.get(collection, collection)
+        self.write('{0}/{1}/{2}.xml'.format(collection, code[1:10], code), xml)
+        self.total += 1
+
+    def close(self):
+        readme = open(
+            os.path.dirname(__file__) + '/templates/dumparticle_readme.txt',
+            'r').read()
+        self.write('README.txt', '{0}\r\n* Documents updated at: {1}\r\n'.format(
+            readme, datetime.now().isoformat()))
+        self._archive.close()
+
+
+def shards(databroker, collections, issns=None, shard_by='collection'):
+    """
+    Yields the (collection, issn) pairs of each shard. ``issn`` is None when
+    the shards are made by collection.
+
+    The given ``issns`` are paired only with the collections that have the
+    journal, so that no empty shard is written for the other collections.
+    """
+    for collection in collections:
+        if shard_by == 'collection' and not issns:
+            yield collection, None
+            continue
+
+        journals = sorted(set(
+            journal['code'] for journal in databroker.iter_journals(
+                collection=collection)))
+
+        if issns:
+            journals = [issn for issn in issns if issn in journals]
+
+        for issn in journals:
+            yield collection, issn
+
+
+def shard_file_name(output_dir, xml_format, collection, issn=None,
+                    archive_format='zip'):
+    extension = 'zip' if archive_format == 'zip' else 'tar.gz'
+    name = '_'.join([i for i in [collection, issn] if i])
+
+    return os.path.join(output_dir, '%s_%s.%s' % (xml_format, name, extension))
+
+
+def run(databroker, collections, xml_format, output_dir, issns=None,
+        shard_by='collection', archive_format='zip', processes=None,
+        chunk_size=CHUNK_SIZE, from_date='1500-01-01', until_date=None,
+        body=False):
+    """
+    Exports every article of ``collections`` (optionally only of ``issns``),
+    writing one shard per collection or per journal into ``output_dir``.
+
+    Returns a dict with the total of exported and failed documents.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+
+    processes = processes or multiprocessing.cpu_count()
+
+    executor = None
+    if processes > 1:
+        executor = ProcessPoolExecutor(max_workers=processes)
+
+    stats = {'exported': 0, 'failed': 0}
+
+    try:
+        for collection, issn in shards(databroker, collections, issns=issns,
+                                       shard_by=shard_by):
+            file_name = shard_file_name(output_dir, xml_format, collection,
+                                        issn=issn, archive_format=archive_format)
+            logger.info('Creating shard: %s', file_name)
+
+            articles = databroker.iter_articles_full(
+                collection=collection,
+                issn=issn,
+                from_date=from_date,
+                until_date=until_date,
+                replace_journal_metadata=True,
+                body=body
+            )
+
+            writer = ShardWriter(file_name, archive_format=archive_format)
+            try:
+                for coll, code, xml, error in render(
+                        articles, xml_format, executor=executor,
+                        chunk_size=chunk_size, max_pending=2 * processes):
+                    if xml is None:
+                        logger.error(
+                            'Fail to export %s_%s: %s', coll, code, error)
+                        stats['failed'] += 1
+                        continue
+
+                    writer.write_document(coll, code, xml)
+                    stats['exported'] += 1
+            finally:
+                writer.close()
+
+            logger.info('Shard created: %s (%d documents)', file_name,
+                        writer.total)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    logger.info('Exported documents: %d, failures: %d', stats['exported'],
+                stats['failed'])
+
+    return stats
+
+
+def main():
+    db_dsn = os.environ.get('MONGODB_HOST', 'mongodb://localhost:27017/articlemeta')
+    try:
+        articlemeta_db = controller.get_dbconn(db_dsn)
+    except:
+        print('Fail to connect to:', db_dsn)
+        sys.exit(1)
+
+    databroker = controller.DataBroker(articlemeta_db)
+
+    parser = argparse.ArgumentParser(
+        description="Export SciELO Network documents to XML files, in parallel"
+    )
+
+    parser.add_argument(
+        '--collection',
+        '-c',
+        action='append',
+        help='Collection acronym, may be repeated. Default: all collections'
+    )
+
+    parser.add_argument(
+        '--issn',
+        '-i',
+        action='append',
+        help='Journal ISSN, may be repeated. Implies one shard per ISSN'
+    )
+
+    parser.add_argument(
+        '--xml_format',
+        '-x',
+        default='xmlwos',
+        choices=sorted(Export.XML_FORMATS),
+        help='XML output format'
+    )
+
+    parser.add_argument(
+        '--output_dir',
+        '-d',
+        default='/tmp/exportarticles',
+        help='Directory that will receive the shard files'
+    )
+
+    parser.add_argument(
+        '--shard_by',
+        '-s',
+        default='collection',
+        choices=['collection', 'issn'],
+        help='Create one file per collection or per journal'
+    )
+
+    parser.add_argument(
+        '--archive_format',
+        '-a',
+        default='zip',
+        choices=['zip', 'tar'],
+        help='Shard file format, zip or tar.gz'
+    )
+
+    parser.add_argument(
+        '--processes',
+        '-p',
+        type=int,
+        default=multiprocessing.cpu_count(),
+        help='Number of rendering processes, 1 renders in the main process'
+    )
+
+    parser.add_argument(
+        '--chunk_size',
+        type=int,
+        default=CHUNK_SIZE,
+        help='Number of documents sent to a rendering process at once'
+    )
+
+    parser.add_argument(
+        '--from_date',
+        default='1500-01-01',
+        help='Export only documents processed since this date (YYYY-MM-DD)'
+    )
+
+    parser.add_argument(
+        '--until_date',
+        default=None,
+        help='Export only documents processed until this date (YYYY-MM-DD)'
+    )
+
+    parser.add_argument(
+        '--body',
+        action='store_true',
+        help='Include the documents full text, when the format supports it'
+    )
+
+    parser.add_argument(
+        '--logging_level',
+        '-l',
+        default=LOGGING_LEVEL,
+        choices=['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'],
+        help='Logggin level'
+    )
+
+    args = parser.parse_args()
+    LOGGING['handlers']['console']['level'] = args.logging_level
+    for lg, content in LOGGING['loggers'].items():
+        content['level'] = args.logging_level
+
+    logging.config.dictConfig(LOGGING)
+
+    collections = args.collection or sorted(
+        articlemeta_db['articles'].distinct('collection'))
+
+    run(
+        databroker,
+        collections,
+        args.xml_format,
+        args.output_dir,
+        issns=args.issn,
+        shard_by=args.shard_by,
+        archive_format=args.archive_format,
+        processes=args.processes,
+        chunk_size=args.chunk_size,
+        from_date=args.from_date,
+        until_date=args.until_date,
+        body=args.body
+    )
@@ -0,0 +1,240 @@
+# coding: utf-8
+"""
+HTTP client shared by the processing scripts.
+
+It keeps one pooled keep-alive session per host, applies connect/read
+timeouts, retries the transient failures with an exponential backoff plus a
+random jitter and, optionally, waits a minimum interval between requests to
+the same host.
+
+Conditional requests are supported in two ways: ``get`` accepts the ``etag``
+and ``last_modified`` of a previous response, and a client built with a
+``cache_dir`` keeps the responses that have those validators on disk,
+revalidating them on the next request and serving the cached body when the
+server answers 304 Not Modified.
+"""
+import os
+import json
+import time
+import random
+import hashlib
+import logging
+import tempfile
+import threading
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+USER_AGENT = 'SciELO Processing ArticleMeta'
+# (connect, read) timeouts in seconds.
+TIMEOUT = (5, 30)
+RETRIES = 3
+BACKOFF_FACTOR = 0.5
+POOL_SIZE = 10
+STATUS_FORCELIST = (429, 500, 502, 503, 504)
+# Directory of the local response cache of the shared client, disabled when
+# not set.
+CACHE_DIR = os.environ.get('PROCESSING_HTTP_CACHE_DIR', None)
+
+
+class JitterRetry(Retry):
+    """
+    Retry adding a random jitter, up to the backoff time itself, so that the
+    many threads of a job do not retry at the same time.
+    """
+
+    def get_backoff_time(self):
+        backoff = super(JitterRetry, self).get_backoff_time()
+
+        if not backoff:
+            return 0
+
+        return backoff + random.uniform(0, backoff)
+
+
+class HttpClient(object):
+
+    def __init__(self, timeout=TIMEOUT, retries=RETRIES,
+                 backoff_factor=BACKOFF_FACTOR, pool_size=POOL_SIZE,
+                 min_interval=0, cache_dir=None, user_agent=USER_AGENT):
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.pool_size = pool_size
+        self.min_interval = min_interval
+        self.cache_dir = cache_dir
+        self.user_agent = user_agent
+        self._sessions = {}
+        self._last_request = {}
+        self._lock = threading.Lock()
+        self._host_locks = {}
+
+    def _new_session(self):
+        retry = JitterRetry(
+            total=self.retries,
+            backoff_factor=self.backoff_factor,
+            status_forcelist=STATUS_FORCELIST,
+            allowed_methods=frozenset(['GET', 'HEAD'])
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size,
+                              max_retries=retry)
+
+        session = requests.Session()
+        session.headers['User-Agent'] = self.user_agent
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+
+        return session
+
+    def session(self, url):
+        """
+        Return the session of the host of ``url``.
+        """
+        host = urlparse(url).netloc
+
+        with self._lock:
+            if host not in self._sessions:
+                self._sessions[host] = self._new_session()
+                self._host_locks[host] = threading.Lock()
+
+            return self._sessions[host]
+
+    def _wait(self, url):
+        if not self.min_interval:
+            return
+
+        host = urlparse(url).netloc
+
+        with self._host_locks[host]:
+            wait = self._last_request.get(host, 0) + self.min_interval - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            self._last_request[host] = time.monotonic()
+
+    def _cache_paths(self, url):
+        name = hashlib.sha1(url.encode('utf-8')).hexdigest()
+
+        return (os.path.join(self.cache_dir, name + '.json'),
+                os.path.join(self.cache_dir, name + '.body'))
+
+    def _read_cache(self, url):
+        meta_path, body_path = self._cache_paths(url)
+
+        try:
+            with open(meta_path) as fp:
+                meta = json.load(fp)
+            with open(body_path, 'rb') as fp:
+                return meta, fp.read()
+        except (IOError, OSError, ValueError):
+            return None, None
+
+    def _write_cache(self, url, response):
+        meta = {
+            'url': url,
+            'encoding': response.encoding,
+            'headers': dict(response.headers),
+        }
+        meta_path, body_path = self._cache_paths(url)
+
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            for path, mode, data in [(body_path, 'wb', response.content),
+                                     (meta_path, 'w', json.dumps(meta))]:
+                fd, tmp = tempfile.mkstemp(dir=self.cache_dir)
+                with os.fdopen(fd, mode) as fp:
+                    fp.write(data)
+                os.replace(tmp, path)
+        except (IOError, OSError):
+            logger.warning(u'Fail to write the response cache for %s', url)
+
+    @staticmethod
+    def _cached_response(url, meta, body):
+        response = requests.Response()
+        response.status_code = 200
+        response.url = url
+        response.encoding = meta.get('encoding')
+        response.headers = CaseInsensitiveDict(meta.get('headers', {}))
+        response._content = body
+        response._content_consumed = True
+        response.from_cache = True
+
+        return response
+
+    def get(self, url, headers=None, etag=None, last_modified=None,
+            timeout=None):
+        """
+        Request ``url``, returning the requests Response. Raises
+        requests.RequestException when the request fails after the retries.
+
+        @param etag, last_modified: validators of a previous response, sent as
+            If-None-Match and If-Modified-Since. The server may answer 304.
+        """
+        headers = dict(headers or {})
+
+        meta, body = None, None
+        if self.cache_dir and etag is None and last_modified is None:
+            meta, body = self._read_cache(url)
+            if meta is not None:
+                etag = meta['headers'].get('ETag')
+                last_modified = meta['headers'].get('Last-Modified')
+
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+
+        session = self.session(url)
+        self._wait(url)
+        response = session.get(url, headers=headers,
+                               timeout=timeout or self.timeout)
+        response.from_cache = False
+
+        if response.status_code == 304 and meta is not None:
+            logger.debug(u'Not modified, using the cached response: %s', url)
+            return self._cached_response(url, meta, body)
+
+        if self.cache_dir and response.status_code == 200 and (
+                response.headers.get('ETag') or
+                response.headers.get('Last-Modified')):
+            self._write_cache(url, response)
+
+        return response
+
+    def fetch(self, url, **kwargs):
+        """
+        Like ``get``, but logs the failed requests and the error responses
+        (status >= 400) returning None for them.
+        """
+        try:
+            response = self.get(url, **kwargs)
+        except requests.RequestException as exc:
+            logger.error(u'HTTP request error for: %s (%s)', url, exc)
+            return None
+
+        if response.status_code >= 400:
+            logger.error(u'HTTP error %d for: %s', response.status_code, url)
+            return None
+
+        return response
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """
+    Return the client shared by the processing scripts of the process.
+    """
+    global _client
+
+    with _client_lock:
+        if _client is None:
+            _client = HttpClient(cache_dir=CACHE_DIR)
+
+        return _client
@@ -20,6 +20,7 @@ import csv
 
 from pymongo import MongoClient
 from articlemeta import utils
+from processing.bulkwriter import BulkWriter
 
 from xylose.scielodocument import Article
 
@@ -248,7 +249,7 @@ def isis_like_json(data):
     return institutions
 
 
-def import_doc_affiliations(data, normalized_affiliations):
+def import_doc_affiliations(data, normalized_affiliations, writer=None):
 
     for key, value in data.items():
         ilj = isis_like_json(value)
@@ -267,22 +268,25 @@ def import_doc_affiliations(data, normalized_affiliations):
             from_normalized['s'] = item['normalized_affiliation_state']
         ilj.append(from_normalized)
 
-    try:
-        scielo_network_articles.update(
-            {
-                'code': code,
-                'collection': collection
-            },
-            {
-                '$set': {
-                    'article.v240': ilj,
-                    'sent_wos': 'False'
-                }
-            }
-        )
-        logger.debug(u'reacording at(%s): ', code)
-    except:
-        logger.error(u'Error recording metadata at (%s): ', code)
+    fltr = {
+        'code': code,
+        'collection': collection
+    }
+    update = {
+        '$set': {
+            'article.v240': ilj,
+            'sent_wos': 'False'
+        }
+    }
+
+    # the write errors are logged by the writer, when the batch is written.
+    if writer is not None:
+        writer.update_one(fltr, update)
+    else:
+        with BulkWriter(scielo_network_articles) as writer:
+            writer.update_one(fltr, update)
+
+    logger.debug(u'reacording at(%s): ', code)
 
 
 def check_affiliations(file_name='processing/normalized_affiliations.csv', import_data=False, encoding='utf-8'):
@@ -293,47 +297,48 @@ def check_affiliations(file_name='processing/normalized_affiliations.csv', impor
 
     line_count = 0
     doc_affiliations = {}
-    with codecs.open(file_name, 'r') as csvfile:
-        spamreader = csv.reader(csvfile, delimiter='|')
-        lines = []
-        for line in spamreader:
-            lines.append([i.decode(encoding) for i in line])
+    with BulkWriter(scielo_network_articles) as writer:
+        with codecs.open(file_name, 'r') as csvfile:
+            spamreader = csv.reader(csvfile, delimiter='|')
+            lines = []
+            for line in spamreader:
+                lines.append([i.decode(encoding) for i in line])
 
-    for line in sorted(lines):
-        line_count += 1
+        for line in sorted(lines):
+            line_count += 1
 
-        logger.debug('reading line (%s)', line_count)
-        parsed_line = parse_csv_line([str(line_count)] + line)
+            logger.debug('reading line (%s)', line_count)
+            parsed_line = parse_csv_line([str(line_count)] + line)
 
-        if not parsed_line:
-            continue
+            if not parsed_line:
+                continue
 
-        original_article = get_original_article(
-            parsed_line['pid'], parsed_line['collection']
-        )
+            original_article = get_original_article(
+                parsed_line['pid'], parsed_line['collection']
+            )
 
-        if not original_article:
-            continue
+            if not original_article:
+                continue
 
-        if not is_clean_checked(parsed_line, original_article):
-            continue
+            if not is_clean_checked(parsed_line, original_article):
+                continue
 
-        if not import_data:
-            continue
+            if not import_data:
+                continue
 
-        if not parsed_line['pid'] in doc_affiliations and len(doc_affiliations) == 1:
-            previous_article = get_original_article(
-                doc_affiliations.keys()[0], parsed_line['collection']
-            )
-            import_doc_affiliations(doc_affiliations, previous_article.normalized_affiliations)
-            doc_affiliations = {}
+            if not parsed_line['pid'] in doc_affiliations and len(doc_affiliations) == 1:
+                previous_article = get_original_article(
+                    doc_affiliations.keys()[0], parsed_line['collection']
+                )
+                import_doc_affiliations(doc_affiliations, previous_article.normalized_affiliations, writer)
+                doc_affiliations = {}
 
-        pl = doc_affiliations.setdefault(parsed_line['pid'], [])
-        pl.append(parsed_line)
+            pl = doc_affiliations.setdefault(parsed_line['pid'], [])
+            pl.append(parsed_line)
 
-    if doc_affiliations and original_article.normalized_affiliations:
-        # import the last document
-        import_doc_affiliations(doc_affiliations, original_article.normalized_affiliations)
+        if doc_affiliations and original_article.normalized_affiliations:
+            # import the last document
+            import_doc_affiliations(doc_affiliations, original_article.normalized_affiliations, writer)
 
 
 def main():
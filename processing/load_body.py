@@ -7,19 +7,28 @@ legacy databases does not have the licenses persisted for each document.
 import re
 import os
 import sys
+import html
+import codecs
 import argparse
 import logging
 import logging.config
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 from datetime import datetime, timedelta
+from urllib.parse import urlparse
 
 import chardet
-import requests
 from lxml import etree
 from io import StringIO
 from xylose.scielodocument import Article
 
 from articlemeta import controller
 from processing import escape_html_http_tags
+from processing.bulkwriter import BulkWriter
+from processing.documents import DocumentLoader, parse_shard
+from processing import checkpoints, orchestrator, httpclient
 
 
 logger = logging.getLogger(__name__)
@@ -27,21 +36,29 @@ SENTRY_DSN = os.environ.get('SENTRY_DSN', None)
 LOGGING_LEVEL = os.environ.get('LOGGING_LEVEL', 'DEBUG')
 MONGODB_HOST = os.environ.get('MONGODB_HOST', None)
 
+JOB = 'load_body'
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': True,
 
     'formatters': {
         'console': {
-            'format': '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+            'format': '%(asctime)s - %(name)s - %(levelname)s - %(collection)s - %(message)s',
             'datefmt': '%H:%M:%S',
             },
         },
+    'filters': {
+        'collection': {
+            '()': 'processing.orchestrator.CollectionFilter',
+            },
+        },
     'handlers': {
         'console': {
             'level': LOGGING_LEVEL,
             'class': 'logging.StreamHandler',
-            'formatter': 'console'
+            'formatter': 'console',
+            'filters': ['collection']
             }
         },
     'loggers': {
@@ -74,9 +91,30 @@ LOGGING = {
 FROM = datetime.now() - timedelta(days=15)
 FROM = FROM.isoformat()[:10]
 
-BODY_REGEX = re.compile(r'<div .*class="index,(?P<language>.*?)">(?P<body>.*)</div>')
+# Whitespace around each line break, the lines of the page are stripped and
+# joined with a single space.
+LINE_BREAK_REGEX = re.compile(r'[^\S\n]*\n[^\S\n]*')
+# Charset declared by the <meta> tag or the XML declaration of the page.
+CHARSET_REGEX = re.compile(
+    br'<meta[^>]+charset\s*=\s*["\']?\s*([\w.:-]+)|<\?xml[^>]+encoding\s*=\s*["\']([\w.:-]+)',
+    re.IGNORECASE)
+# Bytes of the beginning of the page where the charset declaration is looked
+# for, and fed to chardet when there is none.
+CHARSET_SNIFF_SIZE = 4096
+CHARDET_SNIFF_SIZE = 65536
+BOMS = [
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+]
 REMOVE_LINKS_REGEX = re.compile(r'\[.<a href="javascript\:void\(0\);".*?>Links</a>.\]', re.IGNORECASE)
 
+USER_AGENT = 'SciELO Processing ArticleMeta: LoadBody'
+FETCH_WORKERS = 16
+PARSE_WORKERS = multiprocessing.cpu_count()
+PER_HOST_LIMIT = 4
+BATCH_SIZE = 100
+
 
 def collections_acronym(articlemeta_db):
     collections = articlemeta_db['collections'].find({}, {'_id': 0})
@@ -94,65 +132,117 @@ def collection_info(articlemeta_db, collection):
 def load_documents_pids(articlemeta_db, pids, collection):
 
     fltr = {
-        'collection': collection
+        'collection': collection,
+        'code': {'$in': pids}
     }
 
-    for pid in pids:
-        fltr['code'] = pid
-        document = articlemeta_db['articles'].find_one(
-            fltr,
-            {'_id': 0, 'citations': 0}
-        )
+    for document in DocumentLoader(articlemeta_db['articles'], fltr):
         yield Article(document)
 
 
-def load_documents_collection(articlemeta_db, collection, all_records=False):
+def load_documents_collection(articlemeta_db, collection, all_records=False,
+                              after_id=None, shard=None, changes=None):
 
     fltr = {
         'collection': collection
     }
 
-    if not all_records:
-        fltr['body'] = {'$exists': 0}
+    if changes is not None:
+        documents = changes.documents(fltr, after_id=after_id, shard=shard)
+    else:
+        documents = DocumentLoader(
+            articlemeta_db['articles'],
+            fltr,
+            after_id=after_id,
+            shard=shard,
+            shard_filter={'collection': collection},
+            missing_field=None if all_records else 'body'
+        )
 
-    documents = articlemeta_db['articles'].find(
-        fltr,
-        {'code': 1},
-    )
+    for document in documents:
+        yield Article(document)
 
-    if 'body' in fltr:
-        del(fltr['body'])
 
-    pids = []
-    for document in documents:
-        pids.append(document['code'])
+class HostLimiter(object):
+    """
+    Keeps one bounded semaphore per host, so that no more than ``limit``
+    requests are made at the same time to the same website.
+    """
 
-    for pid in pids:
-        fltr['code'] = pid
-        document = articlemeta_db['articles'].find_one(
-            fltr,
-            {'_id': 0, 'citations': 0}
-        )
-        yield Article(document)
+    def __init__(self, limit=PER_HOST_LIMIT):
+        self.limit = limit
+        self._semaphores = {}
+        self._lock = threading.Lock()
 
-    documents.close()
+    def __call__(self, url):
+        host = urlparse(url).netloc
 
+        with self._lock:
+            if host not in self._semaphores:
+                self._semaphores[host] = threading.BoundedSemaphore(self.limit)
 
-def do_request(url, json=True):
+            return self._semaphores[host]
+
+
+def do_request(url, json=True, client=None):
 
     headers = {
-        'User-Agent': 'SciELO Processing ArticleMeta: LoadBody'
+        'User-Agent': USER_AGENT
     }
 
-    try:
-        document = requests.get(url, headers=headers)
-    except:
-        logger.error(u'HTTP request error for: %s', url)
+    document = (client or httpclient.get_client()).fetch(url, headers=headers)
+
+    if document is None:
+        return None
+
+    if json:
+        return document.json()
     else:
-        if json:
-            return document.json()
-        else:
-            return document.content
+        return document.content
+
+
+def detect_encoding(data):
+    """
+    Return the encoding of the page ``data`` (bytes): the one of its byte
+    order mark or the declared one. Pages without a declaration are checked
+    as UTF-8 and then given to chardet, only the beginning of them.
+    """
+    for bom, encoding in BOMS:
+        if data.startswith(bom):
+            return encoding
+
+    declared = CHARSET_REGEX.search(data, 0, CHARSET_SNIFF_SIZE)
+    if declared:
+        encoding = (declared.group(1) or declared.group(2)).decode('ascii')
+        try:
+            return codecs.lookup(encoding).name
+        except LookupError:
+            logger.debug('Unknown declared charset: %s', encoding)
+
+    try:
+        data.decode('utf-8')
+        return 'utf-8'
+    except UnicodeDecodeError:
+        pass
+
+    encoding = chardet.detect(data[:CHARDET_SNIFF_SIZE])['encoding']
+
+    if encoding in (None, 'ascii'):
+        # the non ascii characters are beyond the sniffed prefix.
+        return 'windows-1252'
+
+    return encoding
+
+
+def inner_html(element):
+    """
+    Serialize the content of ``element``, without its own tag and tail.
+    """
+    content = [html.escape(element.text, quote=False)] if element.text else []
+    content.extend(
+        etree.tostring(child, encoding='unicode') for child in element)
+
+    return ''.join(content)
 
 
 def scrap_body(data, language):
@@ -163,17 +253,17 @@ def scrap_body(data, language):
     :param data: bytes, encoded by source
     :param language: str [en, es, pt, ...]
 
-    Return the unicode of the body encoded by etree.tostring line 178
+    Return the unicode of the content of the body div of the given language
     '''
 
-    encoding = chardet.detect(data)['encoding']
+    encoding = detect_encoding(data)
 
     #  IMPORTANTE: Nesse trecho estamos decodificando para o encoding descoberto
-    #  pelo chardet e substituindo os caracteres que não foram encontrados no
-    #  encoding por código unicode.
+    #  e substituindo os caracteres que não foram encontrados no encoding por
+    #  código unicode.
     data = data.decode(encoding, 'replace')
 
-    data = ' '.join([i.strip() for i in data.split('\n')])
+    data = LINE_BREAK_REGEX.sub(' ', data.strip())
     data = escape_html_http_tags(data)
 
     parser = etree.HTMLParser(remove_blank_text=True)
@@ -193,104 +283,243 @@ def scrap_body(data, language):
     if lic is not None:
         etree_body.remove(lic)
 
-    parsed_body = etree.tostring(etree_body, encoding='unicode', pretty_print=False).rstrip('\r\n')
+    body = inner_html(etree_body).strip()
 
-    if not parsed_body:
-        logger.debug('Body not found')
-        return None
+    # Removing Reference links
+
+    body = REMOVE_LINKS_REGEX.sub(' ', body)
 
-    result = BODY_REGEX.search(parsed_body)
+    return body
 
-    if not result:
-        logger.debug('Body not found')
+
+def fetch_body(url, language, client, limiter, parser=None):
+    """
+    Download ``url`` and scrap the body of the given ``language``. It runs in
+    the fetching threads, the scraping is sent to the ``parser`` process pool
+    when one is given.
+    """
+    with limiter(url):
+        data = do_request(url, json=False, client=client)
+
+    if data is None:
         return None
 
-    body = result.groupdict().get('body', None).strip()
+    if parser is None:
+        return scrap_body(data, language)
 
-    # Removing Reference links
+    return parser.submit(scrap_body, data, language).result()
 
-    body = REMOVE_LINKS_REGEX.sub(' ', body)
 
-    return body
+def html_fulltexts(document, collection):
+
+    fulltexts = document.fulltexts()
+    if not fulltexts:
+        logger.debug('Fulltexts not availiable for %s, %s', collection, document.publisher_id)
+        return None
 
+    html = fulltexts.get('html', None)
 
-def add_bodies(articlemeta_db, documents, collection):
+    if not html:
+        logger.debug('HTML Fulltexts not availiable for %s, %s', collection, document.publisher_id)
+        return None
 
-    for document in documents:
+    return html
 
-        fulltexts = document.fulltexts()
-        if not fulltexts:
-            logger.debug('Fulltexts not availiable for %s, %s', collection, document.publisher_id)
-            continue
 
-        html_fulltexts = fulltexts.get('html', None)
+def body_update(document, futures, collection):
+    """
+    Wait for the scraping of every language of ``document`` and return the
+    fields to be updated, or None if some of them has failed.
+    """
+    bodies = {}
+    for language, future in futures.items():
+
+        try:
+            body = future.result()
+        except Exception as exc:
+            logger.error('Fail to scrap: %s, %s, %s', collection, document.publisher_id, language)
+            logger.exception(exc)
+            continue
 
-        if not html_fulltexts:
-            logger.debug('HTML Fulltexts not availiable for %s, %s', collection, document.publisher_id)
+        if not body:
+            logger.error('No body defined for: %s, %s, %s', collection, document.publisher_id, language)
             continue
 
-        bodies = {}
-        for language, url in html_fulltexts.items():
+        bodies[language] = body
 
-            try:
-                body = scrap_body(do_request(url, json=False), language)
-            except Exception as exc:
-                logger.error('Fail to scrap: %s, %s, %s', collection, document.publisher_id, language)
-                logger.exception(exc)
-                continue
+    if len(bodies) < len(futures):
+        logger.error('Fail to scrap some of the documents for: %s, %s', collection, document.publisher_id)
+        return None
 
-            if not body:
-                logger.error('No body defined for: %s, %s, %s', collection, document.publisher_id, language)
-                continue
+    if len(bodies) == 0:
+        logger.error('No bodies found for: %s, %s', collection, document.publisher_id)
+        return None
 
-            bodies[language] = body
+    logger.debug('Bodies collected for: %s, %s', collection, document.publisher_id)
 
-        if len(bodies) < len(html_fulltexts):
-            logger.error('Fail to scrap some of the documents for: %s, %s', collection, document.publisher_id)
-            continue
+    return {'body': bodies}
 
-        if len(bodies) == 0:
-            logger.error('No bodies found for: %s, %s', collection, document.publisher_id)
-            continue
 
-        articlemeta_db['articles'].update(
-            {'code': document.publisher_id, 'collection': document.collection_acronym},
-            {'$set': {'body': bodies}}
-        )
+def parse_pool(parse_workers=PARSE_WORKERS):
+    """
+    The pool of ``parse_workers`` processes scraping the bodies, or None to
+    scrap in the fetching threads when ``parse_workers`` is 1.
 
-        logger.debug('Bodies collected for: %s, %s', collection, document.publisher_id)
+    The processes are spawned, not forked: the pool is used from the fetching
+    threads, and a fork of a multithreaded process may inherit locks (of
+    logging, requests or pymongo) held by other threads.
+    """
+    if parse_workers <= 1:
+        return None
+
+    return ProcessPoolExecutor(
+        max_workers=parse_workers,
+        mp_context=multiprocessing.get_context('spawn'))
 
 
-def run(articlemeta_db, collections, pids=None, all_records=False):
+def add_bodies(articlemeta_db, documents, collection,
+               fetch_workers=FETCH_WORKERS, parser=None,
+               per_host=PER_HOST_LIMIT, batch_size=BATCH_SIZE, client=None,
+               checkpoint=None):
+    """
+    Scrap the bodies of ``documents`` and write them to the Articlemeta.
 
-    if not isinstance(collections, list):
-        logger.error('Collections must be a list of collection acronym')
-        exit()
+    The pages are downloaded by ``fetch_workers`` threads sharing the pooled
+    HTTP ``client``, with at most ``per_host`` requests to the same host at
+    once. The scraping runs in the ``parser`` process pool (see
+    ``parse_pool``), shared by the collections, or in the fetching threads
+    when it is None, and the bodies are written in batches of ``batch_size``.
 
-    if collections and not pids:
+    The ``checkpoint``, if given, is advanced in the order of ``documents``, as
+    their scraping is done.
 
-        for collection in collections:
+    Returns the number of updated documents.
+    """
+    client = client or httpclient.get_client()
+    limiter = HostLimiter(per_host)
+    fetcher = ThreadPoolExecutor(max_workers=fetch_workers)
 
-            coll_info = collection_info(articlemeta_db, collection)
+    # documents being scraped, bounded so that the reading of the database
+    # never gets too far ahead of the downloads.
+    pending = deque()
+    max_pending = 2 * fetch_workers
+    writer = BulkWriter(articlemeta_db['articles'], batch_size=batch_size)
+    if checkpoint is not None:
+        checkpoint.writer = writer
 
-            logger.info(u'Loading body for %s', coll_info['domain'])
-            logger.info(u'Using mode all_records %s', str(all_records))
+    def collect():
+        document, futures = pending.popleft()
+
+        # documents without html fulltexts are queued only to keep the
+        # checkpoint in order.
+        if futures:
+            update = body_update(document, futures, collection)
+            if update is not None:
+                writer.update_one(
+                    {'code': document.publisher_id, 'collection': document.collection_acronym},
+                    {'$set': update}
+                )
+            elif checkpoint is not None:
+                checkpoint.fail(document.publisher_id)
+
+        if checkpoint is not None:
+            checkpoint.advance(document.data['_id'])
+
+    with writer:
+        try:
+            for document in documents:
+
+                html = html_fulltexts(document, collection)
+                if not html and checkpoint is None:
+                    continue
 
-            documents = load_documents_collection(articlemeta_db, collection, all_records)
+                futures = {
+                    language: fetcher.submit(
+                        fetch_body, url, language, client, limiter, parser)
+                    for language, url in (html or {}).items()
+                }
+                pending.append((document, futures))
 
-            add_bodies(articlemeta_db, documents, collection)
+                if len(pending) >= max_pending:
+                    collect()
 
-    if pids and len(collections) == 1:
+            while pending:
+                collect()
+        finally:
+            fetcher.shutdown()
 
-        collection = collections[0]
+    if checkpoint is not None:
+        checkpoint.finish()
 
-        coll_info = collection_info(articlemeta_db, collection)
+    return writer.stats['modified']
 
-        logger.info(u'Loading body for %s', coll_info['domain'])
 
-        documents = load_documents_pids(articlemeta_db, pids, collection)
+def run_collection(articlemeta_db, collection, all_records=False, shard=None,
+                   resume=False, since_checkpoint=False, incremental=False,
+                   **kwargs):
+
+    coll_info = collection_info(articlemeta_db, collection)
+
+    logger.info(u'Loading body for %s', coll_info['domain'])
+    logger.info(u'Using mode all_records %s', str(all_records))
+
+    checkpoint = checkpoints.CheckpointStore(articlemeta_db).start(
+        JOB, collection, shard=shard, resume=resume,
+        since_checkpoint=since_checkpoint, incremental=incremental)
+
+    documents = load_documents_collection(
+        articlemeta_db, collection, all_records,
+        after_id=checkpoint.after_id, shard=shard,
+        changes=checkpoint.changes)
+
+    add_bodies(articlemeta_db, documents, collection,
+               checkpoint=checkpoint, **kwargs)
+
+    return checkpoint.stats
+
+
+def run(articlemeta_db, collections, pids=None, all_records=False, shard=None,
+        resume=False, since_checkpoint=False, incremental=False, workers=1,
+        per_domain=orchestrator.PER_DOMAIN, parse_workers=PARSE_WORKERS,
+        **kwargs):
+
+    if not isinstance(collections, list):
+        raise ValueError('Collections must be a list of collection acronym')
+
+    # a single pool of processes for all the collections processed at once.
+    parser = parse_pool(parse_workers)
+    kwargs['parser'] = parser
+
+    try:
+        if collections and not pids:
+
+            return orchestrator.run(
+                JOB,
+                collections,
+                lambda collection: run_collection(
+                    articlemeta_db, collection, all_records=all_records,
+                    shard=shard, resume=resume,
+                    since_checkpoint=since_checkpoint,
+                    incremental=incremental, **kwargs),
+                domain=lambda collection: collection_info(articlemeta_db, collection)['domain'],
+                workers=workers,
+                per_domain=per_domain
+            )
 
-        add_bodies(articlemeta_db, documents, collection)
+        if pids and len(collections) == 1:
+
+            collection = collections[0]
+
+            coll_info = collection_info(articlemeta_db, collection)
+
+            logger.info(u'Loading body for %s', coll_info['domain'])
+
+            documents = load_documents_pids(articlemeta_db, pids, collection)
+
+            add_bodies(articlemeta_db, documents, collection, **kwargs)
+    finally:
+        if parser is not None:
+            parser.shutdown()
 
 
 def main():
@@ -311,14 +540,14 @@ def main():
         '--collection',
         '-c',
         choices=_collections,
-        help='Collection acronym'
+        help='Collection acronym, all the collections if it is not given'
     )
 
     parser.add_argument(
         '--pids',
         '-p',
         nargs='*',
-        help="List of pids. Separate by space Ex.: 'python load_body.py -p 'S0102-05362006000100018 S0102-05362006000100015'"
+        help="List of pids of the --collection. Separate by space Ex.: 'python load_body.py -p 'S0102-05362006000100018 S0102-05362006000100015'"
     )
 
     parser.add_argument(
@@ -328,12 +557,46 @@ def main():
         help='Apply processing to all records or just records without the body parameter'
     )
 
+    parser.add_argument(
+        '--fetch_workers',
+        type=int,
+        default=FETCH_WORKERS,
+        help='Number of threads downloading the documents'
+    )
+
+    parser.add_argument(
+        '--parse_workers',
+        type=int,
+        default=PARSE_WORKERS,
+        help='Number of processes scraping the documents, 1 scraps in the downloading threads'
+    )
+
+    parser.add_argument(
+        '--per_host',
+        type=int,
+        default=PER_HOST_LIMIT,
+        help='Maximum number of simultaneous requests to the same host'
+    )
+
+    parser.add_argument(
+        '--batch_size',
+        type=int,
+        default=BATCH_SIZE,
+        help='Number of documents written to the database at once'
+    )
+
     parser.add_argument(
         '--logging_file',
         '-o',
         help='Full path to the log file'
     )
 
+    parser.add_argument(
+        '--shard',
+        type=parse_shard,
+        help='Process only a part of the documents, given as INDEX/TOTAL. Ex: 1/4'
+    )
+
     parser.add_argument(
         '--logging_level',
         '-l',
@@ -342,6 +605,9 @@ def main():
         help='Logggin level'
     )
 
+    checkpoints.add_arguments(parser)
+    orchestrator.add_arguments(parser)
+
     args = parser.parse_args()
     LOGGING['handlers']['console']['level'] = args.logging_level
     for lg, content in LOGGING['loggers'].items():
@@ -349,16 +615,27 @@ def main():
 
     logging.config.dictConfig(LOGGING)
 
-    if not args.collection:
-        logger.info("Parameter collection -c is mandatory")
+    if args.pids and not args.collection:
+        logger.info("Parameter collection -c is mandatory with --pids")
         sys.exit(1)
 
+    options = {
+        'fetch_workers': args.fetch_workers,
+        'parse_workers': args.parse_workers,
+        'per_host': args.per_host,
+        'batch_size': args.batch_size
+    }
+
     if args.pids:
         logger.info("Process PIDs from collection: %s", args.collection)
-        run(articlemeta_db, collections=[args.collection], pids=args.pids)
+        run(articlemeta_db, collections=[args.collection], pids=args.pids, **options)
     else:
         collections = [args.collection] if args.collection else _collections
-        run(articlemeta_db, collections=collections, all_records=args.all_records)
+        run(articlemeta_db, collections=collections, all_records=args.all_records,
+            shard=args.shard, resume=args.resume,
+            since_checkpoint=args.since_checkpoint,
+            incremental=args.incremental, workers=args.workers,
+            per_domain=args.per_domain, **options)
 
 
 if __name__ == '__main__':
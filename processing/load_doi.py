@@ -14,11 +14,13 @@ from datetime import datetime, timedelta
 from lxml import etree
 from io import BytesIO
 
-import requests
 from xylose.scielodocument import Article
 from crossref.restful import Journals
 
 from articlemeta import controller
+from processing.bulkwriter import BulkWriter
+from processing.documents import DocumentLoader, parse_shard
+from processing import checkpoints, orchestrator, httpclient
 
 logger = logging.getLogger(__name__)
 SENTRY_DSN = os.environ.get('SENTRY_DSN', None)
@@ -27,21 +29,29 @@ MONGODB_HOST = os.environ.get('MONGODB_HOST', None)
 
 DOI_REGEX = re.compile(r'[0-9][0-9]\.[0-9].*/.*\S')
 
+JOB = 'load_doi'
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': True,
 
     'formatters': {
         'console': {
-            'format': '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+            'format': '%(asctime)s - %(name)s - %(levelname)s - %(collection)s - %(message)s',
             'datefmt': '%H:%M:%S',
             },
         },
+    'filters': {
+        'collection': {
+            '()': 'processing.orchestrator.CollectionFilter',
+            },
+        },
     'handlers': {
         'console': {
             'level': LOGGING_LEVEL,
             'class': 'logging.StreamHandler',
-            'formatter': 'console'
+            'formatter': 'console',
+            'filters': ['collection']
             }
         },
     'loggers': {
@@ -88,26 +98,28 @@ def collection_info(articlemeta_db, collection):
     return info
 
 
-def load_documents(articlemeta_db, collection, all_records=False):
+def load_documents(articlemeta_db, collection, all_records=False, after_id=None,
+                   shard=None, changes=None):
 
     fltr = {
         'collection': collection
     }
 
-    if all_records is False:
-        fltr['doi'] = {'$exists': 0}
-
-    documents = articlemeta_db['articles'].find(
-        fltr,
-        {'_id': 0, 'citations': 0},
-        no_cursor_timeout=True
-    )
+    if changes is not None:
+        documents = changes.documents(fltr, after_id=after_id, shard=shard)
+    else:
+        documents = DocumentLoader(
+            articlemeta_db['articles'],
+            fltr,
+            after_id=after_id,
+            shard=shard,
+            shard_filter={'collection': collection},
+            missing_field=None if all_records else 'doi'
+        )
 
     for document in documents:
         yield Article(document)
 
-    documents.close()
-
 
 def do_request(url, json=True):
 
@@ -115,15 +127,15 @@ def do_request(url, json=True):
         'User-Agent': 'SciELO Processing ArticleMeta: LoadDoi'
     }
 
-    try:
-        document = requests.get(url, headers=headers)
-    except:
-        logger.error(u'HTTP request error for: %s', url)
+    document = httpclient.get_client().fetch(url, headers=headers)
+
+    if document is None:
+        return None
+
+    if json:
+        return document.json()
     else:
-        if json:
-            return document.json()
-        else:
-            return document.text
+        return document.text
 
 
 def scrap_doi(data):
@@ -164,20 +176,26 @@ def query_to_crossref(document):
     return result.get('DOI', None)
 
 
-def run(articlemeta_db, collections, all_records=False, scrap_scielo=False,
-        query_crossref=False):
+def run_collection(articlemeta_db, collection, all_records=False,
+                   scrap_scielo=False, query_crossref=False, shard=None,
+                   resume=False, since_checkpoint=False, incremental=False):
 
-    if not isinstance(collections, list):
-        logger.error('Collections must be a list o collection acronym')
-        exit()
+    coll_info = collection_info(articlemeta_db, collection)
 
-    for collection in collections:
-        coll_info = collection_info(articlemeta_db, collection)
+    logger.info(u'Loading DOI for %s', coll_info['domain'])
+    logger.info(u'Using mode all_records %s', str(all_records))
 
-        logger.info(u'Loading DOI for %s', coll_info['domain'])
-        logger.info(u'Using mode all_records %s', str(all_records))
+    with BulkWriter(articlemeta_db['articles']) as writer:
+        checkpoint = checkpoints.CheckpointStore(articlemeta_db).start(
+            JOB, collection, shard=shard, resume=resume,
+            since_checkpoint=since_checkpoint, incremental=incremental,
+            writer=writer)
 
-        for document in load_documents(articlemeta_db, collection, all_records=all_records):
+        documents = load_documents(articlemeta_db, collection, all_records=all_records,
+                                   after_id=checkpoint.after_id, shard=shard,
+                                   changes=checkpoint.changes)
+
+        for document in checkpoint.track(documents):
 
             doi = None
 
@@ -191,6 +209,7 @@ def run(articlemeta_db, collections, all_records=False, scrap_scielo=False,
                     doi = scrap_doi(data)
                 except:
                     logger.error('Fail to scrap: %s', document.publisher_id)
+                    checkpoint.fail(document.publisher_id)
 
             if query_crossref is True and doi is None:
                 doi = query_to_crossref(document)
@@ -199,13 +218,40 @@ def run(articlemeta_db, collections, all_records=False, scrap_scielo=False,
                 logger.debug('No DOI defined for: %s', document.publisher_id)
                 continue
 
-            articlemeta_db['articles'].update(
+            # mesma normalização de ArticleMeta.check, que é a forma utilizada
+            # na consulta por DOI.
+            writer.update_one(
                 {'code': document.publisher_id, 'collection': document.collection_acronym},
-                {'$set': {'doi': doi}}
+                {'$set': {'doi': doi.upper()}}
             )
 
             logger.debug('DOI Found %s: %s', document.publisher_id, doi)
 
+    checkpoint.finish()
+
+    return checkpoint.stats
+
+
+def run(articlemeta_db, collections, all_records=False, scrap_scielo=False,
+        query_crossref=False, shard=None, resume=False, since_checkpoint=False,
+        incremental=False, workers=1, per_domain=orchestrator.PER_DOMAIN):
+
+    if not isinstance(collections, list):
+        raise ValueError('Collections must be a list o collection acronym')
+
+    return orchestrator.run(
+        JOB,
+        collections,
+        lambda collection: run_collection(
+            articlemeta_db, collection, all_records=all_records,
+            scrap_scielo=scrap_scielo, query_crossref=query_crossref,
+            shard=shard, resume=resume, since_checkpoint=since_checkpoint,
+            incremental=incremental),
+        domain=lambda collection: collection_info(articlemeta_db, collection)['domain'],
+        workers=workers,
+        per_domain=per_domain
+    )
+
 
 def main():
     db_dsn = os.environ.get('MONGODB_HOST', 'mongodb://localhost:27017/articlemeta')
@@ -249,6 +295,12 @@ def main():
         help='Try to query to crossref API for the DOI number'
     )
 
+    parser.add_argument(
+        '--shard',
+        type=parse_shard,
+        help='Process only a part of the documents, given as INDEX/TOTAL. Ex: 1/4'
+    )
+
     parser.add_argument(
         '--logging_level',
         '-l',
@@ -257,6 +309,9 @@ def main():
         help='Logggin level'
     )
 
+    checkpoints.add_arguments(parser)
+    orchestrator.add_arguments(parser)
+
     args = parser.parse_args()
     LOGGING['handlers']['console']['level'] = args.logging_level
     for lg, content in LOGGING['loggers'].items():
@@ -265,4 +320,7 @@ def main():
     logging.config.dictConfig(LOGGING)
 
     collections = [args.collection] if args.collection else _collections
-    run(articlemeta_db, collections, args.all_records, args.scrap_scielo, args.query_crossref)
+    run(articlemeta_db, collections, args.all_records, args.scrap_scielo,
+        args.query_crossref, shard=args.shard, resume=args.resume,
+        since_checkpoint=args.since_checkpoint, incremental=args.incremental,
+        workers=args.workers, per_domain=args.per_domain)
@@ -14,34 +14,48 @@ XML: http://www.scielo.br/static_xml_catalog.txt
 import re
 import os
 import sys
+import json
+import stat
+import hashlib
+import tempfile
 import argparse
 import logging
 import logging.config
 from datetime import datetime, timedelta
 
-import requests
 from articlemeta import controller
+from processing.bulkwriter import BulkWriter
+from processing.documents import DocumentLoader, parse_shard
+from processing import checkpoints, orchestrator, httpclient
 from xylose.scielodocument import Article
 
 logger = logging.getLogger(__name__)
 SENTRY_DSN = os.environ.get('SENTRY_DSN', None)
 LOGGING_LEVEL = os.environ.get('LOGGING_LEVEL', 'DEBUG')
 
+JOB = 'load_languages'
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': True,
 
     'formatters': {
         'console': {
-            'format': '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+            'format': '%(asctime)s - %(name)s - %(levelname)s - %(collection)s - %(message)s',
             'datefmt': '%H:%M:%S',
             },
         },
+    'filters': {
+        'collection': {
+            '()': 'processing.orchestrator.CollectionFilter',
+            },
+        },
     'handlers': {
         'console': {
             'level': LOGGING_LEVEL,
             'class': 'logging.StreamHandler',
-            'formatter': 'console'
+            'formatter': 'console',
+            'filters': ['collection']
             }
         },
     'loggers': {
@@ -73,6 +87,16 @@ LOGGING = {
 FROM = datetime.now() - timedelta(days=15)
 FROM = FROM.isoformat()[:10]
 
+# The cache is kept in a directory of the user running the processing, the
+# catalogs read from a directory that others may write would be trusted.
+STATIC_CATALOG_CACHE_DIR = os.environ.get(
+    'STATIC_CATALOG_CACHE_DIR',
+    os.path.join(
+        os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'),
+        'articlemeta', 'static_catalog'))
+CATALOG_TYPES = ('pdf', 'html', 'xml')
+EMPTY = frozenset()
+
 FILE_REGEX = re.compile(r'serial.*.htm|.*.xml|.*.pdf')
 data_struct_regex = re.compile(r'^fulltexts\.(pdf|html)\.[a-z][a-z]$')
 
@@ -131,58 +155,189 @@ def do_request(url, json=True):
         'User-Agent': 'SciELO Processing ArticleMeta: LoadLanguage'
     }
 
-    try:
-        document = requests.get(url, headers=headers)
-    except:
-        logger.error(u'HTTP request error for: %s', url)
+    document = httpclient.get_client().fetch(url, headers=headers)
+
+    if document is None:
+        return None
+
+    if json:
+        return document.json()
     else:
-        if json:
-            return document.json()
-        else:
-            return document
+        return document
 
 
-def load_documents(collection, articlemeta_db, all_records=False):
+def parse_catalog(lines):
     """
-    Carrega dos documentos da base de dados mongodb do AM.
+    Parse the lines of a static catalog file, as /acron/issue/file.ext, to
+    a dictionary {acron: {issue: frozenset([file names without extension])}}.
+    The acron and issue keys are interned, as they repeat for every file.
     """
-    fltr = {
-        'collection': collection
+    catalog = {}
+
+    for line in lines:
+        splitedline = line.lower().split('/')[1:]
+        if not len(splitedline) == 3:
+            continue
+        acron, issue, file_name = splitedline
+        catalog.setdefault(sys.intern(acron), {}).setdefault(
+            sys.intern(issue), set()).add(file_name.replace('.html', '.htm')[:-4])
+
+    return {
+        acron: {issue: frozenset(files) for issue, files in issues.items()}
+        for acron, issues in catalog.items()
     }
 
-    if all_records is False:
-        fltr['fulltexts'] = {'$exists': 0}
 
-    documents = articlemeta_db['articles'].find(
-        fltr,
-        {'code': 1}, no_cursor_timeout=True
-    )
+def _catalog_cache_path(url, cache_dir):
+    name = hashlib.sha1(url.encode('utf-8')).hexdigest()
 
-    pids = []
+    return os.path.join(cache_dir, name + '.json')
 
-    for document in documents:
-        pids.append(document['code'])
 
-    if 'fulltexts' in fltr:
-        del(fltr['fulltexts'])
+def _private_cache_dir(cache_dir):
+    """
+    Create ``cache_dir`` readable only by the current user, if it does not
+    exist. Return False if it is not a directory of the current user or
+    others may write to it.
+    """
+    try:
+        os.makedirs(cache_dir, mode=0o700, exist_ok=True)
+        info = os.lstat(cache_dir)
+    except (IOError, OSError):
+        return False
+
+    if not stat.S_ISDIR(info.st_mode) or info.st_mode & 0o022:
+        return False
+
+    if hasattr(os, 'getuid') and info.st_uid != os.getuid():
+        return False
+
+    return True
+
+
+def _read_catalog_cache(url, cache_dir):
+    """
+    Return the validators (etag, last_modified) and the catalog cached for
+    ``url``, or (None, None).
+    """
+    if not _private_cache_dir(cache_dir):
+        logger.warning(u'Not using the catalog cache %s, it is not a private '
+                       u'directory', cache_dir)
+        return None, None
+
+    try:
+        with open(_catalog_cache_path(url, cache_dir)) as fp:
+            cached = json.load(fp)
+
+        catalog = {
+            sys.intern(acron): {
+                sys.intern(issue): frozenset(files)
+                for issue, files in issues.items()
+            }
+            for acron, issues in cached.pop('catalog').items()
+        }
+    except (IOError, OSError, ValueError, KeyError, AttributeError):
+        return None, None
+
+    return cached, catalog
+
+
+def _write_catalog_cache(url, cache_dir, meta, catalog):
+    if not _private_cache_dir(cache_dir):
+        return
+
+    cached = dict(meta, catalog={
+        acron: {issue: sorted(files) for issue, files in issues.items()}
+        for acron, issues in catalog.items()
+    })
+
+    try:
+        fd, tmp = tempfile.mkstemp(dir=cache_dir)
+        with os.fdopen(fd, 'w') as fp:
+            json.dump(cached, fp)
+        os.replace(tmp, _catalog_cache_path(url, cache_dir))
+    except (IOError, OSError):
+        logger.warning(u'Fail to write the catalog cache for %s', url)
+
+
+def load_catalog_file(url, cache_dir=None):
+    """
+    Return the parsed (see parse_catalog) static catalog file of ``url``.
+
+    When a ``cache_dir`` is given, the parsed catalog is kept in it with the
+    ETag and Last-Modified headers of the response, and it is requested again
+    conditionally, so an unchanged catalog is neither downloaded nor parsed.
+    """
+    meta, catalog = None, None
+    if cache_dir:
+        meta, catalog = _read_catalog_cache(url, cache_dir)
+
+    headers = {
+        'User-Agent': 'SciELO Processing ArticleMeta: LoadLanguage'
+    }
+
+    validators = {}
+    if catalog is not None:
+        validators = {
+            'etag': meta.get('etag'),
+            'last_modified': meta.get('last_modified')
+        }
+
+    response = httpclient.get_client().get(url, headers=headers, **validators)
+
+    if response.status_code == 304 and catalog is not None:
+        logger.info(u'Catalog not modified, using the cached one: %s', url)
+        return catalog
+
+    catalog = parse_catalog(response.iter_lines(decode_unicode='utf-8'))
+
+    if cache_dir and response.status_code == 200:
+        meta = {
+            'url': url,
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+        }
+        if meta['etag'] or meta['last_modified']:
+            _write_catalog_cache(url, cache_dir, meta, catalog)
+
+    return catalog
 
-    for pid in pids:
 
-        fltr['code'] = pid
-        document = articlemeta_db['articles'].find_one(
+def load_documents(collection, articlemeta_db, all_records=False, after_id=None,
+                   shard=None, changes=None):
+    """
+    Carrega dos documentos da base de dados mongodb do AM.
+    """
+    fltr = {
+        'collection': collection
+    }
+
+    if changes is not None:
+        documents = changes.documents(fltr, after_id=after_id, shard=shard)
+    else:
+        documents = DocumentLoader(
+            articlemeta_db['articles'],
             fltr,
-            {'_id': 0, 'citations': 0}
+            after_id=after_id,
+            shard=shard,
+            shard_filter={'collection': collection},
+            missing_field=None if all_records else 'fulltexts'
         )
 
+    for document in documents:
         yield Article(document)
 
-    documents.close()
-
 
 class StaticCatalog(object):
 
-    def __init__(self, collection):
+    # Directory of the on-disk cache of the catalogs, a false value disables
+    # the cache.
+    cache_dir = STATIC_CATALOG_CACHE_DIR
+
+    def __init__(self, collection, cache_dir=None):
         self.catalog = {}
+        if cache_dir is not None:
+            self.cache_dir = cache_dir
         self._load_static_catalog(collection, 'pdf')
         self._load_static_catalog(collection, 'html')
         self._load_static_catalog(collection, 'xml')
@@ -192,27 +347,15 @@ class StaticCatalog(object):
         source: www.scielo.br
         type: in ['pdf', 'html', 'xml']
 
-        Download the static files text lists from the selected SciELO Domain.
-        Parse the txt file to produce a dictionary with the following structure:
+        Download the static files text lists from the selected SciELO Domain
+        (see load_catalog_file) and merge it to the catalog, with the following
+        structure:
         {
             'jbco': {
                 'v6n3': {
-                    'pdf': [
-                        '0001',
-                        '0002',
-                        '0003',
-                        '0004',
-                        'en_0004',
-                        ...
-                    ],
-                    'html': [
-                        '0001',
-                        '0002',
-                        '0003',
-                        '0004',
-                        'en_0004',
-                        ...
-                    ]
+                    'pdf': frozenset(['0001', '0002', 'en_0004', ...]),
+                    'html': frozenset(['0001', '0002', 'en_0004', ...]),
+                    'xml': frozenset()
                 }
             },
             ...
@@ -225,15 +368,10 @@ class StaticCatalog(object):
 
         url = '/'.join(['http:/', source, filename])
 
-        content = do_request(url, json=False).iter_lines(decode_unicode='utf-8')
-
-        for line in sorted([i for i in content]):
-            splitedline = line.lower().split('/')[1:]
-            if not len(splitedline) == 3:
-                continue
-            self.catalog.setdefault(splitedline[0], {})
-            self.catalog[splitedline[0]].setdefault(splitedline[1], {'pdf': [], 'html': [], 'xml': []})
-            self.catalog[splitedline[0]][splitedline[1]][tipe].append(splitedline[2].replace('.html', '.htm')[:-4])
+        for acron, issues in load_catalog_file(url, self.cache_dir).items():
+            for issue, files in issues.items():
+                self.catalog.setdefault(acron, {}).setdefault(
+                    issue, dict.fromkeys(CATALOG_TYPES, EMPTY))[tipe] = files
 
     def _file_id(self, file_path):
         return get_acron_issueid_fname_without_extension(file_path)
@@ -320,17 +458,19 @@ class StaticCatalog(object):
             logger.info(u'Journal without publication languages defined %s', file_id[0])
             return None
 
+        original_language = document.original_language()
+
         data = {'fulltexts.pdf': set(), 'fulltexts.html': set()}
-        data['fulltexts.html'].add(document.original_language())  # Original language must have fulltext in html.
+        data['fulltexts.html'].add(original_language)  # Original language must have fulltext in html.
         if document.data_model_version == 'xml':
             for lang in document.xml_languages() or []:
                 data['fulltexts.html'].add(lang)
 
         languages = document.journal.languages + document.languages()
-        languages.append(document.original_language())
+        languages.append(original_language)
 
         for language in set(languages):
-            if self.is_file_available(file_id, 'pdf', language, document.original_language()):
+            if self.is_file_available(file_id, 'pdf', language, original_language):
                 data['fulltexts.pdf'].add(language)
                 logger.info(
                     u'Fulltext available in pdf %s for %s, %s, %s',
@@ -340,7 +480,7 @@ class StaticCatalog(object):
                     file_id[2]
                 )
 
-            if self.is_file_available(file_id, 'html', language, document.original_language()):
+            if self.is_file_available(file_id, 'html', language, original_language):
                 data['fulltexts.html'].add(language)
                 logger.info(
                     u'Fulltext available in html %s for %s, %s, %s',
@@ -353,14 +493,12 @@ class StaticCatalog(object):
         ldata = {}
 
         if len(data['fulltexts.pdf']) > 0:
+            file_name = self._file_name(document.file_code(fullpath=True))
             for lang in data['fulltexts.pdf']:
-                if lang != document.original_language():
-                    fname = '_'.join([
-                        lang,
-                        self._file_name(document.file_code(fullpath=True))]
-                    )
+                if lang != original_language:
+                    fname = '_'.join([lang, file_name])
                 else:
-                    fname = self._file_name(document.file_code(fullpath=True))
+                    fname = file_name
 
                 ldata['fulltexts.pdf.%s' % lang] = 'http://%s' % '/'.join([
                     document.scielo_domain,
@@ -382,24 +520,30 @@ class StaticCatalog(object):
         return ldata
 
 
-def run(collections, articlemeta_db, all_records=False, forced_url=None):
+def run_collection(collection, articlemeta_db, all_records=False,
+                   forced_url=None, shard=None, resume=False,
+                   since_checkpoint=False, incremental=False):
 
-    if not isinstance(collections, list):
-        logger.error('Collections must be a list o collection acronym')
-        exit()
+    coll_info = collection_info(collection, articlemeta_db)
 
-    for collection in collections:
+    collection_domain = forced_url if forced_url else coll_info['domain']
+    logger.info(u'Loading languages for %s', collection_domain)
+    logger.info(u'Using mode all_records %s', str(all_records))
 
-        coll_info = collection_info(collection, articlemeta_db)
+    static_catalogs = StaticCatalog(collection_domain)
 
-        collection_domain = forced_url if forced_url else coll_info['domain']
-        logger.info(u'Loading languages for %s', collection_domain)
-        logger.info(u'Using mode all_records %s', str(all_records))
+    with BulkWriter(articlemeta_db['articles']) as writer:
+        checkpoint = checkpoints.CheckpointStore(articlemeta_db).start(
+            JOB, collection, shard=shard, resume=resume,
+            since_checkpoint=since_checkpoint, incremental=incremental,
+            writer=writer)
 
-        static_catalogs = StaticCatalog(collection_domain)
+        documents = load_documents(collection, articlemeta_db,
+                                   all_records=all_records,
+                                   after_id=checkpoint.after_id, shard=shard,
+                                   changes=checkpoint.changes)
 
-        for document in load_documents(collection, articlemeta_db,
-                                       all_records=all_records):
+        for document in checkpoint.track(documents):
             logger.debug(
                 u'Checking fulltexts for %s_%s',
                 collection,
@@ -414,6 +558,7 @@ def run(collections, articlemeta_db, all_records=False, forced_url=None):
                     collection,
                     document.publisher_id
                 )
+                checkpoint.fail(document.publisher_id)
                 continue
 
             for key in fulltexts.keys():
@@ -425,9 +570,9 @@ def run(collections, articlemeta_db, all_records=False, forced_url=None):
                     )
                     continue
 
-            articlemeta_db['articles'].update_one(
+            writer.update_one(
                 {'code': document.publisher_id, 'collection': document.collection_acronym},
-                {'$set': static_catalogs.fulltexts(document)}
+                {'$set': fulltexts}
             )
 
             logger.debug(
@@ -436,6 +581,30 @@ def run(collections, articlemeta_db, all_records=False, forced_url=None):
                 document.publisher_id
             )
 
+    checkpoint.finish()
+
+    return checkpoint.stats
+
+
+def run(collections, articlemeta_db, all_records=False, forced_url=None,
+        shard=None, resume=False, since_checkpoint=False, incremental=False,
+        workers=1, per_domain=orchestrator.PER_DOMAIN):
+
+    if not isinstance(collections, list):
+        raise ValueError('Collections must be a list o collection acronym')
+
+    return orchestrator.run(
+        JOB,
+        collections,
+        lambda collection: run_collection(
+            collection, articlemeta_db, all_records=all_records,
+            forced_url=forced_url, shard=shard, resume=resume,
+            since_checkpoint=since_checkpoint, incremental=incremental),
+        domain=lambda collection: forced_url or collection_info(collection, articlemeta_db)['domain'],
+        workers=workers,
+        per_domain=per_domain
+    )
+
 
 def main():
     db_dsn = os.environ.get('MONGODB_HOST', 'mongodb://localhost:27017/articlemeta')
@@ -471,6 +640,12 @@ def main():
         help='Full path to the log file'
     )
 
+    parser.add_argument(
+        '--shard',
+        type=parse_shard,
+        help='Process only a part of the documents, given as INDEX/TOTAL. Ex: 1/4'
+    )
+
     parser.add_argument(
         '--logging_level',
         '-l',
@@ -485,6 +660,15 @@ def main():
         help='Collection domain to get Static catalog'
     )
 
+    parser.add_argument(
+        '--cache_dir',
+        default=STATIC_CATALOG_CACHE_DIR,
+        help='Directory to cache the static catalogs, an empty value disables the cache'
+    )
+
+    checkpoints.add_arguments(parser)
+    orchestrator.add_arguments(parser)
+
     args = parser.parse_args()
     LOGGING['handlers']['console']['level'] = args.logging_level
     for lg, content in LOGGING['loggers'].items():
@@ -494,7 +678,12 @@ def main():
 
     collections = [args.collection] if args.collection else _collections_acronyms
 
-    run(collections, articlemeta_db, args.all_records, args.domain)
+    StaticCatalog.cache_dir = args.cache_dir
+
+    run(collections, articlemeta_db, args.all_records, args.domain,
+        shard=args.shard, resume=args.resume,
+        since_checkpoint=args.since_checkpoint, incremental=args.incremental,
+        workers=args.workers, per_domain=args.per_domain)
 
 
 if __name__ == '__main__':
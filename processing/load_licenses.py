@@ -12,31 +12,41 @@ import logging
 import logging.config
 from datetime import datetime, timedelta
 
-import requests
 from xylose.scielodocument import Article
 
 from articlemeta import controller
+from processing.bulkwriter import BulkWriter
+from processing.documents import DocumentLoader, parse_shard
+from processing import checkpoints, orchestrator, httpclient
 
 logger = logging.getLogger(__name__)
 SENTRY_DSN = os.environ.get('SENTRY_DSN', None)
 LOGGING_LEVEL = os.environ.get('LOGGING_LEVEL', 'DEBUG')
 MONGODB_HOST = os.environ.get('MONGODB_HOST', None)
 
+JOB = 'load_licenses'
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': True,
 
     'formatters': {
         'console': {
-            'format': '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+            'format': '%(asctime)s - %(name)s - %(levelname)s - %(collection)s - %(message)s',
             'datefmt': '%H:%M:%S',
             },
         },
+    'filters': {
+        'collection': {
+            '()': 'processing.orchestrator.CollectionFilter',
+            },
+        },
     'handlers': {
         'console': {
             'level': LOGGING_LEVEL,
             'class': 'logging.StreamHandler',
-            'formatter': 'console'
+            'formatter': 'console',
+            'filters': ['collection']
             }
         },
     'loggers': {
@@ -89,36 +99,27 @@ def collection_info(articlemeta_db, collection):
     return info
 
 
-def load_documents(articlemeta_db, collection, all_records=False):
+def load_documents(articlemeta_db, collection, all_records=False, after_id=None,
+                   shard=None, changes=None):
 
     fltr = {
         'collection': collection
     }
 
-    if all_records is False:
-        fltr['license'] = {'$exists': 0}
-
-    documents = articlemeta_db['articles'].find(
-        fltr,
-        {'code': 1}
-    )
-
-    pids = []
-    for document in documents:
-        pids.append(document['code'])
-
-    if 'license' in fltr:
-        del(fltr['license'])
-
-    for pid in pids:
-        fltr['code'] = pid
-        document = articlemeta_db['articles'].find_one(
+    if changes is not None:
+        documents = changes.documents(fltr, after_id=after_id, shard=shard)
+    else:
+        documents = DocumentLoader(
+            articlemeta_db['articles'],
             fltr,
-            {'_id': 0, 'citations': 0}
+            after_id=after_id,
+            shard=shard,
+            shard_filter={'collection': collection},
+            missing_field=None if all_records else 'license'
         )
-        yield Article(document)
 
-    documents.close()  # Release the cursor once it has no timeout.
+    for document in documents:
+        yield Article(document)
 
 
 def do_request(url, json=True):
@@ -127,15 +128,15 @@ def do_request(url, json=True):
         'User-Agent': 'SciELO Processing ArticleMeta: LoadLicense'
     }
 
-    try:
-        document = requests.get(url, headers=headers)
-    except:
-        logger.error(u'HTTP request error for: %s', url)
+    document = httpclient.get_client().fetch(url, headers=headers)
+
+    if document is None:
+        return None
+
+    if json:
+        return document.json()
     else:
-        if json:
-            return document.json()
-        else:
-            return document.text
+        return document.text
 
 
 def scrap_license(data):
@@ -150,19 +151,25 @@ def scrap_license(data):
         return lc
 
 
-def run(articlemeta_db, collections, all_records=False):
+def run_collection(articlemeta_db, collection, all_records=False, shard=None,
+                   resume=False, since_checkpoint=False, incremental=False):
 
-    if not isinstance(collections, list):
-        logger.error('Collections must be a list o collection acronym')
-        exit()
+    coll_info = collection_info(articlemeta_db, collection)
+
+    logger.info(u'Loading licenses for %s', coll_info['domain'])
+    logger.info(u'Using mode all_records %s', str(all_records))
 
-    for collection in collections:
-        coll_info = collection_info(articlemeta_db, collection)
+    with BulkWriter(articlemeta_db['articles']) as writer:
+        checkpoint = checkpoints.CheckpointStore(articlemeta_db).start(
+            JOB, collection, shard=shard, resume=resume,
+            since_checkpoint=since_checkpoint, incremental=incremental,
+            writer=writer)
 
-        logger.info(u'Loading licenses for %s', coll_info['domain'])
-        logger.info(u'Using mode all_records %s', str(all_records))
+        documents = load_documents(articlemeta_db, collection, all_records=all_records,
+                                   after_id=checkpoint.after_id, shard=shard,
+                                   changes=checkpoint.changes)
 
-        for document in load_documents(articlemeta_db, collection, all_records=all_records):
+        for document in checkpoint.track(documents):
 
             lic = None
             try:
@@ -173,19 +180,44 @@ def run(articlemeta_db, collections, all_records=False):
                 )
             except:
                 logger.error('Fail to scrap: %s', document.publisher_id)
+                checkpoint.fail(document.publisher_id)
                 continue
 
             if not lic:
                 logger.debug('No license defined for: %s', document.publisher_id)
                 continue
 
-            articlemeta_db['articles'].update(
+            writer.update_one(
                 {'code': document.publisher_id, 'collection': document.collection_acronym},
                 {'$set': {'license': lic}}
             )
 
             logger.debug('%s: %s', document.publisher_id, lic)
 
+    checkpoint.finish()
+
+    return checkpoint.stats
+
+
+def run(articlemeta_db, collections, all_records=False, shard=None, resume=False,
+        since_checkpoint=False, incremental=False, workers=1,
+        per_domain=orchestrator.PER_DOMAIN):
+
+    if not isinstance(collections, list):
+        raise ValueError('Collections must be a list o collection acronym')
+
+    return orchestrator.run(
+        JOB,
+        collections,
+        lambda collection: run_collection(
+            articlemeta_db, collection, all_records=all_records, shard=shard,
+            resume=resume, since_checkpoint=since_checkpoint,
+            incremental=incremental),
+        domain=lambda collection: collection_info(articlemeta_db, collection)['domain'],
+        workers=workers,
+        per_domain=per_domain
+    )
+
 
 def main():
     db_dsn = os.environ.get('MONGODB_HOST', 'mongodb://localhost:27017/articlemeta')
@@ -219,6 +251,12 @@ def main():
         help='Apply processing to all records or just records without the license parameter'
     )
 
+    parser.add_argument(
+        '--shard',
+        type=parse_shard,
+        help='Process only a part of the documents, given as INDEX/TOTAL. Ex: 1/4'
+    )
+
     parser.add_argument(
         '--logging_level',
         '-l',
@@ -227,6 +265,9 @@ def main():
         help='Logggin level'
     )
 
+    checkpoints.add_arguments(parser)
+    orchestrator.add_arguments(parser)
+
     args = parser.parse_args()
     LOGGING['handlers']['console']['level'] = args.logging_level
     for lg, content in LOGGING['loggers'].items():
@@ -236,4 +277,6 @@ def main():
 
     collections = [args.collection] if args.collection else _collections_acronyms
 
-    run(articlemeta_db, collections, args.all_records)
+    run(articlemeta_db, collections, args.all_records, shard=args.shard,
+        resume=args.resume, since_checkpoint=args.since_checkpoint, incremental=args.incremental,
+        workers=args.workers, per_domain=args.per_domain)
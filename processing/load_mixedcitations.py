@@ -14,6 +14,7 @@ import sys
 
 
 from articlemeta import controller
+from processing.bulkwriter import BulkWriter
 from xylose.scielodocument import Article
 
 logger = logging.getLogger(__name__)
@@ -205,11 +206,14 @@ def get_document(collection, code):
     return Article(document)
 
 
-def update_document(mixed, document):
+def update_document(mixed, document, writer=None):
     logger.debug('Updating citation in database')
 
     citation_field = 'citations.%s.mixed' % str(int(mixed['order'])-1)
-    articlemeta_db['articles'].update(
+    if writer is None:
+        writer = articlemeta_db['articles']
+
+    writer.update_one(
         {
             'collection': document.collection_acronym,
             'code': document.publisher_id
@@ -224,28 +228,29 @@ def update_document(mixed, document):
 
 def run(mixed_citations_file, import_data):
 
-    with codecs.open(mixed_citations_file, encoding='utf-8') as mixed_citations:
+    with BulkWriter(articlemeta_db['articles']) as writer:
+        with codecs.open(mixed_citations_file, encoding='utf-8') as mixed_citations:
 
-        for line in mixed_citations:
-            mixed = json.loads(line)
-            mixed['mixed'] = html_decode(mixed['mixed'])
-            mixed["mixed"] = change_w_namespace(mixed['mixed'])
-            document = get_document(mixed['collection'], mixed['pid'])
+            for line in mixed_citations:
+                mixed = json.loads(line)
+                mixed['mixed'] = html_decode(mixed['mixed'])
+                mixed["mixed"] = change_w_namespace(mixed['mixed'])
+                document = get_document(mixed['collection'], mixed['pid'])
 
-            logger.info('Trying to import %s %s %s', mixed['collection'], mixed['pid'], mixed['order'])
-            if not document:
-                logger.error('Document not found in Article Meta %s %s %s', mixed['collection'], mixed['pid'], mixed['order'])
-                continue
+                logger.info('Trying to import %s %s %s', mixed['collection'], mixed['pid'], mixed['order'])
+                if not document:
+                    logger.error('Document not found in Article Meta %s %s %s', mixed['collection'], mixed['pid'], mixed['order'])
+                    continue
 
-            if not audity(mixed, document):
-                logger.error('Document did not pass in auditory %s %s %s', mixed['collection'], mixed['pid'], mixed['order'])
-                continue
+                if not audity(mixed, document):
+                    logger.error('Document did not pass in auditory %s %s %s', mixed['collection'], mixed['pid'], mixed['order'])
+                    continue
 
-            logger.debug('Document pass in auditory %s %s %s', mixed['collection'], mixed['pid'], mixed['order'])
+                logger.debug('Document pass in auditory %s %s %s', mixed['collection'], mixed['pid'], mixed['order'])
 
-            if import_data:
-                logger.debug('Importing data for %s %s %s', mixed['collection'], mixed['pid'], mixed['order'])
-                update_document(mixed, document)
+                if import_data:
+                    logger.debug('Importing data for %s %s %s', mixed['collection'], mixed['pid'], mixed['order'])
+                    update_document(mixed, document, writer)
 
 
 def main():
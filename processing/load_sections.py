@@ -11,10 +11,12 @@ import argparse
 import logging
 from datetime import datetime, timedelta
 
-import requests
 from xylose.scielodocument import Article
 
 from articlemeta import controller
+from processing.bulkwriter import BulkWriter
+from processing.documents import DocumentLoader, parse_shard
+from processing import checkpoints, orchestrator, httpclient
 
 
 logger = logging.getLogger(__name__)
@@ -32,21 +34,29 @@ MONGODB_HOST = os.environ.get('MONGODB_HOST', None)
 
 DOI_REGEX = re.compile(r'[0-9][0-9]\.[0-9].*/.*\S')
 
+JOB = 'load_sections'
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': True,
 
     'formatters': {
         'console': {
-            'format': '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+            'format': '%(asctime)s - %(name)s - %(levelname)s - %(collection)s - %(message)s',
             'datefmt': '%H:%M:%S',
             },
         },
+    'filters': {
+        'collection': {
+            '()': 'processing.orchestrator.CollectionFilter',
+            },
+        },
     'handlers': {
         'console': {
             'level': LOGGING_LEVEL,
             'class': 'logging.StreamHandler',
-            'formatter': 'console'
+            'formatter': 'console',
+            'filters': ['collection']
             }
         },
     'loggers': {
@@ -123,14 +133,9 @@ def do_request(url, json=True):
         'User-Agent': 'SciELO Processing ArticleMeta: LoadSection'
     }
 
-    document = None
-    try:
-        document = requests.get(url, headers=headers)
-    except:
-        logger.error(u'HTTP request error for: %s', url)
+    document = httpclient.get_client().fetch(url, headers=headers)
 
-    if document.status_code == 404:
-        logger.error(u'Data not found for: %s', url)
+    if document is None:
         return None
 
     if json:
@@ -139,37 +144,27 @@ def do_request(url, json=True):
         return document
 
 
-def load_documents(articlemeta_db, collection, all_records=False):
+def load_documents(articlemeta_db, collection, all_records=False, after_id=None,
+                   shard=None, changes=None):
 
     fltr = {
         'collection': collection
     }
 
-    if all_records is False:
-        fltr['section'] = {'$exists': 0}
-
-    documents = articlemeta_db['articles'].find(
-        fltr,
-        {'code': 1}
-    )
-
-    pids = []
-    for document in documents:
-        pids.append(document['code'])
-
-    if 'section' in fltr:
-        del(fltr['section'])
-
-    for pid in pids:
-        fltr['code'] = pid
-        document = articlemeta_db['articles'].find_one(
+    if changes is not None:
+        documents = changes.documents(fltr, after_id=after_id, shard=shard)
+    else:
+        documents = DocumentLoader(
+            articlemeta_db['articles'],
             fltr,
-            {'_id': 0, 'citations': 0},
-            no_cursor_timeout=True
+            after_id=after_id,
+            shard=shard,
+            shard_filter={'collection': collection},
+            missing_field=None if all_records else 'section'
         )
-        yield Article(document)
 
-    documents.close()
+    for document in documents:
+        yield Article(document)
 
 
 class StaticCatalog(object):
@@ -277,26 +272,31 @@ class StaticCatalog(object):
         return section
 
 
-def run(articlemeta_db, collections, all_records=False):
+def run_collection(articlemeta_db, collection, all_records=False, shard=None,
+                   resume=False, since_checkpoint=False, incremental=False):
 
-    if not isinstance(collections, list):
-        logger.error('Collections must be a list of collection acronym')
-        exit()
+    coll_info = collection_info(articlemeta_db, collection)
 
-    for collection in collections:
+    logger.info(u'Loading sections for %s', coll_info['domain'])
+    logger.info(u'Using mode all_records %s', str(all_records))
 
-        coll_info = collection_info(articlemeta_db, collection)
+    static_catalogs = StaticCatalog(coll_info)
 
-        logger.info(u'Loading sections for %s', coll_info['domain'])
-        logger.info(u'Using mode all_records %s', str(all_records))
+    if not static_catalogs.catalog:
+        raise orchestrator.JobError(
+            u'Section Catalog not found for: %s Processing Interrupited' % coll_info['domain'])
 
-        static_catalogs = StaticCatalog(coll_info)
+    with BulkWriter(articlemeta_db['articles']) as writer:
+        checkpoint = checkpoints.CheckpointStore(articlemeta_db).start(
+            JOB, collection, shard=shard, resume=resume,
+            since_checkpoint=since_checkpoint, incremental=incremental,
+            writer=writer)
 
-        if not static_catalogs.catalog:
-            logger.info(u'Section Catalog not found for: %s Processing Interrupited', coll_info['domain'])
-            exit()
+        documents = load_documents(articlemeta_db, collection, all_records=all_records,
+                                   after_id=checkpoint.after_id, shard=shard,
+                                   changes=checkpoint.changes)
 
-        for document in load_documents(articlemeta_db, collection, all_records=all_records):
+        for document in checkpoint.track(documents):
             logger.debug(
                 u'Checking section for %s_%s',
                 collection,
@@ -311,9 +311,10 @@ def run(articlemeta_db, collections, all_records=False):
                     collection,
                     document.publisher_id
                 )
+                checkpoint.fail(document.publisher_id)
                 continue
 
-            articlemeta_db['articles'].update(
+            writer.update_one(
                 {'code': document.publisher_id, 'collection': document.collection_acronym},
                 {'$set': {'section': section}}
             )
@@ -324,6 +325,30 @@ def run(articlemeta_db, collections, all_records=False):
                 document.publisher_id
             )
 
+    checkpoint.finish()
+
+    return checkpoint.stats
+
+
+def run(articlemeta_db, collections, all_records=False, shard=None, resume=False,
+        since_checkpoint=False, incremental=False, workers=1,
+        per_domain=orchestrator.PER_DOMAIN):
+
+    if not isinstance(collections, list):
+        raise ValueError('Collections must be a list of collection acronym')
+
+    return orchestrator.run(
+        JOB,
+        collections,
+        lambda collection: run_collection(
+            articlemeta_db, collection, all_records=all_records, shard=shard,
+            resume=resume, since_checkpoint=since_checkpoint,
+            incremental=incremental),
+        domain=lambda collection: collection_info(articlemeta_db, collection)['domain'],
+        workers=workers,
+        per_domain=per_domain
+    )
+
 
 def main():
     db_dsn = os.environ.get('MONGODB_HOST', 'mongodb://localhost:27017/articlemeta')
@@ -359,6 +384,12 @@ def main():
         help='Full path to the log file'
     )
 
+    parser.add_argument(
+        '--shard',
+        type=parse_shard,
+        help='Process only a part of the documents, given as INDEX/TOTAL. Ex: 1/4'
+    )
+
     parser.add_argument(
         '--logging_level',
         '-l',
@@ -367,10 +398,15 @@ def main():
         help='Logggin level'
     )
 
+    checkpoints.add_arguments(parser)
+    orchestrator.add_arguments(parser)
+
     args = parser.parse_args()
 
     _config_logging(args.logging_level, args.logging_file)
 
     collections = [args.collection] if args.collection else _collections_acronyms
 
-    run(articlemeta_db, collections, args.all_records)
+    run(articlemeta_db, collections, args.all_records, shard=args.shard,
+        resume=args.resume, since_checkpoint=args.since_checkpoint, incremental=args.incremental,
+        workers=args.workers, per_domain=args.per_domain)
@@ -0,0 +1,171 @@
+# coding: utf-8
+"""
+Runs a processing job over many collections at the same time.
+
+The collections live on independent SciELO websites, so they are processed
+by a pool of threads. At most ``per_domain`` collections of the same website
+are processed at once, not to overload it. A failing collection is logged
+and reported, the other ones keep running.
+
+The log records of the collections running at the same time are told apart
+by ``CollectionFilter``, which adds the collection being processed to them.
+"""
+import time
+import logging
+import threading
+import contextvars
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+WORKERS = 4
+PER_DOMAIN = 1
+
+# collection processed by the current thread.
+_collection = contextvars.ContextVar('collection', default='-')
+
+
+class JobError(Exception):
+    """
+    Raised by a job to interrupt the processing of a collection, the message
+    is logged without the traceback.
+    """
+
+
+class CollectionFilter(logging.Filter):
+    """
+    Adds the ``collection`` attribute to the log records, the collection
+    being processed by the thread that logs them ('-' outside of a job), to
+    be used in the formats as ``%(collection)s``. Meant to be set in the
+    handlers, so that the records of every logger get it.
+    """
+
+    def filter(self, record):
+        record.collection = _collection.get()
+        return True
+
+
+def add_arguments(parser):
+    """
+    Add the --workers and --per_domain options to an argparse parser.
+    """
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=WORKERS,
+        help='Number of collections processed at the same time'
+    )
+
+    parser.add_argument(
+        '--per_domain',
+        type=int,
+        default=PER_DOMAIN,
+        help='Number of collections of the same website processed at the same time'
+    )
+
+
+class Orchestrator(object):
+    """
+    Runs ``func(collection)`` for each collection. ``func`` may return a dict
+    of numeric metrics, that are aggregated in the results.
+
+    @param domain: function returning the website of a collection, used to
+        limit the collections processed at once on the same website.
+    """
+
+    def __init__(self, job, func, domain=None, workers=WORKERS,
+                 per_domain=PER_DOMAIN):
+        self.job = job
+        self.func = func
+        self.domain = domain
+        self.workers = max(1, workers)
+        self.per_domain = max(1, per_domain)
+        self._semaphores = {}
+        self._lock = threading.Lock()
+
+    def _domain_semaphore(self, domain):
+        with self._lock:
+            if domain not in self._semaphores:
+                self._semaphores[domain] = threading.BoundedSemaphore(
+                    self.per_domain)
+
+            return self._semaphores[domain]
+
+    def _run_collection(self, collection):
+        token = _collection.set(collection)
+        started = time.monotonic()
+        result = {'status': 'done', 'error': None, 'metrics': {}}
+
+        try:
+            domain = self.domain(collection) if self.domain else collection
+
+            with self._domain_semaphore(domain):
+                logger.info('Running %s for %s (%s)', self.job, collection,
+                            domain)
+                result['metrics'] = self.func(collection) or {}
+        except JobError as exc:
+            logger.error('%s failed for %s: %s', self.job, collection, exc)
+            result.update({'status': 'failed', 'error': str(exc)})
+        except Exception as exc:
+            logger.exception('%s failed for %s', self.job, collection)
+            result.update({'status': 'failed', 'error': repr(exc)})
+        finally:
+            _collection.reset(token)
+
+        result['elapsed'] = round(time.monotonic() - started, 3)
+
+        return result
+
+    def run(self, collections):
+        """
+        Process ``collections`` and return a dict with the result of each
+        one, {collection: {'status', 'error', 'elapsed', 'metrics'}}, in the
+        given order.
+        """
+        results = OrderedDict()
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = [
+                (collection, executor.submit(self._run_collection, collection))
+                for collection in collections
+            ]
+
+            for collection, future in futures:
+                results[collection] = future.result()
+
+        self.report(results)
+
+        return results
+
+    def report(self, results):
+        totals = {}
+        failed = []
+
+        for collection, result in results.items():
+            logger.info(
+                '%s %s for %s in %.1fs %s', self.job, result['status'],
+                collection, result['elapsed'],
+                ' '.join('%s=%s' % i for i in sorted(result['metrics'].items())))
+
+            if result['status'] == 'failed':
+                failed.append(collection)
+
+            for key, value in result['metrics'].items():
+                totals[key] = totals.get(key, 0) + value
+
+        logger.info(
+            '%s finished: %d collections, %d failed %s', self.job,
+            len(results), len(failed),
+            ' '.join('%s=%s' % i for i in sorted(totals.items())))
+
+        if failed:
+            logger.error('%s failed for: %s', self.job, ', '.join(failed))
+
+        return totals
+
+
+def run(job, collections, func, domain=None, workers=WORKERS,
+        per_domain=PER_DOMAIN):
+    return Orchestrator(job, func, domain=domain, workers=workers,
+                        per_domain=per_domain).run(collections)
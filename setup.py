@@ -64,6 +64,8 @@ setup(
     articlemeta_importaffiliation=processing.importaffiliation:main
     articlemeta_fixpages=processing.fixpages:main
     articlemeta_dumparticles=processing.dumparticles:main
+    articlemeta_exportarticles=processing.exportarticles:main
     articlemeta_thriftserver=articlemeta.thrift.server:main
+    articlemeta_ensure_indexes=articlemeta.indexes:main
     """,
 )
@@ -0,0 +1,61 @@
+# coding: utf-8
+import unittest
+
+import mongomock
+
+from articlemeta import controller
+from benchmarks import datagen, bench_databroker
+
+
+class DatagenTest(unittest.TestCase):
+
+    def setUp(self):
+        self.db = mongomock.MongoClient().db
+        self.generated = datagen.generate(self.db, 1050)
+        self.broker = controller.DataBroker(self.db)
+
+    def test_generated_counts(self):
+        self.assertEqual(self.generated['articles'], 1050)
+        self.assertEqual(self.generated['journals'], 2)
+        self.assertEqual(self.generated['issues'], 42)
+        self.assertEqual(self.db['articles'].count_documents({}), 1050)
+        self.assertEqual(self.db['historychanges_article'].count_documents(
+            {'event': 'add'}), 1050)
+
+    def test_articles_are_served_by_the_broker(self):
+        code, collection = datagen.article_code(1049)
+
+        article = self.broker.get_article(code, collection=collection)
+
+        self.assertEqual(article['code'], 'S1000-00012000000200025')
+        self.assertEqual(article['collection'], 'arg')
+        self.assertEqual(article['issue']['code'], '1000-000120000002')
+
+        result = self.broker.counter_dict(collection='arg', limit=1)
+        self.assertEqual(result['meta']['total'], 50)
+        self.assertEqual(result['objects'][0]['pdfs'][0]['path'],
+                         'pdf/j1/v1n1/07.pdf')
+
+
+class CompareTest(unittest.TestCase):
+
+    def test_regressions(self):
+        baseline = {'10': {'get_article': {'p50': 1.0, 'p90': 2.0,
+                                           'queries': 2.0}}}
+        results = {'10': {'get_article': {'p50': 1.4, 'p90': 3.5,
+                                          'queries': 3.0},
+                          'historychanges': {'p50': 1.0, 'p90': 1.0,
+                                             'queries': 1.0}}}
+
+        regressions = bench_databroker.compare(results, baseline, 0.5)
+
+        self.assertEqual(regressions, [
+            'get_article@10: p90 3.500ms > 2.000ms',
+            'get_article@10: 3.00 queries > 2.00',
+        ])
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+
+        self.assertEqual(bench_databroker.percentile(values, 50), 51)
+        self.assertEqual(bench_databroker.percentile(values, 99), 99)
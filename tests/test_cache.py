@@ -0,0 +1,195 @@
+# coding: utf-8
+import os
+import shutil
+import tempfile
+import unittest
+
+from articlemeta.cache import TTLCache, ReplicaAwareCache, RenderedExportCache
+
+
+class FakeTimer(object):
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+class TTLCacheTests(unittest.TestCase):
+
+    def setUp(self):
+        self.timer = FakeTimer()
+        self.cache = TTLCache(maxsize=2, ttl=10, timer=self.timer)
+
+    def test_get_returns_stored_value(self):
+        self.cache.set('a', 1)
+        self.assertEqual(self.cache.get('a'), 1)
+
+    def test_get_returns_default_for_missing_key(self):
+        self.assertIsNone(self.cache.get('a'))
+        self.assertEqual(self.cache.get('a', 'default'), 'default')
+
+    def test_entries_expire_after_ttl(self):
+        self.cache.set('a', 1)
+        self.timer.now = 10
+        self.assertIsNone(self.cache.get('a'))
+        self.assertNotIn('a', self.cache)
+
+    def test_least_recently_used_entry_is_evicted(self):
+        self.cache.set('a', 1)
+        self.cache.set('b', 2)
+        self.cache.get('a')
+        self.cache.set('c', 3)
+        self.assertIn('a', self.cache)
+        self.assertNotIn('b', self.cache)
+        self.assertIn('c', self.cache)
+
+    def test_invalidate_removes_entry(self):
+        self.cache.set('a', 1)
+        self.cache.invalidate('a')
+        self.assertIsNone(self.cache.get('a'))
+
+    def test_stats_count_hits_and_misses(self):
+        self.cache.set('a', 1)
+        self.cache.get('a')
+        self.cache.get('b')
+        self.assertEqual(self.cache.stats['hits'], 1)
+        self.assertEqual(self.cache.stats['misses'], 1)
+
+
+class ReplicaAwareCacheTests(unittest.TestCase):
+
+    def setUp(self):
+        self.timer = FakeTimer()
+        self.cache = ReplicaAwareCache(maxsize=2, ttl=10, timer=self.timer)
+
+    def test_invalidated_key_is_written(self):
+        self.assertFalse(self.cache.written('a'))
+
+        self.cache.invalidate('a')
+
+        self.assertTrue(self.cache.written('a'))
+
+    def test_value_read_before_the_write_is_not_cached(self):
+        read_at = self.cache.now()
+        self.timer.now = 1
+        self.cache.invalidate('a')
+
+        self.cache.set('a', 'old', read_at=read_at)
+
+        self.assertIsNone(self.cache.get('a'))
+        self.assertTrue(self.cache.written('a'))
+
+    def test_value_read_after_the_write_is_cached(self):
+        self.cache.invalidate('a')
+        self.timer.now = 1
+
+        self.cache.set('a', 'new', read_at=self.cache.now())
+
+        self.assertEqual(self.cache.get('a'), 'new')
+        self.assertFalse(self.cache.written('a'))
+
+    def test_written_keys_expire_after_ttl(self):
+        self.cache.invalidate('a')
+        self.timer.now = 10
+
+        self.assertFalse(self.cache.written('a'))
+
+    def test_written_keys_are_bounded(self):
+        for key in 'abc':
+            self.cache.invalidate(key)
+
+        self.assertFalse(self.cache.written('a'))
+        self.assertTrue(self.cache.written('c'))
+
+
+class RenderedExportCacheTests(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = RenderedExportCache(maxsize=10, directory=self.directory)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_get_or_render_renders_only_once(self):
+        calls = []
+
+        def render():
+            calls.append(1)
+            return b'<xml/>'
+
+        for _ in range(3):
+            value = self.cache.get_or_render(
+                'scl', 'S0000-00002000000100001', 'xmlwos', 'v1', render)
+
+        self.assertEqual(value, b'<xml/>')
+        self.assertEqual(len(calls), 1)
+
+    def test_new_version_is_a_miss(self):
+        self.cache.set('scl', 'S0000-00002000000100001', 'xmlwos', 'v1', b'a')
+
+        self.assertIsNone(
+            self.cache.get('scl', 'S0000-00002000000100001', 'xmlwos', 'v2'))
+
+    def test_disk_tier_is_shared_between_instances(self):
+        xml = '<xml>ç</xml>'.encode('utf-8')
+        self.cache.set('scl', 'S0000-00002000000100001', 'xmlwos', 'v1', xml)
+        other = RenderedExportCache(directory=self.directory)
+
+        self.assertEqual(
+            other.get('scl', 'S0000-00002000000100001', 'xmlwos', 'v1'), xml)
+
+    def test_disk_tier_keeps_only_the_last_version(self):
+        self.cache.set('scl', 'S0000-00002000000100001', 'xmlwos', 'v1', b'a')
+        self.cache.set('scl', 'S0000-00002000000100001', 'xmlwos', 'v2', b'b')
+
+        path = os.path.join(
+            self.directory, 'scl', '0000-0000', 'S0000-00002000000100001')
+        self.assertEqual(len(os.listdir(path)), 1)
+
+    def test_invalidate_article(self):
+        self.cache.set('scl', 'S0000-00002000000100001', 'xmlwos', 'v1', b'a')
+        self.cache.set('scl', 'S0000-00002000000100002', 'xmlwos', 'v1', b'b')
+
+        self.cache.invalidate('scl', 'S0000-00002000000100001')
+        other = RenderedExportCache(directory=self.directory)
+
+        for cache in [self.cache, other]:
+            self.assertIsNone(
+                cache.get('scl', 'S0000-00002000000100001', 'xmlwos', 'v1'))
+            self.assertEqual(
+                cache.get('scl', 'S0000-00002000000100002', 'xmlwos', 'v1'),
+                b'b')
+
+    def test_invalidate_journal_without_collection(self):
+        self.cache.set('scl', 'S0000-00002000000100001', 'xmlwos', 'v1', b'a')
+        self.cache.set('spa', 'S0000-00002000000100001', 'xmlrsps', 'v1', b'b')
+        self.cache.set('scl', 'S1111-11112000000100001', 'xmlwos', 'v1', b'c')
+
+        self.cache.invalidate(None, 'S0000-0000')
+        other = RenderedExportCache(directory=self.directory)
+
+        for cache in [self.cache, other]:
+            self.assertIsNone(
+                cache.get('scl', 'S0000-00002000000100001', 'xmlwos', 'v1'))
+            self.assertIsNone(
+                cache.get('spa', 'S0000-00002000000100001', 'xmlrsps', 'v1'))
+            self.assertEqual(
+                cache.get('scl', 'S1111-11112000000100001', 'xmlwos', 'v1'),
+                b'c')
+
+    def test_memory_only(self):
+        cache = RenderedExportCache(maxsize=10)
+        cache.set('scl', 'S0000-00002000000100001', 'xmlwos', 'v1', b'a')
+        cache.invalidate('scl', 'S0000-0000')
+
+        self.assertIsNone(
+            cache.get('scl', 'S0000-00002000000100001', 'xmlwos', 'v1'))
+
+    def test_from_settings(self):
+        cache = RenderedExportCache.from_settings(
+            {'render_cache_maxsize': '5', 'render_cache_ttl': '60'})
+
+        self.assertEqual(cache.memory.maxsize, 5)
+        self.assertEqual(cache.memory.ttl, 60)
@@ -0,0 +1,168 @@
+# coding: utf-8
+import os
+import unittest
+from unittest import mock
+
+import mongomock
+import pymongo
+
+from articlemeta import connection, controller
+
+
+class ParseDSNTest(unittest.TestCase):
+
+    def test_without_scheme(self):
+        self.assertEqual(connection.parse_dsn('127.0.0.1:27017'),
+                         ('mongodb://127.0.0.1:27017', 'articlemeta', {}))
+
+    def test_with_database_and_options(self):
+        uri, name, options = connection.parse_dsn(
+            'mongodb://db1:27017,db2:27017/am?maxPoolSize=5')
+
+        self.assertEqual(uri, 'mongodb://db1:27017,db2:27017/am?maxPoolSize=5')
+        self.assertEqual(name, 'am')
+        self.assertEqual(options, {'maxPoolSize': 5})
+
+
+class ClientOptionsTest(unittest.TestCase):
+
+    def test_defaults(self):
+        self.assertEqual(connection.client_options(), connection.DEFAULTS)
+
+    def test_settings(self):
+        options = connection.client_options({
+            'mongo_max_pool_size': '50',
+            'mongo_socket_timeout_ms': ' 60000 ',
+            'mongo_compressors': 'zstd,zlib',
+            'mongo_min_pool_size': '',
+            'mongo_uri': 'localhost',
+        })
+
+        self.assertEqual(options['maxPoolSize'], 50)
+        self.assertEqual(options['socketTimeoutMS'], 60000)
+        self.assertEqual(options['compressors'], 'zstd,zlib')
+        self.assertEqual(options['waitQueueTimeoutMS'], 10000)
+        self.assertNotIn('minPoolSize', options)
+
+    def test_uri_options_take_precedence_over_defaults(self):
+        options = connection.client_options(
+            {'mongo_connect_timeout_ms': '500'},
+            {'waitqueuetimeoutms': 100, 'connectTimeoutMS': 200})
+
+        self.assertNotIn('waitQueueTimeoutMS', options)
+        self.assertEqual(options['connectTimeoutMS'], 500)
+
+    def test_read_preference(self):
+        self.assertEqual(connection.read_preference('secondaryPreferred'),
+                         pymongo.ReadPreference.SECONDARY_PREFERRED)
+        self.assertEqual(connection.read_preference('PRIMARY'),
+                         pymongo.ReadPreference.PRIMARY)
+
+        with self.assertRaises(ValueError):
+            connection.read_preference('anywhere')
+
+    def test_read_preference_max_staleness(self):
+        mode = connection.read_preference('secondaryPreferred', 120)
+
+        self.assertEqual(mode.mode, pymongo.ReadPreference.SECONDARY_PREFERRED.mode)
+        self.assertEqual(mode.max_staleness, 120)
+
+        with self.assertRaises(ValueError):
+            connection.read_preference('primary', 120)
+
+    def test_read_settings(self):
+        self.assertIsNone(connection.read_settings({}))
+        self.assertIsNone(connection.read_settings(
+            {'mongo_read_preference': '', 'mongo_max_staleness_seconds': ''}))
+
+        mode = connection.read_settings({
+            'mongo_read_preference': 'nearest',
+            'mongo_max_staleness_seconds': '90'})
+
+        self.assertEqual(mode.mode, pymongo.ReadPreference.NEAREST.mode)
+        self.assertEqual(mode.max_staleness, 90)
+
+        with self.assertRaises(ValueError):
+            connection.read_settings({'mongo_max_staleness_seconds': '90'})
+
+
+class GetDatabaseTest(unittest.TestCase):
+
+    def setUp(self):
+        connection._reset()
+        self.addCleanup(connection._reset)
+
+        patcher = mock.patch.object(connection.pymongo, 'MongoClient',
+                                    side_effect=self.client)
+        self.client_class = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def client(self, uri, **options):
+        return mongomock.MongoClient()
+
+    def test_client_is_shared(self):
+        db = controller.get_dbconn('localhost:27017/am', {'mongo_max_pool_size': '7'})
+        other = controller.get_dbconn('localhost:27017/am', {'mongo_max_pool_size': '7'})
+
+        self.assertEqual(self.client_class.call_count, 1)
+        self.assertIs(db.client, other.client)
+        self.assertEqual(db.name, 'am')
+
+        args, kwargs = self.client_class.call_args
+        self.assertEqual(args, ('mongodb://localhost:27017/am',))
+        self.assertEqual(kwargs['maxPoolSize'], 7)
+
+    def test_other_options_other_client(self):
+        db = controller.get_dbconn('localhost:27017/am')
+        other = controller.get_dbconn('localhost:27017/am', {'mongo_max_pool_size': '7'})
+
+        self.assertEqual(self.client_class.call_count, 2)
+        self.assertIsNot(db.client, other.client)
+
+    def test_schema_version_checked_once(self):
+        with mock.patch.object(connection.indexes, 'check_schema_version') as check:
+            controller.get_dbconn('localhost:27017/am')
+            controller.get_dbconn('localhost:27017/am')
+
+        self.assertEqual(check.call_count, 1)
+
+    def test_new_client_after_reset(self):
+        db = controller.get_dbconn('localhost:27017/am')
+        connection._reset()
+        other = controller.get_dbconn('localhost:27017/am')
+
+        self.assertIsNot(db.client, other.client)
+
+    @unittest.skipUnless(hasattr(os, 'fork'), 'requires os.fork')
+    def test_clients_are_dropped_in_a_forked_child(self):
+        controller.get_dbconn('localhost:27017/am')
+
+        pid = os.fork()
+        if pid == 0:
+            os._exit(0 if not connection._clients else 1)
+
+        _, status = os.waitpid(pid, 0)
+        self.assertEqual(os.WEXITSTATUS(status), 0)
+        self.assertEqual(len(connection._clients), 1)
+
+    def test_read_preference(self):
+        client = mock.MagicMock()
+
+        with mock.patch.object(connection, 'get_client', return_value=client):
+            controller.get_dbconn('localhost:27017/am',
+                                  read_preference='secondaryPreferred')
+
+        client.get_database.assert_called_once_with(
+            'am', read_preference=pymongo.ReadPreference.SECONDARY_PREFERRED)
+
+    def test_read_dbconn(self):
+        client = mock.MagicMock()
+        settings = {'mongo_read_preference': 'secondaryPreferred',
+                    'mongo_max_staleness_seconds': '120'}
+
+        with mock.patch.object(connection, 'get_client', return_value=client):
+            controller.get_read_dbconn('localhost:27017/am', settings)
+
+        mode = client.get_database.call_args[1]['read_preference']
+        self.assertEqual(mode.mode, pymongo.ReadPreference.SECONDARY_PREFERRED.mode)
+        self.assertEqual(mode.max_staleness, 120)
@@ -1,8 +1,13 @@
 import unittest
+from unittest import mock
 import json
+import time
+import threading
 from datetime import datetime
 
-from articlemeta import controller
+import mongomock
+
+from articlemeta import controller, cache
 
 class FunctionDatesToStringTests(unittest.TestCase):
     def test_converts_datatime_in_processing_date_value(self):
@@ -146,3 +151,834 @@ class PdfsPathsTests(unittest.TestCase):
         ]}
         result = controller._counter_dict(data)
         self.assertDictEqual(expected, result)
+
+
+class ResumeTokenTests(unittest.TestCase):
+    def test_encode_and_decode_roundtrip(self):
+        record = {'processing_date': datetime(2017, 9, 14, 10, 30, 1, 500000),
+                  '_id': controller.ObjectId('5a0b0b0b0b0b0b0b0b0b0b0b')}
+        token = controller.encode_resume_token(record)
+        self.assertEqual(controller.decode_resume_token(token),
+                         (record['processing_date'], record['_id']))
+
+    def test_decode_invalid_token_raises_value_error(self):
+        self.assertRaises(ValueError, controller.decode_resume_token, 'foo')
+
+    def test_records_without_a_date_processing_date(self):
+        for record in [{'_id': 'a'}, {'processing_date': None, '_id': 'a'},
+                       {'processing_date': '2017-09-14', '_id': 'a'},
+                       {'processing_date': 20170914, '_id': 'a'}]:
+            token = controller.encode_resume_token(record)
+
+            self.assertEqual(controller.decode_resume_token(token),
+                             (record.get('processing_date'), 'a'))
+
+
+class LegacyKeysetPaginationTests(unittest.TestCase):
+    def setUp(self):
+        self.db = mongomock.MongoClient().db['journals']
+        self.db.insert_many([
+            {'code': '0000-0001', 'collection': 'scl'},
+            {'code': '0000-0002', 'collection': 'scl',
+             'processing_date': None},
+            {'code': '0000-0003', 'collection': 'scl',
+             'processing_date': '2017-09-14'},
+            {'code': '0000-0004', 'collection': 'scl',
+             'processing_date': '2017-09-15'},
+            {'code': '0000-0005', 'collection': 'scl',
+             'processing_date': datetime(2017, 9, 14)},
+        ])
+        self.journalmeta = controller.JournalMeta(self.db)
+
+    def test_pages_cover_the_legacy_records_once(self):
+        for limit in [1, 2, 3]:
+            result = self.journalmeta.identifiers(limit=limit)
+            codes = [i['code'] for i in result['objects']]
+            while result['meta']['resume_token']:
+                result = self.journalmeta.identifiers(
+                    limit=limit, resume_token=result['meta']['resume_token'])
+                codes.extend(i['code'] for i in result['objects'])
+
+            self.assertEqual(codes, ['0000-000%d' % i for i in range(1, 6)])
+            self.assertEqual(codes, [i['code'] for i in
+                                     self.journalmeta.identifiers()['objects']])
+
+
+class KeysetPaginationTests(unittest.TestCase):
+    def setUp(self):
+        self.db = mongomock.MongoClient().db['articles']
+        self.db.insert_many([
+            {'code': 'S0000-00002000000100%03d' % i, 'collection': 'scl',
+             'processing_date': datetime(2017, 9, 14 + i % 3)}
+            for i in range(10)])
+        self.articlemeta = controller.ArticleMeta(self.db, None, None)
+
+    def test_pages_by_resume_token_cover_all_records_once(self):
+        codes = []
+        result = self.articlemeta.identifiers(limit=3)
+        codes.extend(i['code'] for i in result['objects'])
+        while result['meta']['resume_token']:
+            result = self.articlemeta.identifiers(
+                limit=3, resume_token=result['meta']['resume_token'])
+            codes.extend(i['code'] for i in result['objects'])
+
+        self.assertEqual(len(codes), 10)
+        self.assertEqual(len(set(codes)), 10)
+
+    def test_resume_token_matches_offset_paging(self):
+        first = self.articlemeta.identifiers(limit=4)
+        by_offset = self.articlemeta.identifiers(limit=4, offset=4)
+        by_token = self.articlemeta.identifiers(
+            limit=4, resume_token=first['meta']['resume_token'])
+        self.assertEqual(by_offset['objects'], by_token['objects'])
+
+    def test_last_page_has_no_resume_token(self):
+        result = self.articlemeta.identifiers(limit=20)
+        self.assertIsNone(result['meta']['resume_token'])
+
+
+class CountDocumentsTests(unittest.TestCase):
+    def setUp(self):
+        controller._count_cache.clear()
+        self.db = mongomock.MongoClient().db['articles']
+        self.db.insert_many([{'collection': 'scl'}, {'collection': 'scl'},
+                             {'collection': 'spa'}])
+
+    def test_exact_count(self):
+        self.assertEqual(
+            controller.count_documents(self.db, {'collection': 'scl'}), 2)
+
+    def test_count_false_skips_the_count(self):
+        self.assertIsNone(controller.count_documents(
+            self.db, {'collection': 'scl'}, count='false'))
+
+    def test_estimated_count_without_filter(self):
+        self.assertEqual(
+            controller.count_documents(self.db, {}, count='estimated'), 3)
+
+    def test_estimated_count_is_cached_by_filter(self):
+        fltr = {'collection': 'scl'}
+        self.assertEqual(
+            controller.count_documents(self.db, fltr, count='estimated'), 2)
+        self.db.insert_one({'collection': 'scl'})
+        self.assertEqual(
+            controller.count_documents(self.db, fltr, count='estimated'), 2)
+        self.assertEqual(controller.count_documents(self.db, fltr), 3)
+
+    def test_listing_without_total(self):
+        articlemeta = controller.ArticleMeta(self.db, None, None)
+        self.db.update_many({}, {'$set': {
+            'code': 'S0000-00002000000100001',
+            'processing_date': datetime(2017, 9, 14)}})
+        result = articlemeta.identifiers(count='false')
+        self.assertIsNone(result['meta']['total'])
+        self.assertEqual(len(result['objects']), 3)
+
+
+class BatchJoinTests(unittest.TestCase):
+    def setUp(self):
+        db = mongomock.MongoClient().db
+        db['journals'].insert_many([
+            {'code': '0000-0000', 'collection': 'scl', 'title': 'Journal scl'},
+            {'code': '1111-1111', 'collection': 'scl', 'title': 'Journal 1'},
+            {'code': '1111-1111', 'collection': 'spa', 'title': 'Journal 1'},
+        ])
+        db['issues'].insert_many([
+            {'code': '0000-000020000001', 'collection': 'scl', 'label': 'scl'},
+            {'code': '0000-000020000001', 'collection': 'spa', 'label': 'spa'},
+        ])
+        db['articles'].insert_many([
+            {'code': 'S0000-00002000000100001', 'collection': collection,
+             'code_issue': '0000-000020000001',
+             'title': {'v400': [{'_': issn}]},
+             'processing_date': datetime(2017, 9, 14)}
+            for collection, issn in [('scl', '0000-0000'), ('spa', '1111-1111')]
+        ])
+        self.journalmeta = controller.JournalMeta(db['journals'])
+        self.issuemeta = controller.IssueMeta(db['issues'], self.journalmeta)
+        self.articlemeta = controller.ArticleMeta(
+            db['articles'], self.journalmeta, self.issuemeta)
+
+    def test_issues_get_many_is_keyed_by_collection_and_code(self):
+        issues = self.issuemeta.get_many(['0000-000020000001'])
+        self.assertEqual(issues[('scl', '0000-000020000001')]['label'], 'scl')
+        self.assertEqual(issues[('spa', '0000-000020000001')]['label'], 'spa')
+
+    def test_journals_get_many_groups_by_issn(self):
+        journals = self.journalmeta.get_many(['0000-0000', '1111-1111'])
+        self.assertEqual(len(journals['0000-0000']), 1)
+        self.assertEqual(len(journals['1111-1111']), 2)
+
+    def test_get_articles_full_joins_issue_of_the_article_collection(self):
+        result = self.articlemeta.get_articles_full(
+            replace_journal_metadata=True)
+        issues = {i['collection']: i['issue']['label'] for i in result['objects']}
+        self.assertEqual(issues, {'scl': 'scl', 'spa': 'spa'})
+
+    def test_get_articles_full_replaces_journal_of_the_article_collection(self):
+        result = self.articlemeta.get_articles_full(
+            replace_journal_metadata=True)
+        titles = {i['collection']: i['title'] for i in result['objects']}
+        self.assertEqual(titles['scl']['title'], 'Journal scl')
+        self.assertEqual(titles['spa']['collection'], 'spa')
+
+    def test_issue_of_another_collection_is_not_joined(self):
+        self.articlemeta.db.insert_one(
+            {'code': 'S0000-00002000000100002', 'collection': 'mex',
+             'code_issue': '0000-000020000001',
+             'title': {'v400': [{'_': '0000-0000'}]},
+             'processing_date': datetime(2017, 9, 15)})
+
+        articles = list(self.articlemeta.iter_articles_full(
+            until_date='2020-01-01'))
+        issues = {i['collection']: i.get('issue') for i in articles}
+
+        self.assertIsNone(issues['mex'])
+        self.assertEqual(issues['scl']['label'], 'scl')
+
+
+class MetadataCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.db = mongomock.MongoClient().db
+        self.db['journals'].insert_one(
+            {'code': '0000-0000', 'collection': 'scl', 'title': 'Journal'})
+        self.db['issues'].insert_one(
+            {'code': '0000-000020000001', 'collection': 'scl', 'label': 'v1'})
+        self.journal_cache = cache.ReplicaAwareCache()
+        self.issue_cache = cache.ReplicaAwareCache()
+        self.journalmeta = controller.JournalMeta(
+            self.db['journals'], cache=self.journal_cache)
+        self.issuemeta = controller.IssueMeta(
+            self.db['issues'], self.journalmeta, cache=self.issue_cache)
+
+    def test_issue_get_is_served_from_cache(self):
+        self.issuemeta.get('0000-000020000001', collection='scl')
+        self.db['issues'].update_one(
+            {'code': '0000-000020000001'}, {'$set': {'label': 'v2'}})
+
+        issue = self.issuemeta.get('0000-000020000001', collection='scl')
+
+        self.assertEqual(issue['label'], 'v1')
+        self.assertEqual(self.issue_cache.stats['hits'], 1)
+
+    def test_cached_issue_is_not_shared_with_callers(self):
+        issue = self.issuemeta.get('0000-000020000001', collection='scl')
+        del issue['label']
+
+        issue = self.issuemeta.get('0000-000020000001', collection='scl')
+
+        self.assertEqual(issue['label'], 'v1')
+
+    def test_issue_update_invalidates_cache(self):
+        self.issuemeta.get('0000-000020000001', collection='scl')
+        self.issuemeta.get('0000-000020000001')
+
+        self.issuemeta.delete('0000-000020000001', collection='scl')
+
+        self.assertNotIn(('scl', '0000-000020000001'), self.issue_cache)
+        self.assertNotIn((None, '0000-000020000001'), self.issue_cache)
+        self.assertIsNone(
+            self.issuemeta.get('0000-000020000001', collection='scl'))
+
+    def test_issue_get_many_fills_cache(self):
+        self.issuemeta.get_many(['0000-000020000001'], collection='scl')
+
+        self.assertIn(('scl', '0000-000020000001'), self.issue_cache)
+
+    def test_journal_get_is_served_from_cache(self):
+        self.journalmeta.get(collection='scl', issn='0000-0000')
+        self.db['journals'].delete_many({})
+
+        journals = self.journalmeta.get(collection='scl', issn='0000-0000')
+
+        self.assertEqual(journals[0]['title'], 'Journal')
+
+    def test_journal_delete_invalidates_cache(self):
+        self.journalmeta.get(collection='scl', issn='0000-0000')
+
+        self.journalmeta.delete('0000-0000', collection='scl')
+
+        self.assertEqual(
+            self.journalmeta.get(collection='scl', issn='0000-0000'), [])
+
+
+class StreamTests(unittest.TestCase):
+    def setUp(self):
+        db = mongomock.MongoClient().db
+        db['journals'].insert_one(
+            {'code': '0000-0000', 'collection': 'scl', 'title': 'Journal',
+             'processing_date': datetime(2017, 1, 1)})
+        db['issues'].insert_one(
+            {'code': '0000-000020000001', 'collection': 'scl',
+             'code_title': '0000-0000', 'label': 'v1',
+             'processing_date': datetime(2017, 1, 1)})
+        db['articles'].insert_many([
+            {'code': 'S0000-0000200000010000%d' % i, 'collection': 'scl',
+             'code_issue': '0000-000020000001', 'code_title': '0000-0000',
+             'title': {'v400': [{'_': '0000-0000'}]}, 'body': {'pt': 'text'},
+             'processing_date': datetime(2017, 1, 5 - i)}
+            for i in range(5)
+        ])
+        journalmeta = controller.JournalMeta(db['journals'])
+        self.issuemeta = controller.IssueMeta(db['issues'], journalmeta)
+        self.journalmeta = journalmeta
+        self.articlemeta = controller.ArticleMeta(
+            db['articles'], journalmeta, self.issuemeta)
+
+    def test_iter_articles_full_yields_every_article_in_processing_order(self):
+        articles = list(self.articlemeta.iter_articles_full(
+            until_date='2020-01-01', batch_size=2))
+
+        self.assertEqual(
+            [article['processing_date'] for article in articles],
+            ['2017-01-01', '2017-01-02', '2017-01-03', '2017-01-04',
+             '2017-01-05'])
+
+    def test_iter_articles_full_joins_issue_and_journal(self):
+        article = next(self.articlemeta.iter_articles_full(
+            until_date='2020-01-01', replace_journal_metadata=True,
+            batch_size=2))
+
+        self.assertEqual(article['issue']['label'], 'v1')
+        self.assertEqual(article['title']['title'], 'Journal')
+        self.assertNotIn('body', article)
+
+    def test_iter_articles_full_with_body(self):
+        article = next(self.articlemeta.iter_articles_full(
+            until_date='2020-01-01', body=True))
+
+        self.assertEqual(article['body'], {'pt': 'text'})
+
+    def test_iter_articles_full_applies_filters(self):
+        articles = list(self.articlemeta.iter_articles_full(
+            from_date='2017-01-04', until_date='2020-01-01'))
+
+        self.assertEqual(len(articles), 2)
+
+    def test_iter_issues_full(self):
+        issues = list(self.issuemeta.iter_issues_full(
+            issn='0000-0000', until_date='2020-01-01'))
+
+        self.assertEqual(issues[0]['label'], 'v1')
+        self.assertEqual(issues[0]['processing_date'], '2017-01-01')
+
+    def test_iter_journals(self):
+        journals = list(self.journalmeta.iter_journals(collection='scl'))
+
+        self.assertEqual(journals[0]['title'], 'Journal')
+
+
+class ArticlesGetManyTests(unittest.TestCase):
+    def setUp(self):
+        db = mongomock.MongoClient().db
+        db['journals'].insert_many([
+            {'code': '0000-0000', 'collection': 'scl', 'title': 'Journal scl'},
+            {'code': '0000-0000', 'collection': 'spa', 'title': 'Journal spa'},
+        ])
+        db['issues'].insert_one(
+            {'code': '0000-000020000001', 'collection': 'scl', 'label': 'v1',
+             'title': {'v400': [{'_': '0000-0000'}]}})
+        db['articles'].insert_many([
+            {'code': 'S0000-00002000000100001', 'collection': 'scl',
+             'doi': '10.1590/A', 'aid': 'aid1',
+             'title': {'v400': [{'_': '0000-0000'}]}, 'body': {'pt': 'text'},
+             'processing_date': datetime(2017, 1, 1)},
+            {'code': 'S0000-00002000000100002', 'collection': 'spa',
+             'title': {'v400': [{'_': '0000-0000'}]},
+             'processing_date': datetime(2017, 1, 2)},
+        ])
+        journalmeta = controller.JournalMeta(db['journals'])
+        issuemeta = controller.IssueMeta(db['issues'], journalmeta)
+        self.articlemeta = controller.ArticleMeta(
+            db['articles'], journalmeta, issuemeta)
+
+    def test_results_follow_input_order_and_flag_misses(self):
+        result = self.articlemeta.get_many(
+            ['S0000-00002000000100002', 'missing', 'S0000-00002000000100001'])
+
+        codes = [i and i['code'] for i in result['objects']]
+        self.assertEqual(codes, ['S0000-00002000000100002', None,
+                                 'S0000-00002000000100001'])
+        self.assertEqual(result['meta'],
+                         {'total': 3, 'found': 2, 'not_found': ['missing']})
+
+    def test_resolves_doi_and_aid(self):
+        result = self.articlemeta.get_many(['10.1590/A', 'aid1'])
+
+        self.assertEqual([i['code'] for i in result['objects']],
+                         ['S0000-00002000000100001'] * 2)
+
+    def test_filters_by_collection(self):
+        result = self.articlemeta.get_many(
+            ['S0000-00002000000100001', 'S0000-00002000000100002'],
+            collection='scl')
+
+        self.assertEqual(result['meta']['not_found'],
+                         ['S0000-00002000000100002'])
+
+    def test_joins_issue_and_journal_of_the_article_collection(self):
+        result = self.articlemeta.get_many(
+            ['S0000-00002000000100001', 'S0000-00002000000100002'],
+            replace_journal_metadata=True)
+
+        scl, spa = result['objects']
+        self.assertEqual(scl['title']['title'], 'Journal scl')
+        self.assertEqual(spa['title']['title'], 'Journal spa')
+        self.assertEqual(scl['issue']['label'], 'v1')
+        self.assertNotIn('title', scl['issue'])
+        self.assertNotIn('issue', spa)
+
+    def test_body_is_only_returned_when_asked(self):
+        code = 'S0000-00002000000100001'
+
+        self.assertNotIn(
+            'body', self.articlemeta.get_many([code])['objects'][0])
+        self.assertIn(
+            'body', self.articlemeta.get_many([code], body=True)['objects'][0])
+
+    def test_same_result_as_get(self):
+        code = 'S0000-00002000000100001'
+
+        self.assertEqual(
+            self.articlemeta.get_many(
+                [code], replace_journal_metadata=True)['objects'][0],
+            self.articlemeta.get(code, replace_journal_metadata=True))
+
+
+class IdentifierResolutionTests(unittest.TestCase):
+    def setUp(self):
+        self.db = mongomock.MongoClient().db
+        self.db['articles'].insert_many([
+            {'code': 'S0000-00002000000100001', 'collection': 'scl',
+             'doi': '10.1590/ABC.1', 'aid': 'aid1',
+             'title': {'v400': [{'_': '0000-0000'}]}},
+            {'code': 'S0000-00002000000100002', 'collection': 'scl',
+             'doi': '10.1590/legacy.2',
+             'title': {'v400': [{'_': '0000-0000'}]}},
+            {'code': 'legacy-code', 'collection': 'scl',
+             'title': {'v400': [{'_': '0000-0000'}]}},
+        ])
+        journalmeta = controller.JournalMeta(self.db['journals'])
+        issuemeta = controller.IssueMeta(self.db['issues'], journalmeta)
+        self.articlemeta = controller.ArticleMeta(
+            self.db['articles'], journalmeta, issuemeta)
+
+    def test_identifier_type(self):
+        self.assertEqual(
+            controller.identifier_type('S0100-879X1998000800011'), 'code')
+        self.assertEqual(
+            controller.identifier_type('s0100-879x1998000800011'), 'code')
+        self.assertEqual(
+            controller.identifier_type('10.1590/S0100-879X1998000800011'),
+            'doi')
+        self.assertEqual(controller.identifier_type('a1b2c3'), 'aid')
+
+    def test_get_identifier_filters_does_not_use_or(self):
+        for code in ['S0100-879X1998000800011', '10.1590/x', 'a1b2c3']:
+            for fltr in controller.get_identifier_filters(code):
+                self.assertNotIn('$or', fltr)
+                self.assertEqual(len(fltr), 1)
+
+    def test_get_by_pid(self):
+        article = self.articlemeta.get('S0000-00002000000100001')
+        self.assertEqual(article['aid'], 'aid1')
+
+    def test_get_by_lower_case_doi(self):
+        article = self.articlemeta.get('10.1590/abc.1')
+        self.assertEqual(article['code'], 'S0000-00002000000100001')
+
+    def test_get_by_legacy_not_normalized_doi(self):
+        article = self.articlemeta.get('10.1590/legacy.2')
+        self.assertEqual(article['code'], 'S0000-00002000000100002')
+
+    def test_get_by_aid(self):
+        article = self.articlemeta.get('aid1')
+        self.assertEqual(article['code'], 'S0000-00002000000100001')
+
+    def test_get_falls_back_to_code_for_non_pid_codes(self):
+        article = self.articlemeta.get('legacy-code')
+        self.assertEqual(article['code'], 'legacy-code')
+
+    def test_get_not_found(self):
+        self.assertIsNone(self.articlemeta.get('10.1590/missing'))
+        self.assertIsNone(self.articlemeta.get('S0000-00002000000199999'))
+
+    def test_get_many_resolves_every_identifier_type(self):
+        result = self.articlemeta.get_many(
+            ['10.1590/abc.1', 'aid1', 'legacy-code',
+             'S0000-00002000000100002', '10.1590/missing'])
+
+        self.assertEqual(
+            [i and i['code'] for i in result['objects']],
+            ['S0000-00002000000100001', 'S0000-00002000000100001',
+             'legacy-code', 'S0000-00002000000100002', None])
+
+
+class RenderedExportTests(unittest.TestCase):
+    def setUp(self):
+        self.broker = controller.DataBroker(
+            mongomock.MongoClient().db,
+            render_cache=cache.RenderedExportCache())
+        self.article = {
+            'code': 'S0000-00002000000100001', 'collection': 'scl',
+            'processing_date': '2017-01-01',
+            'title': {'processing_date': '2016-01-01'},
+            'issue': {'updated_at': '2017-02-01'},
+        }
+
+    def render_count(self):
+        calls = []
+
+        def render(export, fmt):
+            calls.append(fmt)
+            return '<%s/>' % fmt
+
+        patcher = mock.patch.object(controller.Export, 'render', render)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        return calls
+
+    def test_get_export_version(self):
+        self.assertEqual(controller.get_export_version(self.article),
+                         '2017-01-01|2016-01-01|2017-02-01|')
+
+    def test_two_updates_on_the_same_day_change_the_version(self):
+        broker = controller.DataBroker(mongomock.MongoClient().db)
+        metadata = {
+            'code': 'S0000-00002000000100001', 'collection': 'scl',
+            'processing_date': datetime(2017, 1, 1), 'article': {}}
+        versions = []
+
+        with mock.patch.object(controller.ArticleMeta, 'check',
+                               side_effect=lambda metadata: dict(metadata)):
+            for _ in range(2):
+                broker.articlemeta.update(metadata)
+                article = broker.get_article('S0000-00002000000100001')
+                versions.append(article.export_version)
+
+        broker.set_aid('S0000-00002000000100001', 'scl', 'aid1')
+        versions.append(
+            broker.get_article('S0000-00002000000100001').export_version)
+
+        self.assertEqual(article['updated_at'], datetime.now().date().isoformat())
+        self.assertEqual(len(set(versions)), 3)
+        self.assertTrue(versions[2].startswith('%s#3' % broker.db[
+            'articles'].find_one()['updated_at']))
+
+    def test_render_article_uses_the_version_of_the_record(self):
+        calls = self.render_count()
+        article = controller.ArticleDocument(self.article)
+
+        for version in ['v1', 'v1', 'v2']:
+            article.export_version = version
+            self.broker.render_article(article, 'xmlwos')
+
+        self.assertEqual(len(calls), 2)
+
+    def test_render_article_is_cached(self):
+        calls = self.render_count()
+
+        self.broker.render_article(self.article, 'xmlwos')
+        result = self.broker.render_article(self.article, 'xmlwos')
+
+        self.assertEqual(result, '<xmlwos/>')
+        self.assertEqual(calls, ['xmlwos'])
+
+    def test_changes_invalidate_rendered_articles(self):
+        calls = self.render_count()
+
+        for document_type, code in [
+                ('article', 'S0000-00002000000100001'),
+                ('issue', '0000-000020000001'),
+                ('journal', '0000-0000')]:
+            self.broker.render_article(self.article, 'xmlwos')
+            self.broker._invalidate_rendered(document_type, code, 'scl')
+
+        self.broker.render_article(self.article, 'xmlwos')
+
+        self.assertEqual(len(calls), 4)
+
+    def test_render_article_without_cache(self):
+        calls = self.render_count()
+        self.broker.render_cache = None
+
+        self.broker.render_article(self.article, 'xmlwos')
+        self.broker.render_article(self.article, 'xmlwos')
+
+        self.assertEqual(len(calls), 2)
+
+
+class ReadRoutingTests(unittest.TestCase):
+    def setUp(self):
+        controller._journal_cache.clear()
+        controller._issue_cache.clear()
+        self.primary = mongomock.MongoClient().db
+        self.replica = mongomock.MongoClient().db
+        self.broker = controller.DataBroker(self.primary, read_db=self.replica)
+        self.article = {
+            'code': 'S0000-00002000000100001', 'collection': 'scl',
+            'code_issue': '0000-000020000001', 'code_title': ['0000-0000'],
+            'processing_date': datetime(2017, 1, 1),
+            'article': {}, 'title': {}
+        }
+
+    def test_queries_use_the_read_handle(self):
+        self.replica['articles'].insert_one(dict(self.article))
+        self.replica['historychanges_article'].insert_one(
+            {'code': 'S0000-00002000000100001', 'collection': 'scl',
+             'event': 'add', 'date': datetime(2017, 1, 1)})
+
+        article = self.broker.get_article('S0000-00002000000100001',
+                                          collection='scl')
+        identifiers = self.broker.identifiers_article(collection='scl')
+        history = self.broker.historychanges('article', collection='scl')
+
+        self.assertEqual(article['code'], 'S0000-00002000000100001')
+        self.assertEqual(identifiers['meta']['total'], 1)
+        self.assertEqual(history['meta']['total'], 1)
+        self.assertTrue(self.broker.exists_article('S0000-00002000000100001'))
+
+    def test_changes_use_the_write_handle(self):
+        self.primary['articles'].insert_one(dict(self.article))
+
+        self.broker.set_aid('S0000-00002000000100001', 'scl', 'aid1')
+        self.broker.delete_article('S0000-00002000000100001', collection='scl')
+
+        self.assertEqual(self.primary['articles'].count_documents({}), 0)
+        self.assertEqual(
+            self.primary['historychanges_article'].count_documents({}), 1)
+        self.assertEqual(
+            self.replica['historychanges_article'].count_documents({}), 0)
+
+    def test_add_checks_existence_on_the_write_handle(self):
+        self.replica['articles'].insert_one(dict(self.article))
+        metadata = dict(self.article)
+
+        with mock.patch.object(controller.ArticleMeta, 'check',
+                               side_effect=lambda metadata: dict(metadata)):
+            result = self.broker.articlemeta.add(metadata)
+
+        self.assertIn('created_at', result)
+        self.assertEqual(self.primary['articles'].count_documents({}), 1)
+
+    def test_changed_journal_is_cached_from_the_write_handle(self):
+        journal = {'code': '0000-0000', 'collection': 'scl', 'title': 'Old'}
+        self.primary['journals'].insert_one(dict(journal))
+        self.replica['journals'].insert_one(dict(journal))
+        journalmeta = self.broker.journalmeta
+
+        self.assertEqual(journalmeta.get('scl', '0000-0000')[0]['title'], 'Old')
+
+        # the replica has not received the update yet.
+        with mock.patch.object(controller.JournalMeta, 'check',
+                               side_effect=lambda metadata: dict(metadata)):
+            journalmeta.add(dict(journal, title='New'))
+
+        self.assertEqual(journalmeta.get('scl', '0000-0000')[0]['title'], 'New')
+        self.assertEqual(
+            journalmeta.get_many(['0000-0000'])['0000-0000'][0]['title'], 'New')
+        # cached from the primary.
+        self.assertEqual(journalmeta.get('scl', '0000-0000')[0]['title'], 'New')
+
+    def test_changed_issue_is_cached_from_the_write_handle(self):
+        issue = {'code': '0000-000020000001', 'collection': 'scl',
+                 'issue': {'v31': [{'_': 'old'}]}}
+        self.primary['issues'].insert_one(dict(issue))
+        self.replica['issues'].insert_one(dict(issue))
+        issuemeta = self.broker.issuemeta
+        key = ('scl', '0000-000020000001')
+
+        self.assertEqual(issuemeta.get_many([key[1]], 'scl')[key]['issue'],
+                         {'v31': [{'_': 'old'}]})
+
+        self.primary['issues'].update_one(
+            {'code': key[1]}, {'$set': {'issue.v31': [{'_': 'new'}]}})
+        issuemeta._invalidate(key[1], 'scl')
+
+        self.assertEqual(issuemeta.get_many([key[1]], 'scl')[key]['issue'],
+                         {'v31': [{'_': 'new'}]})
+        self.assertEqual(issuemeta.get(key[1], 'scl')['issue'],
+                         {'v31': [{'_': 'new'}]})
+
+    def test_without_read_handle(self):
+        broker = controller.DataBroker(self.primary)
+        self.primary['articles'].insert_one(dict(self.article))
+
+        self.assertIs(broker.read_db, self.primary)
+        self.assertTrue(broker.exists_article('S0000-00002000000100001'))
+
+
+class FakeTimer(object):
+
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+class PublicationStatusTests(unittest.TestCase):
+    def setUp(self):
+        self.timer = FakeTimer()
+        self.status = controller.PublicationStatus(
+            host='http://ps', background=False, timer=self.timer)
+        patcher = mock.patch.object(controller.requests.Session, 'get')
+        self.get = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.get.return_value.json.return_value = {
+            'status': {'buckets': [{'key': 'current', 'doc_count': 3}]}}
+
+    def test_counts_are_fetched_in_background(self):
+        self.assertEqual(self.status.journals_count('scl'), {})
+        self.get.assert_not_called()
+
+        self.status.refresh()
+
+        self.assertEqual(self.status.journals_count('scl'), {'current': 3})
+        self.assertEqual(self.get.call_args[0][0],
+                         'http://ps/api/v1/journals?aggs=status&collection=scl')
+
+    def test_counts_are_refreshed_after_the_ttl(self):
+        self.status.journals_count('scl')
+        self.status.refresh()
+        self.status.refresh()
+        self.assertEqual(self.get.call_count, 1)
+
+        self.timer.now += self.status.ttl
+        self.get.return_value.json.return_value = {
+            'status': {'buckets': [{'key': 'current', 'doc_count': 4}]}}
+        self.status.refresh()
+
+        self.assertEqual(self.get.call_count, 2)
+        self.assertEqual(self.status.journals_count('scl'), {'current': 4})
+
+    def test_failures_keep_the_last_count(self):
+        self.status.journals_count('scl')
+        self.status.refresh()
+
+        self.timer.now += self.status.ttl
+        self.get.side_effect = controller.requests.exceptions.Timeout()
+        self.status.refresh()
+
+        self.assertEqual(self.status.journals_count('scl'), {'current': 3})
+
+    def test_counts_are_fetched_concurrently(self):
+        def get(url, timeout):
+            time.sleep(0.2)
+            return self.get.return_value
+
+        self.get.side_effect = get
+        for collection in ['scl', 'arg', 'mex', 'cub', 'esp']:
+            self.status.journals_count(collection)
+
+        started = time.monotonic()
+        pending = self.status.refresh()
+
+        self.assertEqual(pending, [])
+        self.assertLess(time.monotonic() - started, 0.6)
+        self.assertEqual(self.get.call_count, 5)
+        self.assertEqual(self.status.journals_count('esp'), {'current': 3})
+
+    def test_refresh_deadline(self):
+        self.status.deadline = 0.05
+
+        def get(url, timeout):
+            time.sleep(0.3)
+            return self.get.return_value
+
+        self.get.side_effect = get
+        self.status.journals_count('scl')
+
+        self.assertEqual(self.status.refresh(), [('journals', 'scl')])
+        self.assertEqual(self.status.journals_count('scl'), {})
+        # a consulta em andamento não é repetida.
+        self.assertEqual(self.status.refresh(), [])
+
+        for _ in range(100):
+            if self.status.journals_count('scl'):
+                break
+            time.sleep(0.01)
+
+        self.assertEqual(self.status.journals_count('scl'), {'current': 3})
+        self.assertEqual(self.get.call_count, 1)
+
+    def test_background_thread_waits_while_a_fetch_is_running(self):
+        self.status.deadline = 0.01
+        self.status.journals_count('scl')
+        self.status.refresh()
+
+        release = threading.Event()
+        self.addCleanup(release.set)
+
+        def get(url, timeout):
+            release.wait(5)
+            return self.get.return_value
+
+        self.get.side_effect = get
+        self.timer.now += self.status.ttl
+        self.assertEqual(self.status.refresh(), [('journals', 'scl')])
+
+        with mock.patch.object(self.status, 'refresh') as refresh:
+            thread = threading.Thread(target=self.status._run, daemon=True)
+            thread.start()
+            time.sleep(0.2)
+            calls = refresh.call_count
+
+        self.assertLessEqual(calls, 1)
+
+    def test_background_refresh(self):
+        status = controller.PublicationStatus(host='http://ps')
+        self.get.return_value.json.return_value = {
+            'collection': {'buckets': [{'key': 'scl', 'doc_count': 10}]}}
+
+        self.assertEqual(status.documents_count(), {})
+
+        for _ in range(200):
+            if status.documents_count():
+                break
+            time.sleep(0.01)
+
+        self.assertEqual(status.documents_count(), {'scl': 10})
+
+
+class CollectionMetaTests(unittest.TestCase):
+    def setUp(self):
+        self.pubstatus = mock.Mock()
+        self.pubstatus.documents_count.return_value = {'arg': 10}
+        self.pubstatus.journals_count.return_value = {'current': 2}
+        self.collectionmeta = controller.CollectionMeta(self.pubstatus)
+
+    def test_collections_file_is_read_once(self):
+        self.collectionmeta.identifiers()
+
+        with mock.patch('builtins.open') as mocked_open:
+            collections = self.collectionmeta.identifiers()
+
+        mocked_open.assert_not_called()
+        arg = [i for i in collections if i['acron'] == 'arg'][0]
+        self.assertEqual(arg['document_count'], 10)
+        self.assertEqual(arg['journal_count'], {'current': 2})
+
+    def test_returned_collections_are_copies(self):
+        self.collectionmeta.get('arg')['acron'] = 'changed'
+
+        self.assertEqual(self.collectionmeta.get('arg')['acron'], 'arg')
+
+    def test_changed_file_is_read_again(self):
+        import os
+        import tempfile
+
+        fd, filepath = tempfile.mkstemp(suffix='.json')
+        self.addCleanup(os.remove, filepath)
+        with os.fdopen(fd, 'w') as f:
+            json.dump([{'acron': 'abc', 'type': 'books'}], f)
+
+        collectionmeta = controller.CollectionMeta(self.pubstatus, filepath)
+        self.assertEqual(collectionmeta.get('abc'), {'acron': 'abc', 'type': 'books'})
+
+        with open(filepath, 'w') as f:
+            json.dump([{'acron': 'abc', 'type': 'books', 'name': 'ABC'}], f)
+        os.utime(filepath, ns=(0, 0))
+
+        self.assertEqual(collectionmeta.get('abc')['name'], 'ABC')
@@ -0,0 +1,61 @@
+# coding: utf-8
+import json
+import os
+import threading
+import unittest
+
+from articlemeta import export
+from articlemeta.export import Export
+
+
+class PipelinesTests(unittest.TestCase):
+
+    def setUp(self):
+        self._raw_json = json.loads(open(
+            os.path.dirname(__file__) + '/fixtures/article_meta.json').read())
+
+    def test_get_pipeline_is_built_once_per_thread(self):
+        self.assertIs(export.get_pipeline('xmlwos'),
+                      export.get_pipeline('xmlwos'))
+
+    def test_get_pipeline_is_not_shared_between_threads(self):
+        pipelines = []
+        thread = threading.Thread(
+            target=lambda: pipelines.append(export.get_pipeline('xmlwos')))
+        thread.start()
+        thread.join()
+
+        self.assertIsNot(pipelines[0], export.get_pipeline('xmlwos'))
+
+    def test_reused_pipeline_gives_the_same_result(self):
+        for fmt in ['xmlwos', 'xmlrsps', 'xmldoaj', 'xmlpubmed']:
+            first = Export(self._raw_json).render(fmt)
+            second = Export(self._raw_json).render(fmt)
+
+            self.assertEqual(first, second)
+
+    def test_run_many_gives_the_same_results_as_render(self):
+        for fmt in ['xmlwos', 'xmlrsps', 'xmldoaj', 'xmlpubmed']:
+            expected = Export(self._raw_json).render(fmt)
+
+            results = list(Export.run_many(
+                [self._raw_json, self._raw_json], fmt))
+
+            self.assertEqual(results, [(expected, None), (expected, None)])
+
+    def test_run_many_returns_the_error_of_each_article(self):
+        results = list(Export.run_many(
+            [{'article': {}}, self._raw_json], 'xmlwos'))
+
+        self.assertIsNone(results[0][0])
+        self.assertIsInstance(results[0][1], Exception)
+        self.assertEqual(results[1],
+                         (Export(self._raw_json).render('xmlwos'), None))
+
+    def test_run_many_with_unknown_format(self):
+        with self.assertRaises(ValueError):
+            Export.run_many([self._raw_json], 'xmlunknown')
+
+    def test_render_with_unknown_format(self):
+        with self.assertRaises(ValueError):
+            Export(self._raw_json).render('xmlunknown')
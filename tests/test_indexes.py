@@ -0,0 +1,93 @@
+# coding: utf-8
+import unittest
+
+import mongomock
+import pymongo
+
+from articlemeta import indexes
+
+INDEXES = {
+    'articles': [
+        [[('code', pymongo.ASCENDING)], {'background': True}],
+        [[('code', pymongo.ASCENDING), ('collection', pymongo.ASCENDING)], {'unique': True, 'background': True}],
+    ],
+    'issues': [
+        [[('code', pymongo.ASCENDING)], {'background': True}],
+    ]
+}
+
+
+class EnsureIndexesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.db = mongomock.MongoClient().db
+
+    def keys(self, collection):
+        return sorted(
+            (info['key'], bool(info.get('unique')))
+            for name, info in self.db[collection].index_information().items()
+            if name != '_id_')
+
+    def test_missing_indexes_are_created(self):
+        differences = indexes.ensure_indexes(self.db, indexes=INDEXES)
+
+        self.assertEqual(len(differences['articles']['missing']), 2)
+        self.assertEqual(self.keys('articles'), [
+            ([('code', 1)], False),
+            ([('code', 1), ('collection', 1)], True)])
+        self.assertEqual(self.keys('issues'), [([('code', 1)], False)])
+        self.assertEqual(indexes.get_schema_version(self.db),
+                         indexes.SCHEMA_VERSION)
+
+    def test_nothing_to_do(self):
+        indexes.ensure_indexes(self.db, indexes=INDEXES)
+
+        self.assertEqual(indexes.diff(self.db, indexes=INDEXES), {})
+        self.assertEqual(indexes.ensure_indexes(self.db, indexes=INDEXES), {})
+
+    def test_dry_run(self):
+        differences = indexes.ensure_indexes(self.db, dry_run=True,
+                                             indexes=INDEXES)
+
+        self.assertEqual(sorted(differences), ['articles', 'issues'])
+        self.assertEqual(self.keys('articles'), [])
+        self.assertIsNone(indexes.get_schema_version(self.db))
+
+    def test_extra_indexes(self):
+        self.db['issues'].create_index([('label', 1)], name='label_1')
+
+        differences = indexes.ensure_indexes(self.db, indexes=INDEXES)
+        self.assertEqual(differences['issues']['extra'], ['label_1'])
+        self.assertIn(([('label', 1)], False), self.keys('issues'))
+
+        indexes.ensure_indexes(self.db, drop_extra=True, indexes=INDEXES)
+        self.assertEqual(self.keys('issues'), [([('code', 1)], False)])
+
+    def test_index_with_other_options(self):
+        self.db['articles'].create_index([('code', 1), ('collection', 1)])
+
+        indexes.ensure_indexes(self.db, indexes=INDEXES)
+
+        self.assertIn(([('code', 1), ('collection', 1)], False),
+                      self.keys('articles'))
+        self.assertIsNone(indexes.get_schema_version(self.db))
+
+        indexes.ensure_indexes(self.db, drop_extra=True, indexes=INDEXES)
+
+        self.assertIn(([('code', 1), ('collection', 1)], True),
+                      self.keys('articles'))
+        self.assertEqual(indexes.diff(self.db, indexes=INDEXES), {})
+
+    def test_check_schema_version(self):
+        with self.assertLogs('articlemeta.indexes', level='WARNING'):
+            self.assertFalse(indexes.check_schema_version(self.db))
+
+        indexes.ensure_indexes(self.db, indexes=INDEXES)
+
+        self.assertTrue(indexes.check_schema_version(self.db))
+
+    def test_declared_indexes(self):
+        indexes.ensure_indexes(self.db)
+
+        self.assertEqual(indexes.diff(self.db), {})
+        self.assertEqual(len(self.keys('articles')), 17)
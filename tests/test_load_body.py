@@ -2,8 +2,11 @@
 import unittest
 import os
 import codecs
+from unittest import mock
 
-from processing import load_body
+import mongomock
+
+from processing import load_body, checkpoints
 
 
 class LoadLicensesTest(unittest.TestCase):
@@ -16,6 +19,33 @@ class LoadLicensesTest(unittest.TestCase):
 
         self.assertEqual(result, '<div class="title">Crazy <i>Title</i></div><p>Crazy Body</p><p>Really Crazy Body</p>')
 
+    def test_scrap_body_declared_charset(self):
+
+        data = u"""<html><head><meta http-equiv="Content-Type" content="text/html; charset=iso-8859-1"></head><body><div class="content"><div class="index,pt"><p>Tributação &amp; carvão</p></div></div></body></html>"""
+
+        result = load_body.scrap_body(data.encode('latin-1'), 'pt')
+
+        self.assertEqual(result, u'<p>Tributação &amp; carvão</p>')
+
+    def test_detect_encoding(self):
+        self.assertEqual(load_body.detect_encoding(
+            b'<meta charset="ISO-8859-1"><p>\xe7</p>'), 'iso8859-1')
+        self.assertEqual(load_body.detect_encoding(
+            b'<?xml version="1.0" encoding="windows-1252"?><p/>'), 'cp1252')
+        self.assertEqual(load_body.detect_encoding(
+            u'<p>ação</p>'.encode('utf-8')), 'utf-8')
+        self.assertEqual(load_body.detect_encoding(
+            b'\xef\xbb\xbf<p/>'), 'utf-8-sig')
+
+    def test_detect_encoding_without_declaration(self):
+        data = u'<p>Tributação na produção de carvão vegetal</p>'.encode('latin-1') * 20
+
+        with mock.patch.object(load_body.chardet, 'detect',
+                               return_value={'encoding': 'ISO-8859-1'}) as detect:
+            self.assertEqual(load_body.detect_encoding(data), 'ISO-8859-1')
+
+        detect.assert_called_once_with(data[:load_body.CHARDET_SNIFF_SIZE])
+
     def test_regex_remove_links1(self):
         import re
 
@@ -167,3 +197,185 @@ class LoadLicensesTest(unittest.TestCase):
         self.assertTrue(u'caso da bacia    do Amazonas' in result)
         # Text on the end of the document
         self.assertTrue(u'com o Embasamento. Universidade Federal' in result)
+
+
+class FakeDocument(object):
+
+    def __init__(self, code, html, _id=None):
+        self.data = {'_id': _id}
+        self.publisher_id = code
+        self.collection_acronym = 'scl'
+        self._html = html
+
+    def fulltexts(self):
+        return {'html': self._html} if self._html else None
+
+
+def page(language, body):
+    return (u'<html><body><div class="content"><div class="index,%s">%s</div></div></body></html>' % (language, body)).encode('utf-8')
+
+
+class AddBodiesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.db = mongomock.MongoClient()['articlemeta']
+        self.db['articles'].insert_many([
+            {'code': 'S0000-00002000000100001', 'collection': 'scl'},
+            {'code': 'S0000-00002000000100002', 'collection': 'scl'},
+            {'code': 'S0000-00002000000100003', 'collection': 'scl'},
+        ])
+        self.pages = {
+            'http://a.org/1/en': page('en', '<p>One</p>'),
+            'http://a.org/1/pt': page('pt', '<p>Um</p>'),
+            'http://b.org/2/en': page('en', '<p>Two</p>'),
+        }
+
+    def fake_request(self, url, json=True, client=None):
+        return self.pages.get(url)
+
+    def test_add_bodies_writes_in_batches(self):
+        documents = [
+            FakeDocument('S0000-00002000000100001', {
+                'en': 'http://a.org/1/en', 'pt': 'http://a.org/1/pt'}),
+            FakeDocument('S0000-00002000000100002', {'en': 'http://b.org/2/en'}),
+            FakeDocument('S0000-00002000000100003', None),
+        ]
+
+        with mock.patch.object(load_body, 'do_request', self.fake_request), \
+                mock.patch.object(self.db['articles'], 'bulk_write',
+                                  wraps=self.db['articles'].bulk_write) as write:
+            written = load_body.add_bodies(
+                self.db, documents, 'scl', fetch_workers=2,
+                batch_size=1, client=mock.Mock())
+
+        self.assertEqual(written, 2)
+        self.assertEqual(write.call_count, 2)
+        self.assertEqual(
+            self.db['articles'].find_one({'code': 'S0000-00002000000100001'})['body'],
+            {'en': '<p>One</p>', 'pt': '<p>Um</p>'})
+        self.assertEqual(
+            self.db['articles'].find_one({'code': 'S0000-00002000000100002'})['body'],
+            {'en': '<p>Two</p>'})
+        self.assertNotIn(
+            'body', self.db['articles'].find_one({'code': 'S0000-00002000000100003'}))
+
+    def test_add_bodies_skips_partially_scraped_documents(self):
+        documents = [
+            FakeDocument('S0000-00002000000100001', {
+                'en': 'http://a.org/1/en', 'es': 'http://a.org/1/es'}),
+        ]
+
+        with mock.patch.object(load_body, 'do_request', self.fake_request):
+            written = load_body.add_bodies(
+                self.db, documents, 'scl', fetch_workers=2,
+                client=mock.Mock())
+
+        self.assertEqual(written, 0)
+        self.assertNotIn(
+            'body', self.db['articles'].find_one({'code': 'S0000-00002000000100001'}))
+
+    def test_add_bodies_advances_checkpoint_in_order(self):
+        documents = [
+            FakeDocument('S0000-00002000000100003', None, _id=1),
+            FakeDocument('S0000-00002000000100001', {
+                'en': 'http://a.org/1/en', 'es': 'http://a.org/1/es'}, _id=2),
+            FakeDocument('S0000-00002000000100002', {'en': 'http://b.org/2/en'}, _id=3),
+        ]
+        checkpoint = checkpoints.CheckpointStore(self.db).start('load_body', 'scl')
+
+        with mock.patch.object(load_body, 'do_request', self.fake_request):
+            load_body.add_bodies(
+                self.db, documents, 'scl', fetch_workers=2,
+                client=mock.Mock(), checkpoint=checkpoint)
+
+        stored = checkpoints.CheckpointStore(self.db).get('load_body', 'scl')
+        self.assertEqual(stored['status'], 'finished')
+        self.assertEqual(stored['last_id'], 3)
+        self.assertEqual(stored['processed'], 3)
+        self.assertEqual(stored['failed'], ['S0000-00002000000100001'])
+
+    def test_run_shares_one_spawned_parse_pool(self):
+        parsers = []
+
+        def run_collection(articlemeta_db, collection, **kwargs):
+            parsers.append(kwargs['parser'])
+            return {}
+
+        with mock.patch.object(load_body, 'run_collection', run_collection), \
+                mock.patch.object(load_body, 'collection_info',
+                                  return_value={'domain': 'www.scielo.br'}):
+            load_body.run(self.db, ['scl', 'arg'], workers=2, parse_workers=2)
+
+        self.assertEqual(len(parsers), 2)
+        self.assertIs(parsers[0], parsers[1])
+        self.assertEqual(parsers[0]._mp_context.get_start_method(), 'spawn')
+        self.assertTrue(parsers[0]._shutdown_thread)
+
+    def test_add_bodies_scraps_in_the_parse_pool(self):
+        documents = [
+            FakeDocument('S0000-00002000000100002', {'en': 'http://b.org/2/en'}),
+        ]
+        parser = load_body.parse_pool(2)
+        self.addCleanup(parser.shutdown)
+
+        with mock.patch.object(load_body, 'do_request', self.fake_request):
+            written = load_body.add_bodies(
+                self.db, documents, 'scl', fetch_workers=2, parser=parser,
+                client=mock.Mock())
+
+        self.assertEqual(written, 1)
+        self.assertIsNone(load_body.parse_pool(1))
+
+    def main(self, *argv):
+        with mock.patch.object(load_body.controller, 'get_dbconn',
+                               return_value=self.db), \
+                mock.patch.object(load_body, 'collections_acronym',
+                                  return_value=['scl', 'arg']), \
+                mock.patch.object(load_body.logging.config, 'dictConfig'), \
+                mock.patch.object(load_body, 'run') as run, \
+                mock.patch('sys.argv', ['load_body'] + list(argv)):
+            load_body.main()
+
+        return run
+
+    def test_main_without_collection_runs_every_collection(self):
+        run = self.main()
+
+        self.assertEqual(run.call_args[1]['collections'], ['scl', 'arg'])
+
+        run = self.main('-c', 'arg')
+
+        self.assertEqual(run.call_args[1]['collections'], ['arg'])
+
+    def test_main_requires_collection_with_pids(self):
+        with self.assertRaises(SystemExit):
+            self.main('-p', 'S0000-00002000000100001')
+
+        run = self.main('-c', 'scl', '-p', 'S0000-00002000000100001')
+
+        self.assertEqual(run.call_args[1]['collections'], ['scl'])
+        self.assertEqual(run.call_args[1]['pids'], ['S0000-00002000000100001'])
+
+    def test_host_limiter_shares_semaphore_by_host(self):
+        limiter = load_body.HostLimiter(2)
+
+        self.assertIs(limiter('http://a.org/1'), limiter('http://a.org/2'))
+        self.assertIsNot(limiter('http://a.org/1'), limiter('http://b.org/1'))
+
+    def test_do_request_uses_the_client(self):
+        client = mock.Mock()
+        client.fetch.return_value.content = b'content'
+
+        result = load_body.do_request('http://a.org/1', json=False,
+                                      client=client)
+
+        self.assertEqual(result, b'content')
+        self.assertEqual(client.fetch.call_args[1]['headers']['User-Agent'],
+                         load_body.USER_AGENT)
+
+    def test_do_request_failure(self):
+        client = mock.Mock()
+        client.fetch.return_value = None
+
+        self.assertIsNone(
+            load_body.do_request('http://a.org/1', json=False, client=client))
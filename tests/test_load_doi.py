@@ -2,8 +2,11 @@
 import unittest
 import os
 import codecs
+from datetime import datetime
 
-from processing import load_doi
+import mongomock
+
+from processing import load_doi, load_licenses, load_sections, documents
 
 
 class LoadDOITest(unittest.TestCase):
@@ -78,3 +81,35 @@ class LoadDOITest(unittest.TestCase):
         result = load_doi.scrap_doi(data)
 
         self.assertEqual(result, '10.4067/S0717-73562015005000009')
+
+
+class LoadDocumentsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.db = mongomock.MongoClient()['articlemeta']
+        self.db['articles'].insert_many([
+            {'_id': 1, 'code': 'S1', 'collection': 'scl', 'article': {},
+             'doi': '10.1590/1', 'license': 'by/4.0', 'section': {}},
+            {'_id': 2, 'code': 'S2', 'collection': 'scl', 'article': {}},
+            {'_id': 3, 'code': 'S3', 'collection': 'scl', 'article': {}},
+        ])
+        self.db['historychanges_article'].insert_many([
+            {'code': 'S1', 'collection': 'scl', 'event': 'update',
+             'date': datetime(2020, 1, 2)},
+            {'code': 'S2', 'collection': 'scl', 'event': 'add',
+             'date': datetime(2020, 1, 3)},
+        ])
+
+    def test_without_change_log_loads_documents_missing_the_field(self):
+        for module in [load_doi, load_licenses, load_sections]:
+            loaded = module.load_documents(self.db, 'scl')
+
+            self.assertEqual([i.data['_id'] for i in loaded], [2, 3])
+
+    def test_change_log_loads_the_changed_documents_with_the_field(self):
+        for module in [load_doi, load_licenses, load_sections]:
+            changes = documents.ChangeLog(self.db, 'scl',
+                                          since=datetime(2020, 1, 1))
+            loaded = module.load_documents(self.db, 'scl', changes=changes)
+
+            self.assertEqual([i.data['_id'] for i in loaded], [1, 2])
@@ -1,12 +1,15 @@
 # coding: utf-8
 import json
 import os
+import shutil
+import tempfile
+from datetime import datetime
 from unittest import main, TestCase
 from unittest.mock import patch
 
 import mongomock
 
-from processing import load_languages
+from processing import load_languages, httpclient, documents
 from articlemeta import controller
 
 
@@ -114,6 +117,174 @@ class LoadLanguageTest(TestCase):
                          document['fulltexts']['html'])
         self.assertIsNotNone(document['fulltexts'].get('pdf'))
 
+    def test_load_documents_of_the_change_log_with_fulltexts(self):
+        db = mongomock.MongoClient().db
+        db['articles'].insert_many([
+            {'_id': 1, 'code': 'S1', 'collection': 'scl', 'article': {},
+             'fulltexts': {'html': {}}},
+            {'_id': 2, 'code': 'S2', 'collection': 'scl', 'article': {}},
+        ])
+        db['historychanges_article'].insert_one(
+            {'code': 'S1', 'collection': 'scl', 'event': 'update',
+             'date': datetime(2020, 1, 2)})
+
+        loaded = load_languages.load_documents('scl', db)
+        self.assertEqual([i.data['_id'] for i in loaded], [2])
+
+        changes = documents.ChangeLog(db, 'scl')
+        loaded = load_languages.load_documents('scl', db, changes=changes)
+        self.assertEqual([i.data['_id'] for i in loaded], [1])
+
+
+class FakeResponse(object):
+
+    def __init__(self, status_code=200, lines=(), headers=None):
+        self.status_code = status_code
+        self.lines = lines
+        self.headers = headers or {}
+
+    def iter_lines(self, decode_unicode=None):
+        return iter(self.lines)
+
+
+CATALOG_LINES = [
+    '/rsp/v52/0034-8910-rsp-s1518-87872018052000131.pdf',
+    '/rsp/v52/pt_0034-8910-rsp-s1518-87872018052000131.pdf',
+    '/rsp/v51/0034-8910-RSP-51-1.pdf',
+    '/mioc/v82s3/ii.html',
+    'invalid line',
+]
+
+
+class StaticCatalogTest(TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def test_parse_catalog(self):
+        catalog = load_languages.parse_catalog(CATALOG_LINES)
+
+        self.assertEqual(catalog['rsp']['v52'], frozenset([
+            '0034-8910-rsp-s1518-87872018052000131',
+            'pt_0034-8910-rsp-s1518-87872018052000131']))
+        self.assertEqual(catalog['rsp']['v51'],
+                         frozenset(['0034-8910-rsp-51-1']))
+        self.assertEqual(catalog['mioc']['v82s3'], frozenset(['ii']))
+
+    @patch.object(httpclient.HttpClient, 'get')
+    def test_catalog_files_are_merged_by_type(self, get):
+        get.side_effect = lambda url, headers: FakeResponse(
+            lines=CATALOG_LINES if 'pdf' in url else [])
+
+        catalog = load_languages.StaticCatalog('www.scielosp.org',
+                                               cache_dir='')
+
+        self.assertEqual(catalog.catalog['rsp']['v51']['html'], frozenset())
+        self.assertTrue(catalog.is_file_available(
+            ['rsp', 'v52', '0034-8910-rsp-s1518-87872018052000131'],
+            'pdf', 'pt', 'en'))
+        self.assertFalse(catalog.is_file_available(
+            ['rsp', 'v52', '0034-8910-rsp-s1518-87872018052000131'],
+            'pdf', 'es', 'en'))
+        self.assertFalse(catalog.is_file_available(
+            ['rsp', 'v99', '0034-8910-rsp-s1518-87872018052000131'],
+            'pdf', 'en', 'en'))
+
+    @patch.object(httpclient.HttpClient, 'get')
+    def test_unchanged_catalog_is_read_from_the_cache(self, get):
+        url = 'http://www.scielosp.org/static_pdf_files.txt'
+        get.return_value = FakeResponse(
+            lines=CATALOG_LINES, headers={'ETag': '"abc"'})
+
+        first = load_languages.load_catalog_file(url, self.cache_dir)
+
+        get.return_value = FakeResponse(status_code=304)
+        with patch.object(load_languages, 'parse_catalog') as parse:
+            second = load_languages.load_catalog_file(url, self.cache_dir)
+
+        parse.assert_not_called()
+        self.assertEqual(first, second)
+        self.assertEqual(get.call_args[1]['etag'], '"abc"')
+
+    @patch.object(httpclient.HttpClient, 'get')
+    def test_changed_catalog_replaces_the_cache(self, get):
+        url = 'http://www.scielosp.org/static_pdf_files.txt'
+        get.return_value = FakeResponse(
+            lines=CATALOG_LINES,
+            headers={'Last-Modified': 'Mon, 01 Jan 2018 00:00:00 GMT'})
+        load_languages.load_catalog_file(url, self.cache_dir)
+
+        get.return_value = FakeResponse(
+            lines=CATALOG_LINES[:1],
+            headers={'Last-Modified': 'Tue, 02 Jan 2018 00:00:00 GMT'})
+        catalog = load_languages.load_catalog_file(url, self.cache_dir)
+
+        self.assertEqual(get.call_args[1]['last_modified'],
+                         'Mon, 01 Jan 2018 00:00:00 GMT')
+        self.assertEqual(list(catalog), ['rsp'])
+
+        get.return_value = FakeResponse(status_code=304)
+        self.assertEqual(load_languages.load_catalog_file(url, self.cache_dir),
+                         catalog)
+
+    @patch.object(httpclient.HttpClient, 'get')
+    def test_catalog_is_cached_as_json(self, get):
+        url = 'http://www.scielosp.org/static_pdf_files.txt'
+        get.return_value = FakeResponse(
+            lines=CATALOG_LINES, headers={'ETag': '"abc"'})
+        load_languages.load_catalog_file(url, self.cache_dir)
+
+        with open(load_languages._catalog_cache_path(url, self.cache_dir)) as fp:
+            cached = json.load(fp)
+
+        self.assertEqual(cached['etag'], '"abc"')
+        self.assertEqual(cached['catalog']['rsp']['v51'],
+                         ['0034-8910-rsp-51-1'])
+
+        meta, catalog = load_languages._read_catalog_cache(url, self.cache_dir)
+        self.assertEqual(meta['etag'], '"abc"')
+        self.assertEqual(catalog['rsp']['v51'],
+                         frozenset(['0034-8910-rsp-51-1']))
+
+    @patch.object(httpclient.HttpClient, 'get')
+    def test_cache_dir_is_created_private(self, get):
+        cache_dir = os.path.join(self.cache_dir, 'catalogs')
+        get.return_value = FakeResponse(
+            lines=CATALOG_LINES, headers={'ETag': '"abc"'})
+
+        load_languages.load_catalog_file(
+            'http://www.scielosp.org/static_pdf_files.txt', cache_dir)
+
+        self.assertEqual(os.stat(cache_dir).st_mode & 0o777, 0o700)
+
+    @patch.object(httpclient.HttpClient, 'get')
+    def test_shared_cache_dir_is_not_used(self, get):
+        url = 'http://www.scielosp.org/static_pdf_files.txt'
+        os.chmod(self.cache_dir, 0o777)
+        get.return_value = FakeResponse(
+            lines=CATALOG_LINES, headers={'ETag': '"abc"'})
+
+        load_languages.load_catalog_file(url, self.cache_dir)
+        load_languages.load_catalog_file(url, self.cache_dir)
+
+        self.assertEqual(os.listdir(self.cache_dir), [])
+        self.assertNotIn('etag', get.call_args[1])
+
+    @patch.object(httpclient.HttpClient, 'get')
+    def test_without_cache_dir(self, get):
+        get.return_value = FakeResponse(
+            lines=CATALOG_LINES, headers={'ETag': '"abc"'})
+
+        load_languages.load_catalog_file(
+            'http://www.scielosp.org/static_pdf_files.txt', None)
+        load_languages.load_catalog_file(
+            'http://www.scielosp.org/static_pdf_files.txt', None)
+
+        self.assertNotIn('etag', get.call_args[1])
+
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,145 @@
+# coding: utf-8
+import unittest
+from unittest import mock
+
+import mongomock
+from pymongo import UpdateOne
+from pymongo.errors import AutoReconnect, BulkWriteError
+
+from processing.bulkwriter import BulkWriter
+
+
+class FakeTimer(object):
+
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+class BulkWriterTests(unittest.TestCase):
+
+    def setUp(self):
+        self.collection = mongomock.MongoClient()['articlemeta']['articles']
+        self.collection.insert_many(
+            [{'code': str(i), 'collection': 'scl'} for i in range(5)])
+
+    def test_flush_by_size(self):
+        writer = BulkWriter(self.collection, batch_size=2)
+
+        for i in range(5):
+            writer.update_one({'code': str(i)}, {'$set': {'doi': 'DOI%d' % i}})
+
+        self.assertEqual(writer.stats['batches'], 2)
+        self.assertEqual(len(writer), 1)
+        self.assertNotIn('doi', self.collection.find_one({'code': '4'}))
+
+        writer.close()
+
+        self.assertEqual(writer.stats['batches'], 3)
+        self.assertEqual(writer.stats['operations'], 5)
+        self.assertEqual(writer.stats['modified'], 5)
+        self.assertEqual(self.collection.find_one({'code': '4'})['doi'], 'DOI4')
+
+    def test_flush_by_time(self):
+        timer = FakeTimer()
+        writer = BulkWriter(self.collection, batch_size=100, flush_interval=10,
+                            timer=timer)
+
+        writer.update_one({'code': '0'}, {'$set': {'doi': 'DOI0'}})
+        self.assertEqual(len(writer), 1)
+
+        timer.now = 11
+        writer.update_one({'code': '1'}, {'$set': {'doi': 'DOI1'}})
+
+        self.assertEqual(len(writer), 0)
+        self.assertEqual(writer.stats['modified'], 2)
+
+    def test_context_manager_flushes_on_exit(self):
+        with BulkWriter(self.collection) as writer:
+            writer.add(UpdateOne({'code': '0'}, {'$set': {'doi': 'DOI0'}}))
+
+        self.assertEqual(self.collection.find_one({'code': '0'})['doi'], 'DOI0')
+
+    def test_retries_on_connection_error(self):
+        sleep = mock.Mock()
+        writer = BulkWriter(self.collection, retries=2, backoff_factor=1,
+                            sleep=sleep)
+        bulk_write = self.collection.bulk_write
+
+        with mock.patch.object(self.collection, 'bulk_write', side_effect=[
+                AutoReconnect('down'), AutoReconnect('down'), mock.DEFAULT],
+                wraps=bulk_write):
+            writer.update_one({'code': '0'}, {'$set': {'doi': 'DOI0'}})
+            writer.flush()
+
+        self.assertEqual([i[0][0] for i in sleep.call_args_list], [1, 2])
+        self.assertEqual(self.collection.find_one({'code': '0'})['doi'], 'DOI0')
+
+    def test_keeps_pending_operations_when_retries_are_exhausted(self):
+        writer = BulkWriter(self.collection, retries=1, sleep=mock.Mock())
+        writer.update_one({'code': '0'}, {'$set': {'doi': 'DOI0'}})
+
+        with mock.patch.object(self.collection, 'bulk_write',
+                               side_effect=AutoReconnect('down')):
+            with self.assertRaises(AutoReconnect):
+                writer.flush()
+
+        self.assertEqual(len(writer), 1)
+
+        # resumes from the failed batch.
+        writer.flush()
+        self.assertEqual(self.collection.find_one({'code': '0'})['doi'], 'DOI0')
+
+    def test_write_errors_are_counted(self):
+        writer = BulkWriter(self.collection)
+        writer.update_one({'code': '0'}, {'$set': {'doi': 'DOI0'}})
+        writer.update_one({'code': '1'}, {'$set': {'doi': 'DOI1'}})
+
+        error = BulkWriteError({
+            'nMatched': 1, 'nModified': 1, 'nUpserted': 0,
+            'writeErrors': [{'index': 1, 'errmsg': 'invalid'}]})
+
+        with mock.patch.object(self.collection, 'bulk_write',
+                               side_effect=error):
+            self.assertEqual(writer.flush(), 1)
+
+        self.assertEqual(len(writer), 0)
+        self.assertEqual(writer.stats['errors'], 1)
+        self.assertEqual(writer.stats['modified'], 1)
+
+    def test_close_returns_the_write_errors(self):
+        writer = BulkWriter(self.collection)
+        writer.update_one({'code': '0'}, {'$set': {'doi': 'DOI0'}})
+        writer.update_one({'code': '1'}, {'$set': {'doi': 'DOI1'}})
+
+        error = BulkWriteError({
+            'nMatched': 1, 'nModified': 1, 'nUpserted': 0,
+            'writeErrors': [{'index': 1, 'errmsg': 'invalid'}]})
+
+        with mock.patch.object(self.collection, 'bulk_write',
+                               side_effect=error):
+            errors = writer.close()
+
+        self.assertEqual(errors, [{
+            'operation': UpdateOne({'code': '1'}, {'$set': {'doi': 'DOI1'}}),
+            'errmsg': 'invalid'}])
+
+    def test_context_manager_flushes_when_the_block_fails(self):
+        with self.assertRaises(ValueError):
+            with BulkWriter(self.collection) as writer:
+                writer.update_one({'code': '0'}, {'$set': {'doi': 'DOI0'}})
+                raise ValueError('failed')
+
+        self.assertEqual(self.collection.find_one({'code': '0'})['doi'], 'DOI0')
+
+    def test_context_manager_keeps_the_exception_of_the_block(self):
+        with mock.patch.object(self.collection, 'bulk_write',
+                               side_effect=AutoReconnect('down')):
+            with self.assertRaises(ValueError):
+                with BulkWriter(self.collection, retries=0) as writer:
+                    writer.update_one({'code': '0'}, {'$set': {'doi': 'DOI0'}})
+                    raise ValueError('failed')
+
+        self.assertEqual(len(writer), 1)
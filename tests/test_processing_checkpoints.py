@@ -0,0 +1,193 @@
+# coding: utf-8
+import unittest
+from datetime import datetime
+from unittest import mock
+
+import mongomock
+
+from processing import checkpoints, load_licenses
+from processing.checkpoints import CheckpointStore
+
+
+class FakeDocument(object):
+
+    def __init__(self, _id):
+        self.data = {'_id': _id}
+
+
+class CheckpointStoreTests(unittest.TestCase):
+
+    def setUp(self):
+        self.db = mongomock.MongoClient()['articlemeta']
+        self.store = CheckpointStore(self.db)
+
+    def test_key(self):
+        self.assertEqual(CheckpointStore.key('load_doi', 'scl'), 'load_doi:scl')
+        self.assertEqual(CheckpointStore.key('load_doi', 'scl', (0, 4)),
+                         'load_doi:scl:1/4')
+
+    def test_track_advances_after_processing(self):
+        checkpoint = self.store.start('load_doi', 'scl')
+
+        documents = checkpoint.track(FakeDocument(i) for i in range(3))
+        next(documents)
+        self.assertIsNone(checkpoint.last_id)
+
+        next(documents)
+        self.assertEqual(checkpoint.last_id, 0)
+
+        list(documents)
+        self.assertEqual(checkpoint.last_id, 2)
+        self.assertEqual(checkpoint.processed, 3)
+
+    def test_saves_periodically_flushing_the_writer(self):
+        writer = mock.Mock()
+        checkpoint = self.store.start('load_doi', 'scl', writer=writer,
+                                      save_every=2)
+        writer.flush.reset_mock()
+
+        checkpoint.advance(1)
+        self.assertEqual(self.store.get('load_doi', 'scl')['last_id'], None)
+
+        checkpoint.advance(2)
+        writer.flush.assert_called_once_with()
+        self.assertEqual(self.store.get('load_doi', 'scl')['last_id'], 2)
+
+    def test_finish(self):
+        checkpoint = self.store.start('load_doi', 'scl')
+        checkpoint.advance(1)
+        checkpoint.fail('S1')
+        checkpoint.finish()
+
+        stored = self.store.get('load_doi', 'scl')
+        self.assertEqual(stored['status'], 'finished')
+        self.assertEqual(stored['processed'], 1)
+        self.assertEqual(stored['failures'], 1)
+        self.assertEqual(stored['failed'], ['S1'])
+
+    def test_failed_codes_are_capped(self):
+        checkpoint = self.store.start('load_doi', 'scl')
+
+        with mock.patch.object(checkpoints, 'MAX_FAILED', 2):
+            for code in ['S1', 'S2', 'S3']:
+                checkpoint.fail(code)
+
+        self.assertEqual(checkpoint.failures, 3)
+        self.assertEqual(checkpoint.failed, ['S1', 'S2'])
+
+    def test_resume_interrupted_run(self):
+        checkpoint = self.store.start('load_doi', 'scl')
+        checkpoint.advance(5)
+        checkpoint.fail('S5')
+        checkpoint.save()
+
+        resumed = self.store.start('load_doi', 'scl', resume=True)
+
+        self.assertEqual(resumed.after_id, 5)
+        self.assertEqual(resumed.processed, 1)
+        self.assertEqual(resumed.failed, ['S5'])
+
+    def test_resume_finished_run_starts_over(self):
+        checkpoint = self.store.start('load_doi', 'scl')
+        checkpoint.advance(5)
+        checkpoint.finish()
+
+        resumed = self.store.start('load_doi', 'scl', resume=True)
+
+        self.assertIsNone(resumed.after_id)
+        self.assertEqual(resumed.processed, 0)
+
+    def test_without_resume_starts_over(self):
+        checkpoint = self.store.start('load_doi', 'scl')
+        checkpoint.advance(5)
+        checkpoint.save()
+
+        self.assertIsNone(self.store.start('load_doi', 'scl').after_id)
+
+    def test_since_checkpoint(self):
+        checkpoint = self.store.start('load_doi', 'scl')
+        checkpoint.advance(5)
+        checkpoint.finish()
+
+        since = self.store.start('load_doi', 'scl', since_checkpoint=True)
+
+        self.assertEqual(since.after_id, 5)
+        self.assertEqual(since.processed, 0)
+
+    def test_checkpoints_by_shard(self):
+        checkpoint = self.store.start('load_doi', 'scl', shard=(0, 2))
+        checkpoint.advance(5)
+        checkpoint.save()
+
+        self.assertIsNone(
+            self.store.start('load_doi', 'scl', shard=(1, 2), resume=True).after_id)
+        self.assertEqual(
+            self.store.start('load_doi', 'scl', shard=(0, 2), resume=True).after_id, 5)
+
+
+class IncrementalRunTests(unittest.TestCase):
+
+    def setUp(self):
+        self.db = mongomock.MongoClient()['articlemeta']
+        self.store = CheckpointStore(self.db)
+        self.db['articles'].insert_many([
+            {'_id': i, 'code': 'S%03d' % i, 'collection': 'scl'}
+            for i in range(3)
+        ])
+
+    def log(self, code, date):
+        self.db['historychanges_article'].insert_one(
+            {'code': code, 'collection': 'scl', 'event': 'update',
+             'date': date})
+
+    def run_incremental(self):
+        checkpoint = self.store.start('load_doi', 'scl', incremental=True)
+        loaded = [
+            i.data['code'] for i in checkpoint.track(
+                load_licenses.load_documents(
+                    self.db, 'scl', all_records=True,
+                    changes=checkpoint.changes))
+        ]
+        checkpoint.finish()
+        return loaded
+
+    def test_incremental_runs_follow_the_watermark(self):
+        self.log('S001', datetime(2020, 1, 1))
+
+        self.assertEqual(self.run_incremental(), ['S001'])
+        self.assertEqual(
+            self.store.get('load_doi:incremental', 'scl')['watermark'],
+            datetime(2020, 1, 1))
+
+        self.log('S002', datetime(2020, 1, 2))
+
+        # the changes at the watermark are processed again.
+        self.assertEqual(self.run_incremental(), ['S001', 'S002'])
+        self.assertEqual(
+            self.store.get('load_doi:incremental', 'scl')['watermark'],
+            datetime(2020, 1, 2))
+
+    def test_incremental_runs_are_kept_apart(self):
+        self.log('S001', datetime(2020, 1, 1))
+        checkpoint = self.store.start('load_doi', 'scl')
+        checkpoint.advance(2)
+        checkpoint.finish()
+
+        self.run_incremental()
+
+        self.assertEqual(self.store.get('load_doi', 'scl')['last_id'], 2)
+        self.assertEqual(
+            self.store.get('load_doi:incremental', 'scl')['last_id'], 1)
+
+    def test_interrupted_incremental_run_keeps_the_watermark(self):
+        self.log('S001', datetime(2020, 1, 1))
+        self.run_incremental()
+        self.log('S002', datetime(2020, 1, 2))
+
+        checkpoint = self.store.start('load_doi', 'scl', incremental=True)
+        list(checkpoint.changes.documents({}))
+        checkpoint.save()
+
+        self.assertEqual(
+            self.store.get('load_doi:incremental', 'scl')['watermark'],
+            datetime(2020, 1, 1))
@@ -0,0 +1,180 @@
+# coding: utf-8
+import unittest
+from datetime import datetime
+from unittest import mock
+
+import mongomock
+from pymongo.errors import CursorNotFound
+
+from processing import documents
+from processing.documents import DocumentLoader
+
+
+class DocumentLoaderTests(unittest.TestCase):
+
+    def setUp(self):
+        self.collection = mongomock.MongoClient()['articlemeta']['articles']
+        self.collection.insert_many([
+            {'_id': i, 'code': 'S%03d' % i, 'collection': 'scl',
+             'citations': [], 'body': {'en': 'body'}}
+            for i in range(10)
+        ])
+
+    def test_loads_in_id_order_with_projection(self):
+        self.collection.insert_one({'_id': 10, 'code': 'S010', 'collection': 'arg'})
+
+        loaded = list(DocumentLoader(self.collection, {'collection': 'scl'}))
+
+        self.assertEqual([i['_id'] for i in loaded], list(range(10)))
+        self.assertNotIn('citations', loaded[0])
+        self.assertNotIn('body', loaded[0])
+
+    def test_resumes_after_id(self):
+        loaded = DocumentLoader(self.collection, {'collection': 'scl'},
+                                after_id=6)
+
+        self.assertEqual([i['_id'] for i in loaded], [7, 8, 9])
+        self.assertEqual(loaded.last_id, 9)
+
+    def test_missing_field(self):
+        self.collection.update_many({'_id': {'$in': [2, 5]}},
+                                    {'$set': {'doi': '10.1590/x'}})
+        fltr = {'collection': 'scl'}
+
+        loaded = DocumentLoader(self.collection, fltr, missing_field='doi')
+
+        self.assertEqual([i['_id'] for i in loaded],
+                         [0, 1, 3, 4, 6, 7, 8, 9])
+        self.assertEqual(fltr, {'collection': 'scl'})
+
+    def test_shards_cover_every_document_once(self):
+        loaded = []
+        for index in range(3):
+            loaded.extend(
+                i['_id'] for i in DocumentLoader(
+                    self.collection, {'collection': 'scl'}, shard=(index, 3)))
+
+        self.assertEqual(loaded, list(range(10)))
+
+    def test_shard_with_after_id(self):
+        loaded = DocumentLoader(self.collection, {'collection': 'scl'},
+                                shard=(0, 2), after_id=2)
+
+        self.assertEqual([i['_id'] for i in loaded], [3, 4])
+
+    def test_shard_ranges_use_the_shard_filter(self):
+        self.collection.update_many({'_id': {'$lt': 5}}, {'$set': {'doi': 'x'}})
+
+        loaded = DocumentLoader(
+            self.collection, {'collection': 'scl', 'doi': {'$exists': 0}},
+            shard=(0, 2), shard_filter={'collection': 'scl'})
+
+        self.assertEqual([i['_id'] for i in loaded], [])
+
+    def test_restarts_lost_cursor_after_last_id(self):
+        loader = DocumentLoader(self.collection, {'collection': 'scl'})
+        find = self.collection.find
+        calls = []
+
+        def fake_find(*args, **kwargs):
+            cursor = find(*args, **kwargs)
+            calls.append(args[0])
+            if len(calls) > 1:
+                return cursor
+
+            def failing():
+                yield next(cursor)
+                yield next(cursor)
+                raise CursorNotFound('cursor lost')
+
+            fake = mock.MagicMock()
+            fake.sort.return_value.batch_size.return_value = fake
+            fake.__iter__.return_value = failing()
+            return fake
+
+        with mock.patch.object(self.collection, 'find', fake_find):
+            loaded = [i['_id'] for i in loader]
+
+        self.assertEqual(loaded, list(range(10)))
+        self.assertEqual(len(calls), 2)
+
+    def test_parse_shard(self):
+        self.assertEqual(documents.parse_shard('1/4'), (0, 4))
+        self.assertEqual(documents.parse_shard('4/4'), (3, 4))
+
+        with self.assertRaises(ValueError):
+            documents.parse_shard('5/4')
+
+        with self.assertRaises(ValueError):
+            documents.parse_shard('1')
+
+
+class ChangeLogTests(unittest.TestCase):
+
+    def setUp(self):
+        self.db = mongomock.MongoClient()['articlemeta']
+        self.db['articles'].insert_many([
+            {'_id': i, 'code': 'S%03d' % i, 'collection': 'scl'}
+            for i in range(6)
+        ])
+        self.db['articles'].insert_one(
+            {'_id': 6, 'code': 'S001', 'collection': 'arg'})
+        self.db['historychanges_article'].insert_many([
+            {'code': 'S004', 'collection': 'scl', 'event': 'update',
+             'date': datetime(2020, 1, 1)},
+            {'code': 'S001', 'collection': 'scl', 'event': 'add',
+             'date': datetime(2020, 1, 2)},
+            {'code': 'S001', 'collection': 'arg', 'event': 'add',
+             'date': datetime(2020, 1, 2)},
+            {'code': 'S002', 'collection': 'scl', 'event': 'delete',
+             'date': datetime(2020, 1, 3)},
+            {'code': 'S004', 'collection': 'scl', 'event': 'update',
+             'date': datetime(2020, 1, 4)},
+            {'code': 'S003', 'collection': 'scl', 'event': 'add',
+             'date': datetime(2020, 1, 5)},
+        ])
+
+    def test_documents_changed_since(self):
+        changes = documents.ChangeLog(self.db, 'scl',
+                                      since=datetime(2020, 1, 2))
+
+        loaded = [i['_id'] for i in changes.documents({'collection': 'scl'})]
+
+        self.assertEqual(loaded, [1, 3, 4])
+        self.assertEqual(changes.last_date, datetime(2020, 1, 5))
+
+    def test_documents_without_watermark(self):
+        changes = documents.ChangeLog(self.db, 'scl')
+
+        loaded = [i['_id'] for i in changes.documents({'collection': 'scl'})]
+
+        self.assertEqual(loaded, [1, 3, 4])
+
+    def test_documents_apply_the_loader_filter(self):
+        self.db['articles'].update_one({'_id': 3}, {'$set': {'doi': 'x'}})
+        changes = documents.ChangeLog(self.db, 'scl')
+
+        loaded = changes.documents(
+            {'collection': 'scl', 'doi': {'$exists': 0}})
+
+        self.assertEqual([i['_id'] for i in loaded], [1, 4])
+
+    def test_documents_after_id_and_shard(self):
+        changes = documents.ChangeLog(self.db, 'scl')
+        self.assertEqual(
+            [i['_id'] for i in changes.documents({}, after_id=1)], [3, 4])
+
+        changes = documents.ChangeLog(self.db, 'scl')
+        self.assertEqual(
+            [i['_id'] for i in changes.documents({}, shard=(0, 2))], [1])
+
+        changes = documents.ChangeLog(self.db, 'scl')
+        self.assertEqual(
+            [i['_id'] for i in changes.documents({}, shard=(1, 2))], [3, 4])
+
+    def test_no_changes_keeps_the_watermark(self):
+        changes = documents.ChangeLog(self.db, 'scl',
+                                      since=datetime(2021, 1, 1))
+
+        self.assertEqual(list(changes.documents({})), [])
+        self.assertEqual(changes.last_date, datetime(2021, 1, 1))
@@ -0,0 +1,121 @@
+# coding: utf-8
+import json
+import os
+import shutil
+import tarfile
+import tempfile
+import unittest
+import zipfile
+from datetime import datetime
+
+import mongomock
+
+from articlemeta import controller
+from articlemeta.export import Export
+from processing import exportarticles
+
+
+class ExportArticlesTests(unittest.TestCase):
+
+    def setUp(self):
+        self.output_dir = tempfile.mkdtemp()
+
+        raw = json.loads(open(
+            os.path.dirname(__file__) + '/fixtures/article_meta.json').read())
+        raw['processing_date'] = datetime(2017, 1, 1)
+        raw['code_title'] = ['0034-8910']
+        self.raw = raw
+
+        db = mongomock.MongoClient().db
+        db['journals'].insert_one(dict(
+            raw['title'], code='0034-8910', collection='scl',
+            processing_date=datetime(2017, 1, 1)))
+        for i in range(3):
+            article = dict(raw)
+            article['code'] = 'S0034-8910201000040000%d' % i
+            article['processing_date'] = datetime(2017, 1, 1 + i)
+            db['articles'].insert_one(article)
+
+        broken = dict(raw)
+        broken['code'] = 'S0034-89102010000400009'
+        broken['article'] = {}
+        db['articles'].insert_one(broken)
+
+        self.databroker = controller.DataBroker(db)
+
+    def tearDown(self):
+        shutil.rmtree(self.output_dir, ignore_errors=True)
+
+    def test_render_chunk_flags_failures(self):
+        broken = dict(self.raw)
+        broken['article'] = {}
+
+        results = exportarticles.render_chunk([self.raw, broken], 'xmlwos')
+
+        self.assertIsNotNone(results[0][2])
+        self.assertIsNone(results[1][2])
+        self.assertIsNotNone(results[1][3])
+
+    def test_issns_are_paired_with_the_collections_of_the_journal(self):
+        self.databroker.db['journals'].insert_one(
+            {'code': '0000-0000', 'collection': 'arg',
+             'processing_date': datetime(2017, 1, 1)})
+
+        self.assertEqual(
+            list(exportarticles.shards(
+                self.databroker, ['arg', 'scl'],
+                issns=['0034-8910', '0000-0000', '9999-9999'])),
+            [('arg', '0000-0000'), ('scl', '0034-8910')])
+        self.assertEqual(
+            list(exportarticles.shards(self.databroker, ['arg', 'scl'],
+                                       shard_by='issn')),
+            [('arg', '0000-0000'), ('scl', '0034-8910')])
+
+    def test_run_with_issn_skips_the_other_collections(self):
+        stats = exportarticles.run(
+            self.databroker, ['arg', 'scl'], 'xmlwos', self.output_dir,
+            issns=['0034-8910'], processes=1)
+
+        self.assertEqual(stats, {'exported': 3, 'failed': 1})
+        self.assertEqual(os.listdir(self.output_dir),
+                         ['xmlwos_scl_0034-8910.zip'])
+
+    def test_chunks(self):
+        self.assertEqual(list(exportarticles.chunks(range(5), 2)),
+                         [[0, 1], [2, 3], [4]])
+
+    def test_run_in_process_writes_a_zip_per_collection(self):
+        stats = exportarticles.run(
+            self.databroker, ['scl'], 'xmlwos', self.output_dir, processes=1)
+
+        self.assertEqual(stats, {'exported': 3, 'failed': 1})
+
+        file_name = os.path.join(self.output_dir, 'xmlwos_scl.zip')
+        with zipfile.ZipFile(file_name) as thezip:
+            names = sorted(thezip.namelist())
+            xml = thezip.read('bra/0034-8910/S0034-89102010000400000.xml')
+
+        self.assertEqual(names, [
+            'README.txt',
+            'bra/0034-8910/S0034-89102010000400000.xml',
+            'bra/0034-8910/S0034-89102010000400001.xml',
+            'bra/0034-8910/S0034-89102010000400002.xml',
+        ])
+        expected = self.databroker.get_article(
+            'S0034-89102010000400000', replace_journal_metadata=True)
+        self.assertEqual(xml, Export(expected).render('xmlwos'))
+
+    def test_run_with_process_pool_writes_a_tar_per_issn(self):
+        stats = exportarticles.run(
+            self.databroker, ['scl'], 'xmlrsps', self.output_dir,
+            shard_by='issn', archive_format='tar', processes=2, chunk_size=1)
+
+        self.assertEqual(stats, {'exported': 3, 'failed': 1})
+
+        file_name = os.path.join(
+            self.output_dir, 'xmlrsps_scl_0034-8910.tar.gz')
+        with tarfile.open(file_name) as thetar:
+            names = sorted(thetar.getnames())
+
+        self.assertEqual(len(names), 4)
+        self.assertIn('bra/0034-8910/S0034-89102010000400002.xml', names)
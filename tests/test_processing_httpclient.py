@@ -0,0 +1,137 @@
+# coding: utf-8
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import requests
+
+from processing import httpclient
+
+
+def response(status_code=200, content=b'', headers=None):
+    result = requests.Response()
+    result.status_code = status_code
+    result._content = content
+    result.headers = requests.structures.CaseInsensitiveDict(headers or {})
+    result.encoding = 'utf-8'
+
+    return result
+
+
+class HttpClientTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def test_one_session_per_host(self):
+        client = httpclient.HttpClient()
+
+        self.assertIs(client.session('http://a.org/1'),
+                      client.session('http://a.org/2'))
+        self.assertIsNot(client.session('http://a.org/1'),
+                         client.session('http://b.org/1'))
+
+    def test_session_mounts_retrying_adapter(self):
+        client = httpclient.HttpClient(retries=2, pool_size=4,
+                                       user_agent='agent')
+        session = client.session('https://www.scielo.br')
+
+        adapter = session.get_adapter('https://www.scielo.br')
+        self.assertIsInstance(adapter.max_retries, httpclient.JitterRetry)
+        self.assertEqual(adapter.max_retries.total, 2)
+        self.assertEqual(adapter._pool_maxsize, 4)
+        self.assertEqual(session.headers['User-Agent'], 'agent')
+
+    def test_jitter_retry_backoff(self):
+        retry = httpclient.JitterRetry(total=5, backoff_factor=1)
+        self.assertEqual(retry.get_backoff_time(), 0)
+
+        for _ in range(3):
+            retry = retry.increment(method='GET', url='/')
+
+        backoff = httpclient.Retry.get_backoff_time(retry)
+        self.assertTrue(backoff > 0)
+        for _ in range(10):
+            self.assertTrue(backoff <= retry.get_backoff_time() <= 2 * backoff)
+
+    def test_get_uses_timeout_and_validators(self):
+        client = httpclient.HttpClient(timeout=(1, 2))
+        session = client.session('http://a.org/1')
+
+        with mock.patch.object(session, 'get', return_value=response()) as get:
+            client.get('http://a.org/1', headers={'Accept': 'text/html'},
+                       etag='"abc"', last_modified='yesterday')
+
+        self.assertEqual(get.call_args[1]['timeout'], (1, 2))
+        self.assertEqual(get.call_args[1]['headers'], {
+            'Accept': 'text/html',
+            'If-None-Match': '"abc"',
+            'If-Modified-Since': 'yesterday'
+        })
+
+    def test_not_modified_response_is_read_from_the_cache(self):
+        client = httpclient.HttpClient(cache_dir=self.cache_dir)
+        session = client.session('http://a.org/1')
+
+        with mock.patch.object(session, 'get') as get:
+            get.return_value = response(content=b'body',
+                                        headers={'ETag': '"abc"'})
+            first = client.get('http://a.org/1')
+
+            get.return_value = response(status_code=304)
+            second = client.get('http://a.org/1')
+
+        self.assertFalse(first.from_cache)
+        self.assertTrue(second.from_cache)
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.content, b'body')
+        self.assertEqual(second.text, 'body')
+        self.assertEqual(get.call_args[1]['headers']['If-None-Match'], '"abc"')
+
+    def test_responses_without_validators_are_not_cached(self):
+        client = httpclient.HttpClient(cache_dir=self.cache_dir)
+        session = client.session('http://a.org/1')
+
+        with mock.patch.object(session, 'get', return_value=response()) as get:
+            client.get('http://a.org/1')
+            client.get('http://a.org/1')
+
+        self.assertNotIn('If-None-Match', get.call_args[1]['headers'])
+
+    def test_fetch_errors(self):
+        client = httpclient.HttpClient()
+        session = client.session('http://a.org/1')
+
+        with mock.patch.object(session, 'get') as get:
+            get.return_value = response(status_code=404)
+            self.assertIsNone(client.fetch('http://a.org/1'))
+
+            get.side_effect = requests.ConnectionError()
+            self.assertIsNone(client.fetch('http://a.org/1'))
+
+            get.side_effect = None
+            get.return_value = response(content=b'ok')
+            self.assertEqual(client.fetch('http://a.org/1').content, b'ok')
+
+    def test_min_interval_between_requests_to_a_host(self):
+        client = httpclient.HttpClient(min_interval=5)
+        client.session('http://a.org/1')
+
+        with mock.patch.object(httpclient.time, 'sleep') as sleep:
+            client._wait('http://a.org/1')
+            sleep.assert_not_called()
+
+            client._wait('http://a.org/2')
+            self.assertEqual(sleep.call_count, 1)
+            self.assertTrue(0 < sleep.call_args[0][0] <= 5)
+
+    def test_shared_client(self):
+        self.assertIs(httpclient.get_client(), httpclient.get_client())
+
+
+if __name__ == '__main__':
+    unittest.main()
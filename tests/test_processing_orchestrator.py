@@ -0,0 +1,155 @@
+# coding: utf-8
+import time
+import logging
+import logging.config
+import threading
+import unittest
+from unittest import mock
+
+import mongomock
+
+from processing import (
+    orchestrator, load_body, load_doi, load_languages, load_licenses,
+    load_sections)
+
+
+class OrchestratorTests(unittest.TestCase):
+
+    def test_results_in_the_given_order(self):
+        results = orchestrator.run(
+            'job', ['scl', 'arg', 'chl'],
+            lambda collection: {'processed': len(collection) * 2},
+            workers=3)
+
+        self.assertEqual(list(results), ['scl', 'arg', 'chl'])
+        self.assertEqual(results['scl']['status'], 'done')
+        self.assertEqual(results['scl']['metrics'], {'processed': 6})
+
+    def test_continues_past_failing_collections(self):
+        def func(collection):
+            if collection == 'arg':
+                raise orchestrator.JobError('catalog not found')
+            if collection == 'chl':
+                raise KeyError('domain')
+            return {'processed': 1}
+
+        results = orchestrator.run('job', ['scl', 'arg', 'chl', 'col'], func,
+                                   workers=2)
+
+        self.assertEqual(
+            [i['status'] for i in results.values()],
+            ['done', 'failed', 'failed', 'done'])
+        self.assertEqual(results['arg']['error'], 'catalog not found')
+        self.assertEqual(results['chl']['error'], "KeyError('domain')")
+
+    def test_collections_run_concurrently(self):
+        barrier = threading.Barrier(3, timeout=5)
+
+        def func(collection):
+            barrier.wait()
+
+        results = orchestrator.run('job', ['scl', 'arg', 'chl'], func,
+                                   workers=3)
+
+        self.assertEqual(
+            [i['status'] for i in results.values()], ['done'] * 3)
+
+    def test_per_domain_limit(self):
+        running = {}
+        peak = {}
+        lock = threading.Lock()
+        domains = {'scl': 'a.org', 'spa': 'a.org', 'arg': 'b.org',
+                   'chl': 'b.org'}
+
+        def func(collection):
+            domain = domains[collection]
+            with lock:
+                running[domain] = running.get(domain, 0) + 1
+                peak[domain] = max(peak.get(domain, 0), running[domain])
+            time.sleep(0.05)
+            with lock:
+                running[domain] -= 1
+
+        orchestrator.run('job', list(domains), func, domain=domains.get,
+                         workers=4, per_domain=1)
+
+        self.assertEqual(peak, {'a.org': 1, 'b.org': 1})
+
+    def test_log_records_carry_the_collection(self):
+        records = []
+        handler = logging.Handler()
+        handler.addFilter(orchestrator.CollectionFilter())
+        handler.emit = records.append
+        logger = logging.getLogger('tests.orchestrator')
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        self.addCleanup(logger.removeHandler, handler)
+
+        barrier = threading.Barrier(2, timeout=5)
+        names = []
+
+        def func(collection):
+            barrier.wait()
+            names.append(threading.current_thread().name)
+            logger.info(collection)
+
+        orchestrator.run('job', ['scl', 'arg'], func, workers=2)
+        logger.info('finished')
+
+        self.assertEqual(
+            sorted((i.collection, i.getMessage()) for i in records),
+            [('-', 'finished'), ('arg', 'arg'), ('scl', 'scl')])
+        self.assertFalse([i for i in names if 'scl' in i or 'arg' in i])
+
+    def test_loaders_logging_configuration(self):
+        for module in [load_body, load_doi, load_languages, load_licenses,
+                       load_sections]:
+            config = module.LOGGING
+            record = logging.makeLogRecord({'msg': 'configured'})
+
+            self.assertEqual(config['handlers']['console']['filters'],
+                             ['collection'])
+            collection_filter = logging.config.BaseConfigurator({}).resolve(
+                config['filters']['collection']['()'])()
+            collection_filter.filter(record)
+            formatted = logging.Formatter(
+                config['formatters']['console']['format']).format(record)
+
+            self.assertTrue(formatted.endswith(' - - - configured'))
+
+    def test_report_totals(self):
+        runner = orchestrator.Orchestrator('job', None)
+
+        totals = runner.report({
+            'scl': {'status': 'done', 'elapsed': 1, 'error': None,
+                    'metrics': {'processed': 2, 'failures': 1}},
+            'arg': {'status': 'failed', 'elapsed': 1, 'error': 'x',
+                    'metrics': {}},
+            'chl': {'status': 'done', 'elapsed': 1, 'error': None,
+                    'metrics': {'processed': 3, 'failures': 0}},
+        })
+
+        self.assertEqual(totals, {'processed': 5, 'failures': 1})
+
+
+class LoaderOrchestrationTests(unittest.TestCase):
+
+    def test_missing_section_catalog_fails_only_its_collection(self):
+        db = mongomock.MongoClient()['articlemeta']
+        db['collections'].insert_many([
+            {'acron': 'scl', 'code': 'scl', 'domain': 'www.scielo.br'},
+            {'acron': 'arg', 'code': 'arg', 'domain': 'www.scielo.org.ar'},
+        ])
+
+        def catalog(self, coll_info):
+            if coll_info['acron'] == 'scl':
+                return {}
+            return {'v1': {}}
+
+        with mock.patch.object(load_sections.StaticCatalog,
+                               '_load_static_catalog', catalog):
+            results = load_sections.run(db, ['scl', 'arg'], workers=2)
+
+        self.assertEqual(results['scl']['status'], 'failed')
+        self.assertEqual(results['arg']['status'], 'done')
+        self.assertEqual(results['arg']['metrics']['processed'], 0)
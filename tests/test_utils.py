@@ -1,6 +1,10 @@
+import threading
 import unittest
+from unittest import mock
 from lxml import etree
-from articlemeta.utils import convert_ahref_to_extlink
+from articlemeta.utils import (
+    convert_ahref_to_extlink, ThreadLocalInstanceMixin, get_thread_instance)
+from articlemeta import export_sci, export_rsps, export_crossref
 from processing import escape_html_http_tags
 
 
@@ -39,3 +43,47 @@ class TestProcessingEscapeHTTPTags(unittest.TestCase):
         string = "<p>Some text available in &lt;http://www.scielo.br&gt;</p>"
         expected = "<p>Some text available in &lt;http://www.scielo.br&gt;</p>"
         self.assertEqual(expected, escape_html_http_tags(string))
+
+    def test_should_escape_unclosed_http_tags(self):
+        string = "Texto <http://www.scielo.br> e <http://www.scielo.org"
+        expected = "Texto &lt;http://www.scielo.br&gt; e &lt;http://www.scielo.org"
+        self.assertEqual(expected, escape_html_http_tags(string))
+
+    def test_should_escape_http_tags_of_every_line(self):
+        string = "<http://www.scielo.br>\n<p><http://www.scielo.org></p>"
+        expected = "&lt;http://www.scielo.br&gt;\n<p>&lt;http://www.scielo.org&gt;</p>"
+        self.assertEqual(expected, escape_html_http_tags(string))
+
+
+class TestThreadLocalInstanceMixin(unittest.TestCase):
+    def test_one_instance_per_class_and_thread(self):
+        class Foo(ThreadLocalInstanceMixin):
+            pass
+
+        class Bar(Foo):
+            pass
+
+        other = []
+        thread = threading.Thread(target=lambda: other.append(Foo.get_instance()))
+        thread.start()
+        thread.join()
+
+        self.assertIs(Foo.get_instance(), Foo.get_instance())
+        self.assertIsInstance(Bar.get_instance(), Bar)
+        self.assertIsNot(Foo.get_instance(), other[0])
+
+    def test_get_thread_instance(self):
+        factory = mock.Mock(side_effect=object)
+
+        first = get_thread_instance(('test', 1), factory)
+
+        self.assertIs(get_thread_instance(('test', 1), factory), first)
+        self.assertIsNot(get_thread_instance(('test', 2), factory), first)
+        self.assertEqual(factory.call_count, 2)
+
+    def test_citation_pipelines(self):
+        for module in [export_sci, export_rsps, export_crossref]:
+            citation = module.XMLCitation.get_instance()
+
+            self.assertIsInstance(citation, module.XMLCitation)
+            self.assertIs(citation, module.XMLCitation.get_instance())
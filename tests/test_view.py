@@ -2,6 +2,7 @@
 import unittest
 
 from pyramid import testing
+from webob.multidict import MultiDict
 import pyramid.httpexceptions as exc
 
 from articlemeta import articlemeta
@@ -82,3 +83,68 @@ class ViewsTest(unittest.TestCase):
             request = testing.DummyRequest(params={'limit': req_limit})
             result_limit = articlemeta._get_request_limit_param(request, force_max_limit_to_default=False)
             self.assertEqual(result_limit, resp_limit)
+
+    def test_ndjson_app_iter_writes_one_object_per_line(self):
+        chunks = list(articlemeta._ndjson_app_iter([{'a': 1}, {'b': 'ç'}]))
+
+        self.assertEqual(chunks, [b'{"a": 1}\n{"b": "\\u00e7"}\n'])
+
+    def test_ndjson_app_iter_groups_lines_in_chunks(self):
+        chunks = list(articlemeta._ndjson_app_iter(
+            ({'i': i} for i in range(5)), chunk_size=20))
+
+        self.assertEqual(chunks, [b'{"i": 0}\n{"i": 1}\n{"i": 2}\n',
+                                  b'{"i": 3}\n{"i": 4}\n'])
+
+    def test_ndjson_app_iter_with_no_objects(self):
+        self.assertEqual(list(articlemeta._ndjson_app_iter([])), [])
+
+    def test_stream_articles_rejects_invalid_body_param(self):
+        request = testing.DummyRequest(params={'body': 'yes'})
+
+        self.assertRaises(exc.HTTPBadRequest,
+                          articlemeta.stream_articles,
+                          request)
+
+    def test_stream_views_reject_invalid_dates(self):
+        for view in [articlemeta.stream_articles, articlemeta.stream_issues]:
+            for params in [{'from': '2017-13-01'}, {'until': 'yesterday'}]:
+                request = testing.DummyRequest(params=params)
+
+                self.assertRaises(exc.HTTPBadRequest, view, request)
+
+    def test_ndjson_response_runs_the_query_in_the_view(self):
+        def objects():
+            raise ValueError('query failed')
+            yield
+
+        self.assertRaises(ValueError, articlemeta._ndjson_response, objects())
+
+        response = articlemeta._ndjson_response(iter([{'a': 1}, {'b': 2}]))
+        self.assertEqual(response.body, b'{"a": 1}\n{"b": 2}\n')
+
+    def test_get_articles_by_codes_requires_codes(self):
+        request = testing.DummyRequest()
+        request.GET = MultiDict()
+
+        self.assertRaises(exc.HTTPBadRequest,
+                          articlemeta.get_articles_by_codes,
+                          request)
+
+    def test_get_articles_by_codes_limits_the_number_of_codes(self):
+        request = testing.DummyRequest(post={})
+        request.json_body = {
+            'codes': ['S%d' % i for i in range(
+                articlemeta.MAX_CODES_PER_REQUEST + 1)]}
+
+        self.assertRaises(exc.HTTPBadRequest,
+                          articlemeta.get_articles_by_codes,
+                          request)
+
+    def test_get_articles_by_codes_rejects_invalid_json_body(self):
+        request = testing.DummyRequest(post={})
+        request.json_body = {'codes': 'S0000'}
+
+        self.assertRaises(exc.HTTPBadRequest,
+                          articlemeta.get_articles_by_codes,
+                          request)